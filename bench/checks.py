@@ -0,0 +1,149 @@
+"""
+Offline checks of agent logic that needs no browser or model provider.
+
+    python -m bench.checks
+
+Each check raises AssertionError on the first mismatch; the script prints one
+line per check and exits non-zero if any failed.
+"""
+import sys
+import traceback
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+from bench.fake_model import ScriptedChatModel
+from browser.manager import BrowserManager
+from browser.interception import freshness
+from core.agent import Agent
+from core.streaming import ToolCallStream
+
+class RecordingAgent(Agent):
+    """Agent whose tools only record that they ran (no browser is opened)."""
+    def __init__(self, script):
+        self.executed = []
+        super().__init__(browser=BrowserManager(), model=ScriptedChatModel(script=script), use_replay=False)
+
+    def _execute_tool(self, tool_call):
+        self.executed.append(tool_call['name'])
+        return f"{tool_call['name']} ok"
+
+def _chunk(index, piece, name=None, call_id=None):
+    return AIMessageChunk(content="", tool_call_chunks=[{"name": name, "args": piece, "id": call_id, "index": index}])
+
+def _id_args(calls):
+    return [(tc['id'], tc['args']) for tc in calls]
+
+def check_tool_call_stream():
+    # Arguments split mid-token; a call is handed out once the chunk after it arrives
+    stream = ToolCallStream()
+    assert stream.feed(_chunk(0, '{"direc', "scroll", "a")) == []
+    assert stream.feed(_chunk(0, 'tion": "do')) == []
+    assert stream.feed(_chunk(0, 'wn"}')) == []
+    assert _id_args(stream.feed(_chunk(1, '{"url": "http://x/"}', "navigate", "b"))) == [("a", {"direction": "down"})]
+    assert _id_args(stream.feed(AIMessageChunk(content="", response_metadata={"finish_reason": "tool_calls"}))) == \
+        [("b", {"url": "http://x/"})]
+    message, rest = stream.finish()
+    assert [tc['id'] for tc in message.tool_calls] == ["a", "b"] and rest == [], (message.tool_calls, rest)
+
+    # The last call of a stream without a closing chunk is left to finish()
+    stream = ToolCallStream()
+    stream.feed(_chunk(0, '{}', "scroll", "a"))
+    assert [tc['id'] for tc in stream.finish()[1]] == ["a"]
+
+    # Calls run in order: a complete call waits behind an unfinished one with a lower index
+    stream = ToolCallStream()
+    stream.feed(_chunk(0, '{"direction": ', "scroll", "a"))
+    stream.feed(_chunk(1, '{}', "scroll", "b"))
+    assert stream.feed(_chunk(1, '')) == []
+    stream.feed(_chunk(0, '"up"}'))
+    assert [tc['id'] for tc in stream.feed(_chunk(2, '{', "scroll", "c"))] == ["a", "b"]
+
+    # Arguments that parse to something other than an object never complete
+    stream = ToolCallStream()
+    stream.feed(_chunk(0, '[1]', "scroll", "a"))
+    assert stream.feed(_chunk(1, '{}', "scroll", "b")) == []
+
+    # Nothing is handed out once a stop call's name has streamed in, including a call completed before it
+    stream = ToolCallStream(stop_names=("done",))
+    stream.feed(_chunk(0, '{}', "scroll", "a"))
+    assert stream.feed(_chunk(1, '{"res', "done", "b")) == []
+    assert stream.feed(_chunk(1, 'ult": "ok"}')) == []
+    assert [tc['id'] for tc in stream.finish()[1]] == ["a", "b"]
+
+    # Models without native streaming yield the whole message at once
+    stream = ToolCallStream()
+    assert stream.feed(AIMessage(content="", tool_calls=[{"name": "scroll", "args": {}, "id": "a"}])) == []
+    assert [tc['id'] for tc in stream.finish()[1]] == ["a"]
+
+def check_freshness():
+    now = 1_700_000_000.0
+    plain = "https://example.com/static/app.js"
+    hashed = "https://example.com/static/app.3f9a2c1d.js"
+    # Never stored
+    for cache_control in ("no-store", "no-cache", "private, max-age=600", "max-age=0", "public, max-age=-1",
+                          "max-age=soon"):
+        assert freshness(hashed, {"Cache-Control": cache_control}, now) is None, cache_control
+    assert freshness(plain, {"Expires": "Tue, 14 Nov 2023 22:00:00 GMT"}, now) is None # in the past
+    assert freshness(plain, {"Expires": "not a date"}, now) is None
+    # Lifetime from the headers (names are case-insensitive, s-maxage wins)
+    assert freshness(plain, {"cache-control": "public, max-age=600"}, now) == 600
+    assert freshness(plain, {"Cache-Control": "max-age=600, s-maxage=60"}, now) == 60
+    assert freshness(plain, {"Cache-Control": 'max-age="300"'}, now) == 300
+    assert freshness(plain, {"Expires": "Tue, 14 Nov 2023 23:13:20 GMT"}, now) == 3600
+    # Neither header: only content-hashed URLs are kept
+    assert freshness(plain, {}, now) is None
+    for url in (hashed, "https://example.com/main-4b8e1f0a9c.chunk.css", "https://example.com/index-BpXz1abC.js?v=1"):
+        assert freshness(url, {}, now) == float("inf"), url
+    for url in ("https://example.com/image_20240101.png", "https://example.com/jquery-3.7.1.min.js",
+                "https://example.com/abcdefgh.css", "https://example.com/1700000000123.js",
+                "https://example.com/3f9a2c1d.js"):
+        assert freshness(url, {}, now) is None, url
+
+def _stream_turn(agent):
+    return agent._stream("vision", agent.model, [HumanMessage(content="goal")])
+
+def check_streamed_tools_run_early():
+    agent = RecordingAgent([{"calls": [{"tool": "scroll", "args": {"direction": "down"}},
+                                       {"tool": "scroll", "args": {"direction": "up"}}]}])
+    response = _stream_turn(agent)
+    assert agent.executed == ["scroll", "scroll"], agent.executed
+    assert sorted(agent.early_results) == sorted(tc['id'] for tc in response.tool_calls), agent.early_results
+
+def check_done_response_runs_no_tools():
+    # 'done' ends the run without running the response's tools, even those streamed before it
+    agent = RecordingAgent([{"calls": [{"tool": "scroll", "args": {"direction": "down"}},
+                                       {"tool": "done", "args": {"result": "finished"}}]}])
+    response = _stream_turn(agent)
+    assert [tc['name'] for tc in response.tool_calls] == ["scroll", "done"], response.tool_calls
+    assert agent.executed == [], agent.executed
+    assert agent.early_results == {}, agent.early_results
+
+    agent = RecordingAgent([{"calls": [{"tool": "done", "args": {"result": "finished"}},
+                                       {"tool": "scroll", "args": {"direction": "down"}}]}])
+    _stream_turn(agent)
+    assert agent.executed == [] and agent.early_results == {}, agent.executed
+
+    # Only a call already followed by another one can have run; its result is discarded
+    agent = RecordingAgent([{"calls": [{"tool": "scroll", "args": {"direction": "down"}},
+                                       {"tool": "scroll", "args": {"direction": "up"}},
+                                       {"tool": "done", "args": {"result": "finished"}}]}])
+    _stream_turn(agent)
+    assert agent.executed == ["scroll"] and agent.early_results == {}, (agent.executed, agent.early_results)
+
+CHECKS = [check_freshness, check_tool_call_stream, check_streamed_tools_run_early, check_done_response_runs_no_tools]
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"ok    {check.__name__}")
+        except Exception:
+            failed += 1
+            print(f"FAIL  {check.__name__}")
+            traceback.print_exc()
+    print(f"{len(CHECKS) - failed}/{len(CHECKS)} checks passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
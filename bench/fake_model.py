@@ -0,0 +1,114 @@
+import re
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+ELEMENT_LINE = re.compile(r"ID: (\d+) \| Tag: (\w+) \| Text: (.*)")
+
+# Streamed tool-call arguments arrive in pieces of this many characters
+STREAM_PIECE = 16
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the vision model.
+
+    Replays a script of tool calls, one per model turn. A step may name its
+    target element by visible text (`"target": "Login"`); the ID is looked up in
+    the element list of the prompt it receives, just like the real model would.
+    An `act_batch` step lists its actions the same way:
+    `{"tool": "act_batch", "actions": [{"action": "click", "target": "Login"}]}`.
+    A step with `calls` (a list of such steps) answers one turn with several
+    tool calls: `{"calls": [{"tool": "scroll"}, {"tool": "done"}]}`.
+    `latency` simulates the provider round-trip; when streamed, the tool-call
+    arguments arrive in pieces spread over it.
+
+        ScriptedChatModel(script=[
+            {"tool": "navigate", "args": {"url": "http://127.0.0.1:8000/small"}},
+            {"tool": "type_text", "target": "Username", "args": {"text": "standard_user"}},
+            {"tool": "click_element", "target": "Login"},
+            {"tool": "done", "args": {"result": "logged in"}},
+        ])
+    """
+    script: List[Dict[str, Any]]
+    latency: float = 0.0
+    position: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _resolve(self, messages, target: str) -> Optional[int]:
+        prompt = "\n".join(m.text for m in messages)
+        elements = [m.groups() for m in ELEMENT_LINE.finditer(prompt)]
+        exact = next((int(i) for i, _, text in elements if text.strip() == target), None)
+        if exact is not None:
+            return exact
+        return next((int(i) for i, _, text in elements if target in text), None)
+
+    def _next_message(self, messages) -> AIMessage:
+        if self.position >= len(self.script):
+            return AIMessage(content="Script exhausted.")
+
+        step = self.script[self.position]
+        self.position += 1
+        calls = step.get("calls", [step])
+        return AIMessage(
+            content="",
+            tool_calls=[self._tool_call(messages, call, f"call_{self.position}" + (f"_{i}" if i else ""))
+                        for i, call in enumerate(calls)]
+        )
+
+    def _tool_call(self, messages, step, call_id) -> Dict[str, Any]:
+        args = dict(step.get("args", {}))
+        if "target" in step:
+            element_id = self._resolve(messages, step["target"])
+            if element_id is None:
+                raise ValueError(f"Scripted target '{step['target']}' is not in the element list")
+            args["element_id"] = element_id
+        if "actions" in step:
+            args["actions"] = []
+            for action in step["actions"]:
+                element_id = self._resolve(messages, action["target"])
+                if element_id is None:
+                    raise ValueError(f"Scripted target '{action['target']}' is not in the element list")
+                args["actions"].append({
+                    "action": action["action"], "element_id": element_id, "text": action.get("text")
+                })
+
+        return {"name": step["tool"], "args": args, "id": call_id}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._next_message(messages)
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._next_message(messages)
+        if not message.tool_calls:
+            if self.latency:
+                time.sleep(self.latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=message.content))
+            return
+        for index, tool_call in enumerate(message.tool_calls):
+            text = json.dumps(tool_call["args"])
+            pieces = [text[i:i + STREAM_PIECE] for i in range(0, len(text), STREAM_PIECE)]
+            for n, piece in enumerate(pieces):
+                if self.latency:
+                    time.sleep(self.latency / len(pieces) / len(message.tool_calls))
+                first = n == 0
+                yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                    "name": tool_call["name"] if first else None,
+                    "args": piece,
+                    "id": tool_call["id"] if first else None,
+                    "index": index
+                }]))
+        # Providers close the stream with a chunk carrying the finish reason
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", response_metadata={"finish_reason": "tool_calls"}))
@@ -0,0 +1,116 @@
+"""
+Local fixture web app for offline benchmarks.
+
+Pages:
+  /small           - login form (username, password, login button)
+  /inventory       - a handful of "Add to cart" buttons (target of /small)
+  /large?n=5000    - n interactive elements
+  /slow?ms=800     - a button whose click fires an XHR that takes `ms` to answer
+  /embedded        - buttons in the page, in an open shadow root and in an iframe (/frame)
+  /api/slow?ms=800 - the slow endpoint itself
+"""
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>body {{ font-family: sans-serif; margin: 24px; }} .grid button {{ margin: 2px; }}</style>
+</head><body>{body}</body></html>"""
+
+def small_page():
+    return PAGE.format(title="Login", body="""
+<h1>Fixture Shop</h1>
+<form onsubmit="return false;">
+  <input id="user-name" name="user-name" placeholder="Username">
+  <input id="password" name="password" type="password" placeholder="Password">
+  <button id="login-button" onclick="location.href='/inventory?user=' + encodeURIComponent(document.getElementById('user-name').value)">Login</button>
+</form>""")
+
+def inventory_page():
+    items = "\n".join(
+        f'<div class="item"><span>Item {i}</span> <button id="add-{i}" '
+        f'onclick="this.textContent=\'Remove\';document.getElementById(\'badge\').textContent=\'1\'">Add to cart</button></div>'
+        for i in range(1, 7)
+    )
+    return PAGE.format(title="Inventory", body=f'<a id="cart" href="#">Cart <span id="badge"></span></a>\n{items}')
+
+def large_page(n):
+    buttons = "".join(f'<button id="b{i}">Button {i}</button>' for i in range(n))
+    return PAGE.format(title="Large", body=f'<div class="grid">{buttons}</div>')
+
+def slow_page(ms):
+    return PAGE.format(title="Slow", body=f"""
+<button id="load" onclick="
+  const out = document.getElementById('result');
+  out.textContent = 'Loading...';
+  fetch('/api/slow?ms={ms}').then(r => r.text()).then(t => {{ out.textContent = t; }});
+">Load data</button>
+<div id="result"></div>""")
+
+def embedded_page():
+    return PAGE.format(title="Embedded", body="""
+<button id="plain">Plain button</button>
+<div id="host"></div>
+<iframe id="frame" src="/frame" width="400" height="120"></iframe>
+<script>
+  document.getElementById('host').attachShadow({mode: 'open'}).innerHTML =
+    '<button id="shadow">Shadow button</button>';
+</script>""")
+
+def frame_page():
+    return PAGE.format(title="Frame", body="""
+<button id="framed" onclick="this.textContent='Clicked'">Framed button</button>""")
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == "/api/slow":
+            time.sleep(int(query.get("ms", ["800"])[0]) / 1000)
+            return self._send("Loaded 42 rows", "text/plain")
+
+        pages = {
+            "/small": lambda: small_page(),
+            "/inventory": lambda: inventory_page(),
+            "/large": lambda: large_page(int(query.get("n", ["5000"])[0])),
+            "/slow": lambda: slow_page(int(query.get("ms", ["800"])[0])),
+            "/embedded": lambda: embedded_page(),
+            "/frame": lambda: frame_page()
+        }
+        if url.path not in pages:
+            self.send_error(404)
+            return
+        self._send(pages[url.path](), "text/html")
+
+    def _send(self, text, content_type):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark output clean
+
+class FixtureServer:
+    """Serves the fixture pages on a free localhost port in a background thread."""
+    def __init__(self, port=0):
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), FixtureHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
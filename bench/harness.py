@@ -0,0 +1,299 @@
+"""
+Offline benchmark of the agent loop.
+
+Each scenario drives a real Agent + BrowserManager against the local fixture
+app with a ScriptedChatModel, so runs are deterministic, free and offline.
+Phase timings come from a PhaseTimings sink on the shared tracer; note that
+"tool" includes the settle wait that follows each action, "model" includes
+tools already run while the response was streaming, and "node:*" spans
+include their sub-phases.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import signal
+import socket
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from langchain_core.messages import HumanMessage
+
+from bench.fake_model import ScriptedChatModel
+from browser.manager import BrowserManager
+from core.agent import Agent
+from core.tracing import Tracer, PhaseTimings
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# How fresh agent processes get their browser in the startup benchmark
+STARTUP_MODES = ("launch", "daemon")
+
+def _small(base):
+    return [
+        {"tool": "navigate", "args": {"url": f"{base}/small"}},
+        {"tool": "type_text", "target": "Username", "args": {"text": "standard_user"}},
+        {"tool": "type_text", "target": "Password", "args": {"text": "secret_sauce"}},
+        {"tool": "click_element", "target": "Login"},
+        {"tool": "click_element", "target": "Add to cart"},
+        {"tool": "done", "args": {"result": "Item added"}}
+    ]
+
+def _small_batched(base):
+    return [
+        {"tool": "navigate", "args": {"url": f"{base}/small"}},
+        {"tool": "act_batch", "actions": [
+            {"action": "type", "target": "Username", "text": "standard_user"},
+            {"action": "type", "target": "Password", "text": "secret_sauce"},
+            {"action": "click", "target": "Login"}
+        ]},
+        {"tool": "click_element", "target": "Add to cart"},
+        {"tool": "done", "args": {"result": "Item added"}}
+    ]
+
+def _large(base):
+    return [
+        {"tool": "navigate", "args": {"url": f"{base}/large?n=5000"}},
+        {"tool": "click_element", "target": "Button 4200"},
+        {"tool": "click_element", "target": "Button 17"},
+        {"tool": "done", "args": {"result": "Clicked"}}
+    ]
+
+def _slow_xhr(base):
+    return [
+        {"tool": "navigate", "args": {"url": f"{base}/slow?ms=800"}},
+        {"tool": "click_element", "target": "Load data"},
+        {"tool": "done", "args": {"result": "Loaded"}}
+    ]
+
+# Goals name the scripted targets, as a real ticket would, so they stay in the element list
+GOALS = {
+    "small": "Log in and add an item to the cart",
+    "small_batched": "Log in and add an item to the cart",
+    "large": "Click Button 4200, then Button 17",
+    "slow_xhr": "Load the data"
+}
+
+# Pages for the capture-only comparison of grounding backends
+CAPTURE_PAGES = {
+    "small": "/small",
+    "large": "/large?n=5000",
+    "embedded": "/embedded"
+}
+
+SCENARIOS = {
+    "small": _small,
+    "small_batched": _small_batched,
+    "large": _large,
+    "slow_xhr": _slow_xhr
+}
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(RESULTS_DIR), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+def run_scenario(name, base_url, repeat=1, model_latency=0.0, headless=True, browser_config=None):
+    timings = PhaseTimings()
+    tracer = Tracer([timings])
+    steps = 0
+    loop_seconds = 0.0
+    tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            # Always a launched browser, so results don't depend on a daemon being up
+            browser = BrowserManager(headless=headless, tracer=tracer, use_daemon=False)
+            if browser_config:
+                browser.configure(browser_config)
+            browser.start()
+            try:
+                model = ScriptedChatModel(script=SCENARIOS[name](base_url), latency=model_latency)
+                agent = Agent(browser=browser, model=model, use_replay=False)
+                goal = GOALS[name]
+                start = time.perf_counter()
+                agent.app.invoke(
+                    {"messages": [HumanMessage(content=goal)], "screenshot": "", "items": [], "goal": goal},
+                    {"recursion_limit": 100}
+                )
+                loop_seconds += time.perf_counter() - start
+                steps += agent.model_calls
+            finally:
+                browser.stop()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "scenario": name,
+        "runs": repeat,
+        "steps": steps,
+        "loop_s": round(loop_seconds, 3),
+        "steps_per_sec": round(steps / loop_seconds, 3) if loop_seconds else None,
+        "phases": timings.summary(),
+        "counters": dict(timings.counters),
+        "peak_python_heap_mb": round(peak / (1024 * 1024), 1),
+        "max_rss_mb": _max_rss_mb()
+    }
+
+def _meta(options):
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options
+    }
+
+def run_benchmarks(names, base_url, groundings=("full",), **kwargs):
+    """Runs each scenario once per grounding mode; with several modes, results are named `<scenario>@<mode>`."""
+    scenarios = []
+    for name in names:
+        for mode in groundings:
+            result = run_scenario(name, base_url, browser_config={"grounding": {"mode": mode}}, **kwargs)
+            if len(groundings) > 1:
+                result["scenario"] = f"{name}@{mode}"
+            scenarios.append(result)
+    return {"meta": _meta({"groundings": list(groundings), **kwargs}), "scenarios": scenarios}
+
+def run_capture_benchmark(groundings, base_url, repeat=5, headless=True):
+    """
+    Page capture alone (grounding, screenshot, encoding), `repeat` times per
+    fixture page and grounding mode, with the number of elements each finds.
+    """
+    captures = []
+    for page, path in CAPTURE_PAGES.items():
+        for mode in groundings:
+            timings = PhaseTimings()
+            browser = BrowserManager(headless=headless, tracer=Tracer([timings]), grounding_mode=mode,
+                                     use_daemon=False)
+            browser.start()
+            try:
+                browser.navigate(f"{base_url}{path}")
+                timings.reset() # Only the captures
+                for _ in range(repeat):
+                    state = browser.capture_state()
+            finally:
+                browser.stop()
+            captures.append({
+                "page": page,
+                "grounding": mode,
+                "elements": len(state['items']),
+                "phases": {name: stats for name, stats in timings.summary().items()
+                           if name in ("grounding", "screenshot", "encoding")}
+            })
+    return {"meta": _meta({"groundings": list(groundings), "repeat": repeat}), "captures": captures}
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _start_daemon(headless, timeout=30):
+    """Runs scripts/browser_daemon.py on a free port with its own state file; returns (process, endpoint)."""
+    state = os.path.join(tempfile.mkdtemp(), "daemon.json")
+    command = [sys.executable, os.path.join(ROOT, "scripts", "browser_daemon.py"),
+               "--port", str(_free_port()), "--state", state]
+    if not headless:
+        command.append("--headed")
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+    deadline = time.perf_counter() + timeout
+    while not os.path.exists(state):
+        if process.poll() is not None or time.perf_counter() > deadline:
+            process.kill()
+            raise RuntimeError("Browser daemon did not start")
+        time.sleep(0.1)
+    with open(state, "r", encoding="utf-8") as f:
+        return process, json.load(f)['endpoint']
+
+def _stop_daemon(process):
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def _ms(start, end):
+    return round((end - start) * 1000, 1)
+
+def _startup_run(base_url, endpoint, headless):
+    """One fresh `python -m bench.startup` process; milliseconds per startup phase."""
+    command = [sys.executable, "-m", "bench.startup", base_url]
+    if endpoint:
+        command += ["--endpoint", endpoint]
+    if not headless:
+        command.append("--headed")
+    spawned = time.time()
+    output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    run = json.loads(output.strip().splitlines()[-1])
+    if not run['result'] or run['result'].startswith("Error"):
+        raise RuntimeError(f"First action failed: {run['result']}")
+    stamps = run['stamps']
+    return {
+        "interpreter_ms": _ms(spawned, stamps['started']),
+        "imports_ms": _ms(stamps['started'], stamps['imported']),
+        "agent_init_ms": _ms(stamps['imported'], stamps['agent_ready']),
+        "loop_to_first_action_ms": _ms(stamps['agent_ready'], stamps['first_action']),
+        "browser_start_ms": run['browser_start_ms'],
+        "time_to_first_action_ms": _ms(spawned, stamps['first_action']),
+        "attached": run['attached'],
+        "provider_modules": run['provider_modules']
+    }
+
+def run_startup_benchmark(base_url, repeat=3, headless=True, modes=STARTUP_MODES):
+    """
+    Time to first action of a fresh agent process (interpreter, imports, agent
+    setup, browser start, first navigate), `repeat` times per mode: "launch"
+    starts Chromium in every process, "daemon" attaches to one browser daemon.
+    """
+    startups = []
+    for mode in modes:
+        daemon, endpoint = _start_daemon(headless) if mode == "daemon" else (None, None)
+        try:
+            runs = [_startup_run(base_url, endpoint, headless) for _ in range(repeat)]
+        finally:
+            if daemon:
+                _stop_daemon(daemon)
+        phases = [key for key, value in runs[0].items() if key.endswith("_ms") and value is not None]
+        startups.append({
+            "mode": mode,
+            "runs": runs,
+            "mean_ms": {key: round(sum(r[key] for r in runs) / len(runs), 1) for key in phases}
+        })
+    return {"meta": _meta({"repeat": repeat, "modes": list(modes)}), "startups": startups}
+
+def save_results(results, path=None):
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"{stamp}-{results['meta']['commit']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+def compare(baseline, current):
+    """Returns printable lines comparing two result files scenario by scenario."""
+    lines = [f"baseline {baseline['meta']['commit']} -> current {current['meta']['commit']}"]
+    before = {s['scenario']: s for s in baseline['scenarios']}
+    for scenario in current['scenarios']:
+        old = before.get(scenario['scenario'])
+        if not old:
+            continue
+        lines.append(f"{scenario['scenario']}: steps/sec {old['steps_per_sec']} -> {scenario['steps_per_sec']}")
+        for phase, stats in scenario['phases'].items():
+            old_stats = old['phases'].get(phase)
+            if old_stats:
+                delta = stats['mean_ms'] - old_stats['mean_ms']
+                lines.append(f"  {phase:10} mean {old_stats['mean_ms']:8.1f}ms -> {stats['mean_ms']:8.1f}ms ({delta:+.1f})")
+    return lines
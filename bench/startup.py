@@ -0,0 +1,72 @@
+"""
+Time-to-first-action probe, run in a fresh interpreter by
+bench.harness.run_startup_benchmark (imports are part of what it measures).
+
+Builds an Agent with a scripted model whose first action navigates to the
+fixture login page, runs the loop until that action has finished, and prints
+one JSON line: wall-clock stamps, the browser start time, whether the
+browser was attached over CDP and what the first action returned.
+
+    python -m bench.startup http://127.0.0.1:8000 [--endpoint http://127.0.0.1:9333]
+"""
+import time
+STARTED = time.time() # Before any other import
+
+import sys
+import json
+import argparse
+
+from langchain_core.messages import HumanMessage
+
+from bench.fake_model import ScriptedChatModel
+from browser.manager import BrowserManager
+from core.agent import Agent
+from core.tracing import Tracer, PhaseTimings
+
+# Provider SDKs the agent may import; with lazy imports only the selected one (none here) is loaded
+PROVIDER_MODULES = ("langchain_openai", "langchain_anthropic")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first action of a fresh agent process.")
+    parser.add_argument("base_url", help="Fixture server URL")
+    parser.add_argument("--endpoint", help="CDP endpoint of a browser daemon (default: launch Chromium)")
+    parser.add_argument("--headed", action="store_true")
+    args = parser.parse_args()
+
+    stamps = {"started": STARTED, "imported": time.time()}
+    timings = PhaseTimings()
+    # Only the endpoint given, never a daemon left running on this machine
+    browser = BrowserManager(headless=not args.headed, tracer=Tracer([timings]), cdp_endpoint=args.endpoint,
+                             use_daemon=False)
+    model = ScriptedChatModel(script=[
+        {"tool": "navigate", "args": {"url": f"{args.base_url}/small"}},
+        {"tool": "done", "args": {"result": "Opened"}}
+    ])
+    agent = Agent(browser=browser, model=model, use_replay=False)
+    stamps["agent_ready"] = time.time()
+
+    goal = "Open the login page"
+    result = None
+    try:
+        for event in agent.app.stream(
+            {"messages": [HumanMessage(content=goal)], "screenshot": "", "items": [], "goal": goal},
+            {"recursion_limit": 10}
+        ):
+            if "tools" in event:
+                stamps["first_action"] = time.time()
+                result = str(event["tools"]["messages"][0].content)
+                break
+    finally:
+        browser.stop()
+
+    browser_start = timings.summary().get("browser_start", {})
+    print(json.dumps({
+        "stamps": stamps,
+        "browser_start_ms": browser_start.get("total_ms"),
+        "attached": browser.attached,
+        "result": result,
+        "provider_modules": [m for m in PROVIDER_MODULES if m in sys.modules]
+    }))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import time
+import asyncio
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+from browser.manager import BrowserManager, VIEWPORT, SCROLL_STEP
+from browser.imaging import screenshot_args, process_screenshot
+from browser.settle import INSTRUMENTATION_SCRIPT, SETTLED_PREDICATE, PAGE_VERSION_SCRIPT
+from browser.resolve import RESOLVE_SCRIPT, StaleElementError
+from browser.cdp_grounding import SNAPSHOT_PARAMS, STAMP_FUNCTION, ax_names, snapshot_items, find_frame
+from browser.daemon import alaunch_or_attach
+from browser.tiles import PAGE_GEOMETRY_SCRIPT, SCROLL_TO_SCRIPT, CONTENT_VERSION_SCRIPT, tile_fingerprint
+
+class AsyncBrowserManager(BrowserManager):
+    """
+    Async counterpart of BrowserManager built on playwright.async_api.
+
+    Shares configuration and element lookup with the sync manager; only the
+    methods that touch the page are coroutines. Many sessions can run on one
+    event loop, each with its own context on a shared browser.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._warming = None # Task of the start() begun by prewarm
+
+    async def start(self, storage_state=None):
+        self.storage_state = storage_state
+        if self.context:
+            await self.context.close()
+        if self.browser is None:
+            with self.tracer.span("browser_start") as span:
+                self.playwright = await async_playwright().start()
+                # Probing a daemon's state file is a blocking HTTP request; keep it off the event loop
+                endpoint = await asyncio.to_thread(self._endpoint)
+                self.browser, self.attached = await alaunch_or_attach(self.playwright.chromium, self.headless,
+                                                                       endpoint)
+                span.set(attached=self.attached)
+        self.context = await self.browser.new_context(**self._context_options())
+        if self.settle.strategy == "smart":
+            await self.context.add_init_script(INSTRUMENTATION_SCRIPT)
+        if self.interceptor:
+            await self.context.route("**/*", self.interceptor.async_handler)
+        self.page = await self.context.new_page()
+
+    def prewarm(self):
+        """Starts opening the session in the background, e.g. while the first model call runs."""
+        if not self.page and self._warming is None:
+            self._warming = asyncio.ensure_future(self.start())
+
+    async def ensure_started(self):
+        """Starts a session unless one is open, or waits for the one prewarm is opening."""
+        warming, self._warming = self._warming, None
+        if warming is not None:
+            await warming
+        if not self.page:
+            await self.start()
+
+    async def stop(self):
+        if self._warming is not None:
+            # Let a prewarmed start finish so everything it opened gets closed below
+            warming, self._warming = self._warming, None
+            try:
+                await warming
+            except PlaywrightError:
+                pass
+        if self.interceptor:
+            print(f"Interception: {self.interception_stats()}")
+        if self.context:
+            await self.context.close()
+            self.context = None
+            self.page = None
+        if self._owns_browser:
+            if self.browser:
+                if not self.attached:
+                    await self.browser.close()
+                self.browser = None
+            if self.playwright:
+                await self.playwright.stop()
+                self.playwright = None
+
+    async def navigate(self, url):
+        await self.page.goto(url)
+        await self.wait_for_settle("navigate")
+
+    async def save_storage_state(self, path):
+        await self.context.storage_state(path=path)
+
+    async def has_selector(self, selector, timeout=3000):
+        try:
+            await self.page.wait_for_selector(selector, state="visible", timeout=timeout)
+            return True
+        except PlaywrightError:
+            return False
+
+    async def wait_for_settle(self, action="", selector=None):
+        """Async version of BrowserManager.wait_for_settle."""
+        start = time.perf_counter()
+        timed_out = False
+        with self.tracer.span("settle", action=action, strategy=self.settle.strategy) as span:
+            if self.settle.strategy == "networkidle":
+                try:
+                    await self.page.wait_for_load_state('networkidle', timeout=self.settle.timeout_ms)
+                except PlaywrightTimeoutError:
+                    timed_out = True
+            elif self.settle.strategy == "smart":
+                timed_out = await self._wait_smart(start, selector or self.settle.wait_for_selector)
+            span.set(timed_out=timed_out)
+        return self._record_settle(action, start, timed_out)
+
+    async def _wait_smart(self, start, selector):
+        deadline = start + self.settle.timeout_ms / 1000
+        while True:
+            remaining = (deadline - time.perf_counter()) * 1000
+            if remaining <= 0:
+                return True
+            try:
+                if selector:
+                    await self.page.wait_for_selector(selector, state="visible", timeout=remaining)
+                    selector = None
+                    continue
+                await self.page.wait_for_function(
+                    SETTLED_PREDICATE,
+                    arg=self.settle.predicate_arg(),
+                    timeout=remaining,
+                    polling=self.settle.poll_ms
+                )
+                return False
+            except PlaywrightTimeoutError:
+                return True
+            except PlaywrightError:
+                await asyncio.sleep(self.settle.poll_ms / 1000)
+
+    async def _cdp_session(self):
+        if self._cdp is None or self._cdp_page is not self.page:
+            self._cdp = await self.context.new_cdp_session(self.page)
+            self._cdp_page = self.page
+        return self._cdp
+
+    async def _cdp_items(self):
+        session = await self._cdp_session()
+        snapshot = await session.send("DOMSnapshot.captureSnapshot", SNAPSHOT_PARAMS)
+        names = None
+        if self.grounding_accessibility:
+            try:
+                names = ax_names(await session.send("Accessibility.getFullAXTree"))
+            except PlaywrightError as e:
+                print(f"Accessibility tree unavailable, using attribute names: {e}")
+        return snapshot_items(snapshot, names)
+
+    async def _ground(self):
+        if self.grounding_mode == "cdp":
+            return await self._cdp_items()
+        return await self.page.evaluate(self.grounding_script)
+
+    async def _stamp(self, target):
+        session = await self._cdp_session()
+        try:
+            node = await session.send("DOM.resolveNode", {"backendNodeId": target.backend_id})
+            object_id = node['object']['objectId']
+            await session.send("Runtime.callFunctionOn", {
+                "objectId": object_id, "functionDeclaration": STAMP_FUNCTION, "arguments": [{"value": target.id}]
+            })
+            await session.send("Runtime.releaseObject", {"objectId": object_id})
+        except PlaywrightError:
+            pass
+
+    async def _target_frame(self, target):
+        if target.frame is None:
+            return self.page
+        session = await self._cdp_session()
+        return find_frame(self.page.frames, await session.send("Page.getFrameTree"), target.frame) or self.page
+
+    async def _resolve(self, target):
+        with self.tracer.span("resolve") as span:
+            frame = self.page
+            if target.backend_id is not None:
+                await self._stamp(target)
+                frame = await self._target_frame(target)
+            strategy = await frame.evaluate(RESOLVE_SCRIPT, self.resolve.script_arg(target, self.elements.absolute))
+            span.set(strategy=strategy)
+        return frame, self._resolved(target, strategy)
+
+    async def page_version(self):
+        try:
+            version = await self.page.evaluate(PAGE_VERSION_SCRIPT)
+        except PlaywrightError:
+            return None
+        return version if version[1] is not None else await self.content_version()
+
+    async def content_version(self):
+        try:
+            return await self.page.evaluate(CONTENT_VERSION_SCRIPT)
+        except PlaywrightError:
+            return None
+
+    async def interact(self, action_type, element_id, value=None, settle=True):
+        """Async version of BrowserManager.interact."""
+        target = self._find_target(element_id)
+        frame, selector = await self._resolve(target)
+        tag = target.tag
+        timeout = self.resolve.action_timeout_ms
+
+        print(f"Interacting with ID {element_id} ({tag}): {action_type}")
+
+        if action_type == "click":
+            await frame.click(selector, timeout=timeout)
+
+        elif action_type == "type":
+            await frame.fill(selector, value, timeout=timeout)
+
+        elif action_type == "submit":
+            await frame.press(selector, "Enter", timeout=timeout)
+
+        if settle:
+            await self.wait_for_settle(action_type)
+
+    async def _batch_changed(self, url, version):
+        if self.page.url != url:
+            return f"the page navigated to {self.page.url}"
+        if await self.content_version() != version:
+            return "the page content changed (a dialog, message or re-render may cover the next target)"
+        return None
+
+    async def interact_batch(self, actions):
+        """Async version of BrowserManager.interact_batch."""
+        url, version = self.page.url, await self.content_version()
+        for index, action in enumerate(actions):
+            reason = await self._batch_changed(url, version) if index else None
+            if reason:
+                return index, reason
+            try:
+                await self.interact(action['action'], action['element_id'], value=action.get('text'),
+                                    settle=self._batch_settle(actions, index))
+            except (StaleElementError, PlaywrightError) as e:
+                return index, str(e)
+            if action['action'] == "type":
+                version = await self.content_version()
+        return len(actions), None
+
+    async def scroll(self, direction="down"):
+        """Async version of BrowserManager.scroll."""
+        viewport = self.page.viewport_size or VIEWPORT
+        step = viewport['height'] * SCROLL_STEP * (-1 if direction == "up" else 1)
+        await self.page.evaluate("(dy) => window.scrollBy(0, dy)", step)
+        await self.wait_for_settle("scroll")
+        _, scroll_y, height = await self.page.evaluate(PAGE_GEOMETRY_SCRIPT)
+        return scroll_y, height
+
+    async def _discover(self):
+        scroll_x, scroll_y, height = await self.page.evaluate(PAGE_GEOMETRY_SCRIPT)
+        url = self.page.url
+        if not self.capture.discover or self.tile_cache.discovered(url, height):
+            return
+        viewport = self.page.viewport_size or VIEWPORT
+        with self.tracer.span("discover") as span:
+            tiles = 1
+            while tiles < self.capture.max_tiles and tiles * viewport['height'] < height:
+                await self.page.evaluate(SCROLL_TO_SCRIPT, [0, tiles * viewport['height']])
+                await self.wait_for_settle("tile")
+                _, _, height = await self.page.evaluate(PAGE_GEOMETRY_SCRIPT)
+                tiles += 1
+            if tiles > 1:
+                await self.page.evaluate(SCROLL_TO_SCRIPT, [scroll_x, scroll_y])
+            span.set(tiles=tiles, height=height)
+        self.tile_cache.mark_discovered(url, height)
+
+    async def capture_state(self, with_screenshot=True, query=""):
+        """Async version of BrowserManager.capture_state."""
+        if self.capture.tiled:
+            await self._discover()
+        with self.tracer.span("grounding", mode=self.grounding_mode) as span:
+            items = self._apply_grounding(await self._ground())
+            if self.capture.tiled:
+                scroll_x, self.scroll_y, self.page_height = await self.page.evaluate(PAGE_GEOMETRY_SCRIPT)
+                items.to_page(scroll_x, self.scroll_y)
+            span.set(elements=len(items))
+        self.tracer.count("elements", len(items))
+
+        state = {
+            "screenshot": "",
+            "items": items,
+            "diff": self.last_diff,
+            "url": self.page.url,
+            "viewport": self.page.viewport_size or VIEWPORT
+        }
+        if self.capture.tiled:
+            state["page_height"] = self.page_height
+        if with_screenshot:
+            state.update(await self.capture_screenshot(query))
+        return state
+
+    async def _screenshot(self, viewport, clip=None):
+        marks = self._drawn_marks()
+        args = screenshot_args(self.image_options, self.elements, viewport, marks=bool(marks))
+        if clip:
+            args.update(full_page=True, clip=clip)
+        with self.tracer.span("screenshot") as span:
+            raw = await self.page.screenshot(**args)
+            span.set(bytes=len(raw))
+        with self.tracer.span("encoding", format=self.image_options.format) as span:
+            image = process_screenshot(raw, self.image_options, args, viewport, marks)
+            span.set(bytes=len(image.data), width=image.width, height=image.height)
+        self.tracer.count("image_bytes", len(image.data))
+        return image
+
+    async def _tile_version(self):
+        return await self.page_version() if self.grounding_mode == "cdp" else await self.content_version()
+
+    async def capture_screenshot(self, query=""):
+        """Async version of BrowserManager.capture_screenshot."""
+        viewport = self.page.viewport_size or VIEWPORT
+        if not self.capture.tiled:
+            image = await self._screenshot(viewport)
+            return {"screenshot": image.b64, "image": image}
+
+        tiles, chosen = self._plan_tiles(viewport, query)
+        url, version = self.page.url, await self._tile_version()
+        shots = []
+        for tile in chosen:
+            fingerprint = tile_fingerprint(tile, self.elements, version)
+            # No version (mid-navigation): nothing to tell a stale tile by
+            image = self.tile_cache.get(url, tile, fingerprint) if version is not None else None
+            self.tracer.count("tile_cache", 1, outcome="miss" if image is None else "hit")
+            if image is None:
+                image = await self._screenshot(viewport, tile.rect())
+                self.tile_cache.put(url, tile, fingerprint, image)
+            shots.append({"index": tile.index, "rect": tile.rect(), "image": image})
+        return self._tiles_state(shots, tiles, viewport)
@@ -0,0 +1,218 @@
+"""
+CDP grounding backend (`grounding: {mode: cdp}`).
+
+Instead of running grounding.js (which reads the layout and style of every
+candidate and adds one marker div per element to the live DOM), the element
+map is built from one `DOMSnapshot.captureSnapshot` call, plus an optional
+`Accessibility.getFullAXTree` for accessible names:
+
+  - layout boxes, computed visibility and input values come from the snapshot,
+    which Chromium produces without forcing extra layouts from page script;
+  - same-process iframes and open shadow roots are part of the snapshot, so
+    their elements are found too (closed and user-agent shadow roots are not);
+  - nothing is added to the page: the numeric marks are drawn onto the
+    screenshot in Python (browser/imaging.py), and an element is stamped with
+    `data-som-id` only when an action targets it (`STAMP_FUNCTION`).
+
+Element rules (tags, roles, visibility) are the same as grounding.js.
+"""
+from typing import Any, Dict, List, Optional
+
+from browser.resolve import ID_ATTRIBUTE
+
+CANDIDATE_TAGS = {"button", "a", "input", "textarea", "select"}
+CANDIDATE_ROLES = {"button", "link", "checkbox", "menuitem"}
+
+# Computed styles requested per layout node, in this order
+COMPUTED_STYLES = ["display", "visibility", "opacity"]
+SNAPSHOT_PARAMS = {"computedStyles": COMPUTED_STYLES}
+
+# Elements under these shadow roots can't be reached by selectors, so they are never marked
+HIDDEN_SHADOW_ROOTS = {"closed", "user-agent"}
+
+# Called on the element (Runtime.callFunctionOn) right before an action; false if it left the page
+STAMP_FUNCTION = """
+function (id) {
+    if (!this.isConnected) return false;
+    this.getRootNode().querySelectorAll('[%s="' + id + '"]').forEach((el) => el.removeAttribute('%s'));
+    this.setAttribute('%s', String(id));
+    return true;
+}
+""" % (ID_ATTRIBUTE, ID_ATTRIBUTE, ID_ATTRIBUTE)
+
+def _rare(data: Optional[Dict[str, list]]) -> Dict[int, Any]:
+    """Snapshot "rare" data ({index: [...], value: [...]}) as a node index -> value dict."""
+    if not data:
+        return {}
+    if 'value' not in data:
+        return {index: True for index in data['index']}
+    return dict(zip(data['index'], data['value']))
+
+def ax_names(ax_tree: Optional[Dict[str, Any]]) -> Dict[int, str]:
+    """backendDOMNodeId -> accessible name, from an Accessibility.getFullAXTree result."""
+    names = {}
+    for node in (ax_tree or {}).get('nodes', []):
+        name = (node.get('name') or {}).get('value')
+        if node.get('backendDOMNodeId') and isinstance(name, str) and name.strip():
+            names[node['backendDOMNodeId']] = name
+    return names
+
+class _Document:
+    """One document of the snapshot, with the lookups grounding needs."""
+    def __init__(self, doc: Dict[str, Any], strings: List[str]):
+        self.strings = strings
+        nodes = doc['nodes']
+        self.parents = nodes['parentIndex']
+        self.names = nodes['nodeName']
+        self.values = nodes.get('nodeValue') or []
+        self.backend_ids = nodes['backendNodeId']
+        self.attributes = nodes.get('attributes') or []
+        self.input_values = _rare(nodes.get('inputValue'))
+        self.shadow_roots = _rare(nodes.get('shadowRootType'))
+        self.content_documents = _rare(nodes.get('contentDocumentIndex'))
+        self.frame = self.string(doc.get('frameId', -1))
+        self.scroll = (doc.get('scrollOffsetX', 0), doc.get('scrollOffsetY', 0))
+
+        layout = doc['layout']
+        self.bounds = {}
+        self.styles = {}
+        for position, index in enumerate(layout['nodeIndex']):
+            if index not in self.bounds:
+                self.bounds[index] = layout['bounds'][position]
+                self.styles[index] = layout['styles'][position]
+
+        # Children lists (nodes come in document order, parents first)
+        self.children = [[] for _ in self.parents]
+        self.hidden = [False] * len(self.parents)
+        for index, parent in enumerate(self.parents):
+            shadow = self.string(self.shadow_roots[index]) if index in self.shadow_roots else None
+            self.hidden[index] = shadow in HIDDEN_SHADOW_ROOTS or (parent >= 0 and self.hidden[parent])
+            if parent >= 0:
+                self.children[parent].append(index)
+
+    def string(self, index) -> Optional[str]:
+        return self.strings[index] if isinstance(index, int) and 0 <= index < len(self.strings) else None
+
+    def tag(self, index) -> str:
+        return (self.string(self.names[index]) or "").lower()
+
+    def attrs(self, index) -> Dict[str, str]:
+        flat = self.attributes[index] if index < len(self.attributes) else []
+        return {self.string(flat[i]): self.string(flat[i + 1]) or "" for i in range(0, len(flat) - 1, 2)}
+
+    def style(self, index) -> Dict[str, str]:
+        return dict(zip(COMPUTED_STYLES, (self.string(s) for s in self.styles.get(index, []))))
+
+    def visible(self, index) -> bool:
+        bounds = self.bounds.get(index)
+        if not bounds or bounds[2] <= 0 or bounds[3] <= 0:
+            return False
+        style = self.style(index)
+        return style.get('visibility') != 'hidden' and style.get('display') != 'none' and style.get('opacity') != '0'
+
+    def text(self, index) -> str:
+        """Rendered text under the node (text nodes with a layout box), the snapshot's stand-in for innerText."""
+        parts = []
+        stack = [index]
+        while stack:
+            node = stack.pop()
+            if self.hidden[node] != self.hidden[index]:
+                continue # e.g. the user-agent shadow tree of an <input>
+            if self.tag(node) == "#text":
+                if node in self.bounds:
+                    parts.append(self.string(self.values[node]) or "")
+                continue
+            stack.extend(reversed(self.children[node]))
+        return " ".join(" ".join(parts).split())
+
+def _selector(tag: str, attrs: Dict[str, str]) -> str:
+    # Same rules as getSelector in grounding.js
+    if attrs.get('id'):
+        return f"#{attrs['id']}"
+    if attrs.get('name'):
+        return f'[name="{attrs["name"]}"]'
+    path = tag
+    if attrs.get('class'):
+        path += "." + ".".join(attrs['class'].split(' '))
+    return path
+
+def _is_candidate(tag: str, attrs: Dict[str, str]) -> bool:
+    return tag in CANDIDATE_TAGS or 'onclick' in attrs or attrs.get('role') in CANDIDATE_ROLES
+
+def _origins(documents: List[_Document]) -> List[Optional[tuple]]:
+    """Viewport position of each document's origin; None for documents not shown (e.g. detached frames)."""
+    origins = [None] * len(documents)
+    if documents:
+        origins[0] = (0.0, 0.0)
+    # Owner iframes always come before the documents they contain
+    for position, doc in enumerate(documents):
+        if origins[position] is None:
+            continue
+        for owner, child in doc.content_documents.items():
+            bounds = doc.bounds.get(owner)
+            if bounds and child < len(documents):
+                origins[child] = (origins[position][0] + bounds[0] - doc.scroll[0],
+                                  origins[position][1] + bounds[1] - doc.scroll[1])
+    return origins
+
+def snapshot_items(snapshot: Dict[str, Any], names: Optional[Dict[int, str]] = None) -> List[Dict[str, Any]]:
+    """
+    Turns a DOMSnapshot.captureSnapshot result into grounding items (same shape
+    as grounding.js, rects relative to the viewport), plus `backend_id` and
+    `frame` (the CDP frame id, None for the main frame) to act on them later.
+    """
+    names = names or {}
+    documents = [_Document(doc, snapshot['strings']) for doc in snapshot['documents']]
+    origins = _origins(documents)
+    items = []
+    for position, doc in enumerate(documents):
+        origin = origins[position]
+        if origin is None:
+            continue
+        for index in range(len(doc.parents)):
+            if doc.hidden[index]:
+                continue
+            tag = doc.tag(index)
+            if not tag or tag[0] == '#':
+                continue
+            attrs = doc.attrs(index)
+            if not _is_candidate(tag, attrs) or not doc.visible(index):
+                continue
+            x, y, width, height = doc.bounds[index]
+            value = doc.string(doc.input_values[index]) if index in doc.input_values else None
+            text = doc.text(index) or value or attrs.get('placeholder', '')
+            backend_id = doc.backend_ids[index]
+            items.append({
+                "id": len(items) + 1,
+                "tag": tag,
+                "text": text,
+                "name": names.get(backend_id) or attrs.get('aria-label') or attrs.get('title') or
+                        attrs.get('alt') or text or "",
+                "selector": _selector(tag, attrs),
+                "rect": {
+                    "x": origin[0] + x - doc.scroll[0],
+                    "y": origin[1] + y - doc.scroll[1],
+                    "width": width,
+                    "height": height
+                },
+                "backend_id": backend_id,
+                "frame": doc.frame if position else None
+            })
+    return items
+
+def find_frame(frames, frame_tree: Dict[str, Any], frame_id: str):
+    """
+    The Playwright frame (of `frames`) with this CDP frame id, or None.
+    Playwright doesn't expose CDP ids, so the frame is matched by URL and name.
+    """
+    stack = [frame_tree['frameTree']]
+    while stack:
+        node = stack.pop()
+        if node['frame']['id'] == frame_id:
+            info = node['frame']
+            break
+        stack.extend(node.get('childFrames', []))
+    else:
+        return None
+    url = info.get('url', '') + info.get('urlFragment', '')
+    return next((f for f in frames if f.url == url and f.name == info.get('name', '')), None)
@@ -0,0 +1,120 @@
+"""
+Long-lived local browser for fast CLI startup (scripts/browser_daemon.py).
+
+The daemon launches Chromium once with a CDP port, lets it spawn its helper
+processes and records its endpoint in a state file. Managers and suite runners
+started afterwards attach with `connect_over_cdp` instead of launching their
+own Chromium. Only the process startup is paid in advance: no contexts are
+kept ready, each session still creates a fresh one, so cookies and storage
+never leak between runs.
+Attached clients only disconnect when they stop; the daemon's browser stays up,
+and its `--headed` flag (not the client's `headless`) decides if windows show.
+
+The endpoint is taken from, in order: the manager's `cdp_endpoint`, the
+BROWSER_CDP_ENDPOINT environment variable, and the state file of a running
+daemon. With none of them (or `browser: {daemon: false}`) Chromium is launched
+as before.
+"""
+import os
+import json
+import time
+import tempfile
+import urllib.request
+from typing import Any, Dict, Optional
+
+from playwright.sync_api import Error as PlaywrightError
+
+DEFAULT_PORT = 9333
+STATE_FILE = os.path.join(tempfile.gettempdir(), "qa-agent-browser-daemon.json")
+ENDPOINT_ENV = "BROWSER_CDP_ENDPOINT"
+
+# Throwaway contexts opened and closed at daemon start, because the first contexts of a
+# fresh Chromium pay for spawning its network, GPU and renderer processes. None are kept for clients
+WARMUP_CONTEXTS = 2
+
+def _alive(endpoint: str, timeout: float = 0.5) -> bool:
+    try:
+        with urllib.request.urlopen(f"{endpoint}/json/version", timeout=timeout) as response:
+            return response.status == 200
+    except (OSError, ValueError):
+        return False
+
+def read_state(path: str = STATE_FILE) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def daemon_endpoint(path: str = STATE_FILE) -> Optional[str]:
+    """CDP endpoint to attach to, or None to launch a browser (a stale state file counts as none)."""
+    endpoint = os.environ.get(ENDPOINT_ENV)
+    if endpoint:
+        return endpoint
+    state = read_state(path)
+    if state and _alive(state['endpoint']):
+        return state['endpoint']
+    return None
+
+def launch_or_attach(chromium, headless=True, endpoint=None):
+    """
+    Sync Playwright: attaches to `endpoint` if given (see daemon_endpoint), else launches.
+    Returns (browser, attached); close attached browsers by stopping Playwright, not with browser.close().
+    """
+    if endpoint:
+        try:
+            browser = chromium.connect_over_cdp(endpoint)
+            print(f"Attached to browser daemon at {endpoint}")
+            return browser, True
+        except PlaywrightError as e:
+            print(f"Browser daemon at {endpoint} unavailable ({e}); launching Chromium")
+    return chromium.launch(headless=headless), False
+
+async def alaunch_or_attach(chromium, headless=True, endpoint=None):
+    """Async version of launch_or_attach."""
+    if endpoint:
+        try:
+            browser = await chromium.connect_over_cdp(endpoint)
+            print(f"Attached to browser daemon at {endpoint}")
+            return browser, True
+        except PlaywrightError as e:
+            print(f"Browser daemon at {endpoint} unavailable ({e}); launching Chromium")
+    return await chromium.launch(headless=headless), False
+
+def serve(port: int = DEFAULT_PORT, headless: bool = True, path: str = STATE_FILE, warmup: int = WARMUP_CONTEXTS):
+    """
+    Runs the daemon in the foreground until interrupted or the browser exits.
+    `warmup` throwaway contexts get Chromium's processes started; clients still create their own contexts.
+    """
+    from playwright.sync_api import sync_playwright
+
+    endpoint = f"http://127.0.0.1:{port}"
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch(headless=headless, args=[f"--remote-debugging-port={port}"])
+        start = time.perf_counter()
+        for _ in range(warmup):
+            context = browser.new_context()
+            context.new_page().goto("about:blank")
+            context.close()
+        # Stays open: keeps a renderer alive, and waiting on it notices a crashed browser
+        keepalive = browser.new_page()
+        print(f"Started Chromium's processes with {warmup} throwaway contexts in "
+              f"{(time.perf_counter() - start) * 1000:.0f}ms")
+
+        # Written atomically: clients poll for this file
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"endpoint": endpoint, "pid": os.getpid(), "headless": headless}, f)
+        os.replace(f"{path}.tmp", path)
+        print(f"Browser daemon listening on {endpoint} (state: {path})")
+        try:
+            while browser.is_connected():
+                keepalive.wait_for_timeout(500)
+        except (KeyboardInterrupt, PlaywrightError):
+            pass
+        finally:
+            state = read_state(path)
+            if state and state.get('pid') == os.getpid():
+                os.remove(path)
+            if browser.is_connected():
+                browser.close()
+    print("Browser daemon stopped")
@@ -0,0 +1,139 @@
+"""
+Compact element map for one page capture.
+
+The grounding scripts return a list of dicts; they are converted once into
+`Element` records (`__slots__`, flat rect) held by an `ElementStore` with a
+dict index by ID. The store also renders the model's element list: elements
+inside the viewport plus off-screen ones matching the current step, capped at
+`max_elements` (the most relevant win), and memoized per capture.
+"""
+import re
+from typing import Any, Dict, Iterator, List, Optional
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Element texts are collapsed to one line and cut to this length in prompts
+MAX_TEXT_CHARS = 80
+
+class Element:
+    __slots__ = ("id", "tag", "text", "name", "selector", "x", "y", "width", "height", "backend_id", "frame")
+
+    def __init__(self, id, tag, text, selector, x=0.0, y=0.0, width=0.0, height=0.0, name=None,
+                 backend_id=None, frame=None):
+        self.id = id
+        self.tag = tag
+        self.text = text
+        self.name = text if name is None else name # Accessible name, for re-resolution
+        self.selector = selector
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        # Set by the CDP grounding backend: DOM node to stamp before acting, and its frame (None: main frame)
+        self.backend_id = backend_id
+        self.frame = frame
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> "Element":
+        rect = item.get('rect') or {}
+        return cls(
+            item['id'], item.get('tag', ''), item.get('text') or '', item.get('selector', ''),
+            rect.get('x', 0.0), rect.get('y', 0.0), rect.get('width', 0.0), rect.get('height', 0.0),
+            item.get('name'), item.get('backend_id'), item.get('frame')
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "tag": self.tag, "text": self.text, "name": self.name, "selector": self.selector,
+            "rect": {"x": self.x, "y": self.y, "width": self.width, "height": self.height}
+        }
+
+    def in_viewport(self, viewport: Dict[str, int]) -> bool:
+        """Overlaps `viewport` ({width, height}, or a region with x/y too, e.g. a page tile)."""
+        left, top = viewport.get('x', 0), viewport.get('y', 0)
+        return (self.width > 0 and self.height > 0 and
+                self.x + self.width > left and self.y + self.height > top and
+                self.x < left + viewport['width'] and self.y < top + viewport['height'])
+
+    def label(self) -> str:
+        return " ".join(self.text.split())[:MAX_TEXT_CHARS]
+
+    def __repr__(self):
+        return f"Element({self.id}, {self.tag!r}, {self.label()!r})"
+
+def _on_screen(element: Element, regions) -> bool:
+    return regions is None or any(element.in_viewport(r) for r in regions)
+
+class ElementStore:
+    def __init__(self, elements: Optional[List[Element]] = None):
+        self.elements = elements or []
+        self.by_id = {e.id: e for e in self.elements}
+        self._text_counts = None
+        self._rendered = {}
+        self.absolute = False # Coordinates are page-absolute (tiled capture) instead of viewport-relative
+
+    @classmethod
+    def from_items(cls, items: List[Dict[str, Any]]) -> "ElementStore":
+        return cls([Element.from_dict(item) for item in items])
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __iter__(self) -> Iterator[Element]:
+        return iter(self.elements)
+
+    def to_page(self, scroll_x: float, scroll_y: float):
+        """Shifts viewport-relative coordinates, captured at this scroll offset, to page-absolute ones."""
+        for e in self.elements:
+            e.x += scroll_x
+            e.y += scroll_y
+        self.absolute = True
+        self._rendered = {}
+
+    def get(self, element_id) -> Optional[Element]:
+        return self.by_id.get(element_id)
+
+    def text_count(self, text: str) -> int:
+        """How many elements carry this (stripped) text; used to spot ambiguous targets."""
+        if self._text_counts is None:
+            self._text_counts = {}
+            for e in self.elements:
+                key = e.text.strip()
+                self._text_counts[key] = self._text_counts.get(key, 0) + 1
+        return self._text_counts.get(text.strip(), 0)
+
+    def select(self, viewport=None, max_elements: Optional[int] = None, query: str = "") -> List[Element]:
+        """
+        Elements worth showing the model, in page order: those inside `viewport`
+        (if given; a list of regions such as page tiles also works) plus
+        off-screen ones whose text matches `query`. Past `max_elements`, the
+        ones sharing most words with `query` win, on-screen first on ties.
+        """
+        regions = viewport if isinstance(viewport, list) else [viewport] if viewport else None
+        if max_elements is None:
+            return [e for e in self.elements if _on_screen(e, regions)]
+        words = set(TOKEN_RE.findall(query.lower()))
+        ranked = []
+        for index, e in enumerate(self.elements):
+            relevance = len(words.intersection(TOKEN_RE.findall(e.text.lower()))) if words else 0
+            on_screen = _on_screen(e, regions)
+            if on_screen or relevance:
+                ranked.append((-relevance, not on_screen, index))
+        if len(ranked) > max_elements:
+            ranked.sort()
+            ranked = ranked[:max_elements]
+        return [self.elements[index] for index in sorted(r[2] for r in ranked)]
+
+    def render(self, viewport=None, max_elements: Optional[int] = None, query: str = "") -> str:
+        """The `ID | Tag | Text` list for the prompt, memoized per arguments."""
+        regions = viewport if isinstance(viewport, list) else [viewport] if viewport else []
+        key = (tuple(tuple(sorted(r.items())) for r in regions), max_elements, query)
+        if key not in self._rendered:
+            shown = self.select(viewport, max_elements, query)
+            lines = [f"ID: {e.id} | Tag: {e.tag} | Text: {e.label()}" for e in shown]
+            hidden = len(self.elements) - len(shown)
+            if hidden:
+                lines.append(f"({hidden} more elements off-screen or less relevant are not listed; "
+                             f"scroll to reach them)")
+            self._rendered[key] = "\n".join(lines)
+        return self._rendered[key]
@@ -0,0 +1,48 @@
+import io
+import hashlib
+import json
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DHASH_SIZE = 16 # 256-bit hash: coarse enough to ignore noise, fine enough to see a new banner
+
+def items_fingerprint(elements, url=None):
+    """
+    Stable hash of what the agent can act on: the URL plus each marked element's
+    tag, text and selector. Element IDs are left out on purpose because they are
+    just the enumeration order.
+    """
+    payload = [url or ""] + [
+        [e.tag, e.text.strip(), e.selector]
+        for e in elements
+    ]
+    return hashlib.sha1(json.dumps(payload, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def image_hash(data):
+    """
+    Perceptual difference hash (dHash, DHASH_SIZE² bits) of an encoded screenshot, so
+    re-encoding noise doesn't count as a change. Without Pillow (or for bytes
+    it can't decode) this falls back to an exact hash of the bytes.
+    """
+    if Image is None:
+        return hashlib.sha1(data).hexdigest()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            pixels = list(image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE)).getdata())
+    except OSError:
+        return hashlib.sha1(data).hexdigest()
+    bits = 0
+    for row in range(DHASH_SIZE):
+        for col in range(DHASH_SIZE):
+            left = pixels[row * (DHASH_SIZE + 1) + col]
+            bits = (bits << 1) | (left > pixels[row * (DHASH_SIZE + 1) + col + 1])
+    return bits
+
+def hash_distance(a, b):
+    """Bits that differ between two image hashes (exact hashes are 0 or the maximum apart)."""
+    if isinstance(a, int) and isinstance(b, int):
+        return bin(a ^ b).count("1")
+    return 0 if a == b else DHASH_SIZE * DHASH_SIZE
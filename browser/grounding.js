@@ -4,12 +4,16 @@
  * This script scans the DOM for interactive elements, filters out invisible ones,
  * and overlays a unique numeric ID on top of them.
  * 
- * Returns: A map of { ID: { tag, text, selector, coordinates } }
+ * Each marked element is stamped with data-som-id="<ID>" so actions can find it
+ * again without the selector.
+ *
+ * Returns: A map of { ID: { tag, text, name, selector, coordinates } }
  */
 
 (function () {
     // 1. Reset existing marks if any
     document.querySelectorAll('.som-marker').forEach(el => el.remove());
+    document.querySelectorAll('[data-som-id]').forEach(el => el.removeAttribute('data-som-id'));
     window.somMap = {};
 
     // 2. Define interactive selectors
@@ -53,6 +57,19 @@
         return path;
     }
 
+    // Accessible name, used to re-find the element if it is re-rendered (same as browser/resolve.py)
+    function getName(el) {
+        const labelledBy = el.getAttribute('aria-labelledby');
+        const byId = labelledBy && labelledBy.split(/\s+/)
+            .map((id) => document.getElementById(id))
+            .filter(Boolean)
+            .map((node) => node.innerText)
+            .join(' ');
+        const label = el.labels && el.labels.length ? el.labels[0].innerText : '';
+        return el.getAttribute('aria-label') || byId || label || el.getAttribute('title') ||
+            el.getAttribute('alt') || el.innerText || el.value || el.placeholder || '';
+    }
+
     // 5. Iterate and Mark
     elements.forEach(el => {
         if (!isVisible(el)) return;
@@ -77,12 +94,14 @@
         marker.style.pointerEvents = 'none'; // Don't block clicks
 
         document.body.appendChild(marker);
+        el.setAttribute('data-som-id', String(idCounter));
 
         // Store Metadata
         items.push({
             id: idCounter,
             tag: el.tagName.toLowerCase(),
             text: el.innerText || el.value || el.placeholder || '',
+            name: getName(el),
             selector: getSelector(el),
             rect: {
                 x: rect.x,
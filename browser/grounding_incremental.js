@@ -0,0 +1,244 @@
+/**
+ * Incremental Set of Marks (SoM) Script
+ *
+ * Same element rules as grounding.js, but keeps its state on the page between
+ * captures. A MutationObserver (installed on the first run) records which
+ * subtrees changed; later runs only re-scan those subtrees, so element IDs stay
+ * stable and an unchanged page costs almost nothing to ground again. Tracked
+ * elements carry data-som-id="<ID>" so actions can find them without selectors.
+ *
+ * Returns: { items: [...same shape as grounding.js...],
+ *            diff: { added: [ids], removed: [ids], moved: [ids] },
+ *            full: true if this was a full scan }
+ */
+
+(function () {
+    const selectors = [
+        'button',
+        'a',
+        'input',
+        'textarea',
+        'select',
+        '[onclick]',
+        '[role="button"]',
+        '[role="link"]',
+        '[role="checkbox"]',
+        '[role="menuitem"]'
+    ].join(',');
+
+    // 1. Install page state + observer once per document
+    let som = window.__somIncremental;
+    if (!som || !som.layer.isConnected) {
+        if (som) som.observer.disconnect(); // body was replaced, start over
+        som = window.__somIncremental = {
+            ids: new WeakMap(),      // element -> stable id
+            elements: new Map(),     // id -> element
+            records: new Map(),      // id -> last reported item
+            markers: new Map(),      // id -> marker div
+            nextId: 1,
+            dirty: new Set(),        // subtree roots to re-scan
+            layoutDirty: false,      // rects may have moved (scroll, resize, DOM insertions)
+            fullScan: true,
+            layer: document.createElement('div'),
+            observer: null
+        };
+
+        som.layer.id = 'som-layer';
+        som.layer.style.position = 'absolute';
+        som.layer.style.left = '0px';
+        som.layer.style.top = '0px';
+        som.layer.style.pointerEvents = 'none';
+        som.layer.style.zIndex = '999999';
+        document.body.appendChild(som.layer);
+
+        const markDirty = (node) => {
+            const el = node.nodeType === Node.ELEMENT_NODE ? node : node.parentElement;
+            if (el && !som.layer.contains(el)) som.dirty.add(el);
+        };
+        som.observer = new MutationObserver((mutations) => {
+            for (const m of mutations) {
+                if (som.layer.contains(m.target)) continue;
+                markDirty(m.target);
+                if (m.type === 'childList' || m.attributeName === 'style' || m.attributeName === 'class') {
+                    som.layoutDirty = true;
+                }
+            }
+        });
+        som.observer.observe(document.body, {
+            subtree: true,
+            childList: true,
+            attributes: true,
+            characterData: true
+        });
+
+        // Typed values and viewport moves don't show up as DOM mutations
+        document.addEventListener('input', (e) => markDirty(e.target), true);
+        document.addEventListener('change', (e) => markDirty(e.target), true);
+        window.addEventListener('scroll', () => { som.layoutDirty = true; }, { capture: true, passive: true });
+        window.addEventListener('resize', () => { som.layoutDirty = true; });
+    }
+
+    // Flush mutations that have not been delivered to the callback yet
+    som.observer.takeRecords().forEach((m) => {
+        if (!som.layer.contains(m.target)) {
+            som.dirty.add(m.target.nodeType === Node.ELEMENT_NODE ? m.target : m.target.parentElement);
+            if (m.type === 'childList') som.layoutDirty = true;
+        }
+    });
+
+    // 2. Helpers (same rules as grounding.js)
+    function isVisible(el, rect) {
+        const style = window.getComputedStyle(el);
+        return (
+            rect.width > 0 &&
+            rect.height > 0 &&
+            style.visibility !== 'hidden' &&
+            style.display !== 'none' &&
+            style.opacity !== '0'
+        );
+    }
+
+    function getSelector(el) {
+        if (el.id) return `#${el.id}`;
+        if (el.name) return `[name="${el.name}"]`;
+        let path = el.tagName.toLowerCase();
+        if (el.className) path += `.${el.className.split(' ').join('.')}`;
+        return path;
+    }
+
+    // Accessible name, used to re-find the element if it is re-rendered (same as browser/resolve.py)
+    function getName(el) {
+        const labelledBy = el.getAttribute('aria-labelledby');
+        const byId = labelledBy && labelledBy.split(/\s+/)
+            .map((id) => document.getElementById(id))
+            .filter(Boolean)
+            .map((node) => node.innerText)
+            .join(' ');
+        const label = el.labels && el.labels.length ? el.labels[0].innerText : '';
+        return el.getAttribute('aria-label') || byId || label || el.getAttribute('title') ||
+            el.getAttribute('alt') || el.innerText || el.value || el.placeholder || '';
+    }
+
+    function sameRect(a, b) {
+        return a.x === b.x && a.y === b.y && a.width === b.width && a.height === b.height;
+    }
+
+    const diff = { added: [], removed: [], moved: [] };
+    const wasFull = som.fullScan;
+
+    function placeMarker(id, rect) {
+        let marker = som.markers.get(id);
+        if (!marker) {
+            marker = document.createElement('div');
+            marker.className = 'som-marker';
+            marker.textContent = id;
+            marker.style.position = 'absolute';
+            marker.style.backgroundColor = '#ff0000'; // High contrast red
+            marker.style.color = 'white';
+            marker.style.fontWeight = 'bold';
+            marker.style.fontSize = '12px';
+            marker.style.padding = '2px 4px';
+            marker.style.border = '1px solid white';
+            marker.style.borderRadius = '2px';
+            som.layer.appendChild(marker);
+            som.markers.set(id, marker);
+        }
+        marker.style.left = `${window.scrollX + rect.x}px`;
+        marker.style.top = `${window.scrollY + rect.y}px`;
+    }
+
+    function drop(id) {
+        som.records.delete(id);
+        som.elements.delete(id);
+        const marker = som.markers.get(id);
+        if (marker) marker.remove();
+        som.markers.delete(id);
+        diff.removed.push(id);
+    }
+
+    // 3. Re-measure one candidate element
+    function measure(el) {
+        const r = el.getBoundingClientRect();
+        const rect = { x: r.x, y: r.y, width: r.width, height: r.height };
+        let id = som.ids.get(el);
+
+        if (!isVisible(el, rect)) {
+            if (id !== undefined && som.records.has(id)) drop(id);
+            return;
+        }
+        if (id === undefined) {
+            id = som.nextId++;
+            som.ids.set(el, id);
+        }
+
+        const previous = som.records.get(id);
+        som.elements.set(id, el);
+        if (el.getAttribute('data-som-id') !== String(id)) el.setAttribute('data-som-id', String(id));
+        som.records.set(id, {
+            id: id,
+            tag: el.tagName.toLowerCase(),
+            text: el.innerText || el.value || el.placeholder || '',
+            name: getName(el),
+            selector: getSelector(el),
+            rect: rect
+        });
+
+        if (!previous) {
+            diff.added.push(id);
+            placeMarker(id, rect);
+        } else if (!sameRect(previous.rect, rect)) {
+            diff.moved.push(id);
+            placeMarker(id, rect);
+        }
+    }
+
+    // 4. Decide what to scan
+    const seen = new Set();
+    const visit = (el) => {
+        if (seen.has(el)) return;
+        seen.add(el);
+        measure(el);
+    };
+
+    if (som.fullScan) {
+        document.querySelectorAll(selectors).forEach(visit);
+        som.fullScan = false;
+    } else {
+        som.dirty.forEach((root) => {
+            if (!root || !root.isConnected) return;
+            if (root.matches(selectors)) visit(root);
+            root.querySelectorAll(selectors).forEach(visit);
+        });
+    }
+
+    // Tracked elements that left the DOM
+    som.elements.forEach((el, id) => {
+        if (!el.isConnected) drop(id);
+    });
+
+    // Layout may have shifted: only rects are re-read for the untouched elements
+    if (som.layoutDirty && !wasFull) {
+        som.elements.forEach((el, id) => {
+            if (seen.has(el)) return;
+            const r = el.getBoundingClientRect();
+            const rect = { x: r.x, y: r.y, width: r.width, height: r.height };
+            const record = som.records.get(id);
+            if (!sameRect(record.rect, rect)) {
+                record.rect = rect;
+                diff.moved.push(id);
+                placeMarker(id, rect);
+            }
+        });
+    }
+
+    som.dirty.clear();
+    som.layoutDirty = false;
+    // Our own marker writes must not count as page changes next time
+    som.observer.takeRecords();
+
+    return {
+        items: Array.from(som.records.values()).sort((a, b) => a.id - b.id),
+        diff: diff,
+        full: wasFull
+    };
+})();
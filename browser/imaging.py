@@ -0,0 +1,178 @@
+"""
+Screenshot encoding pipeline.
+
+Playwright encodes PNG/JPEG itself; WebP output, downscaling, the per-image
+byte budget and marks drawn in Python (CDP grounding) need Pillow (optional:
+`pip install pillow`). Without it the pipeline falls back to whatever
+Playwright can produce directly.
+"""
+import io
+import base64
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = None
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+# Budget search: lower quality first, then shrink
+MIN_QUALITY = 30
+QUALITY_STEP = 15
+SHRINK_FACTOR = 0.8
+
+# Marks drawn by draw_marks, styled like the grounding.js markers
+MARK_FILL = (255, 0, 0)
+MARK_TEXT = (255, 255, 255)
+MARK_PADDING = (4, 2)
+
+@dataclass
+class ImageOptions:
+    format: str = "png"
+    quality: int = 80
+    max_long_edge: Optional[int] = None
+    crop_to_marks: bool = False
+    crop_padding: int = 16
+    max_bytes: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]):
+        """Builds options from the `screenshot:` block of a project's config.yaml."""
+        config = dict(config or {})
+        if config.get('format') == 'jpg':
+            config['format'] = 'jpeg'
+        known = {k: v for k, v in config.items() if k in cls.__dataclass_fields__}
+        options = cls(**known)
+        if options.format not in MIME_TYPES:
+            raise ValueError(f"Unsupported screenshot format: {options.format}")
+        return options
+
+    def needs_pillow(self):
+        return self.format == "webp" or bool(self.max_long_edge) or bool(self.max_bytes)
+
+@dataclass
+class EncodedImage:
+    """Raw image bytes plus their base64 form, computed at most once."""
+    data: bytes
+    mime: str
+    width: int
+    height: int
+    _b64: Optional[str] = None
+
+    @property
+    def b64(self) -> str:
+        if self._b64 is None:
+            self._b64 = base64.b64encode(self.data).decode('utf-8')
+        return self._b64
+
+    @property
+    def extension(self) -> str:
+        return self.mime.split('/')[-1].replace('jpeg', 'jpg')
+
+    def data_url(self) -> str:
+        return f"data:{self.mime};base64,{self.b64}"
+
+_warned_no_pillow = False
+
+def _warn_no_pillow():
+    global _warned_no_pillow
+    if not _warned_no_pillow:
+        print("Pillow is not installed; WebP, downscaling, byte budgets and drawn marks are disabled.")
+        _warned_no_pillow = True
+
+def marks_clip(elements, viewport: Dict[str, int], padding: int = 0):
+    """Union of all marked element rects (plus padding), clamped to the viewport."""
+    rects = [e for e in elements if e.width and e.height]
+    if not rects:
+        return None
+    left = max(0, min(e.x for e in rects) - padding)
+    top = max(0, min(e.y for e in rects) - padding)
+    right = min(viewport['width'], max(e.x + e.width for e in rects) + padding)
+    bottom = min(viewport['height'], max(e.y + e.height for e in rects) + padding)
+    if right <= left or bottom <= top:
+        return None
+    return {"x": left, "y": top, "width": right - left, "height": bottom - top}
+
+def screenshot_args(options: ImageOptions, elements, viewport, marks: bool = False) -> Dict[str, Any]:
+    """Keyword arguments for `page.screenshot` under these options (`marks`: they are drawn afterwards)."""
+    args = {"full_page": False}
+    if options.crop_to_marks:
+        clip = marks_clip(elements, viewport, options.crop_padding)
+        if clip:
+            args["clip"] = clip
+
+    if (options.needs_pillow() or marks) and Image is not None:
+        # Lossless source; Pillow does the final encode
+        args["type"] = "png"
+    elif options.format in ("jpeg", "webp"):
+        if options.format == "webp":
+            _warn_no_pillow()
+        args["type"] = "jpeg"
+        args["quality"] = options.quality
+    else:
+        args["type"] = "png"
+    return args
+
+def _encode(img, fmt, quality):
+    buffer = io.BytesIO()
+    if fmt == "png":
+        img.save(buffer, format="PNG", optimize=False)
+    elif fmt == "jpeg":
+        img.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    else:
+        img.save(buffer, format="WEBP", quality=quality)
+    return buffer.getvalue()
+
+def draw_marks(img, elements, origin=(0, 0), scale: float = 1.0):
+    """Draws each element's ID at its top-left corner; `origin` is the viewport point at the image's (0, 0)."""
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default()
+    for e in elements:
+        if not (e.width and e.height):
+            continue
+        x, y = (e.x - origin[0]) * scale, (e.y - origin[1]) * scale
+        if x >= img.width or y >= img.height or x + e.width * scale <= 0 or y + e.height * scale <= 0:
+            continue
+        x, y = max(0, x), max(0, y)
+        left, top, right, bottom = draw.textbbox((x + MARK_PADDING[0], y + MARK_PADDING[1]), str(e.id), font=font)
+        draw.rectangle((x, y, right + MARK_PADDING[0], bottom + MARK_PADDING[1]), fill=MARK_FILL, outline=MARK_TEXT)
+        draw.text((x + MARK_PADDING[0], y + MARK_PADDING[1]), str(e.id), fill=MARK_TEXT, font=font)
+
+def process_screenshot(raw: bytes, options: ImageOptions, args: Dict[str, Any], viewport, marks=None) -> EncodedImage:
+    """
+    Turns the bytes produced with `screenshot_args` into the final encoded image.
+    `marks` are elements whose IDs are drawn onto it (needs Pillow).
+    """
+    clip = args.get("clip")
+    width = int(clip["width"]) if clip else viewport["width"]
+    height = int(clip["height"]) if clip else viewport["height"]
+
+    if not (options.needs_pillow() or marks) or Image is None:
+        if options.needs_pillow() or marks:
+            _warn_no_pillow()
+        return EncodedImage(raw, MIME_TYPES[args["type"]], width, height)
+
+    img = Image.open(io.BytesIO(raw))
+    img.load()
+    if marks:
+        # Before any downscaling, in screenshot pixels (device pixel ratio included)
+        origin = (clip["x"], clip["y"]) if clip else (0, 0)
+        draw_marks(img, marks, origin, img.width / width)
+    if options.max_long_edge and max(img.size) > options.max_long_edge:
+        scale = options.max_long_edge / max(img.size)
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.BILINEAR)
+
+    quality = options.quality
+    data = _encode(img, options.format, quality)
+    while options.max_bytes and len(data) > options.max_bytes:
+        if options.format != "png" and quality - QUALITY_STEP >= MIN_QUALITY:
+            quality -= QUALITY_STEP
+        elif min(img.size) > 64:
+            img = img.resize((int(img.width * SHRINK_FACTOR), int(img.height * SHRINK_FACTOR)), Image.BILINEAR)
+        else:
+            break
+        data = _encode(img, options.format, quality)
+
+    return EncodedImage(data, MIME_TYPES[options.format], img.width, img.height)
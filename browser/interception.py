@@ -0,0 +1,233 @@
+"""
+Request interception profiles.
+
+A profile blocks resource types / URL patterns the agent never needs (fonts,
+media, trackers, ads) and can serve static assets from a local disk cache that
+is shared across sessions. Note that Playwright bypasses the browser's own HTTP
+cache for routed requests, which is why the local cache exists.
+
+Only responses that say how long they stay fresh are cached: `Cache-Control`
+no-store / no-cache / private / max-age=0 are never stored, `max-age` or
+`Expires` bound the entry's lifetime (capped by `cache_max_age`), and a
+response with neither is only kept when its URL carries a content hash (e.g.
+app.3f9a2c1d.js), so a freshly deployed bundle of the site under test is
+always fetched again.
+
+Stats count requests blocked and bytes/requests served from the local cache
+(bytes as sent over the network when the response said so, else the body
+size); the size of blocked responses is unknown, so they are counted by
+request only.
+"""
+import os
+import re
+import asyncio
+import json
+import time
+import hashlib
+import threading
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'http')
+
+# Cache-Control directives that rule out reusing a response without revalidating it
+UNCACHEABLE_DIRECTIVES = {"no-store", "no-cache", "private"}
+# Content hash in a file name, as bundlers add it: app.3f9a2c1d.js, main-4b8e1f0a9c.chunk.css.
+# Digits and letters both: all-digit tokens are dates, timestamps or versions (image_20240101.png)
+HASH_TOKEN_RE = re.compile(r"^(?=[0-9a-z]*\d)(?=[0-9a-z]*[a-z])[0-9a-z]{8,}$", re.I)
+
+def _content_hashed(url: str) -> bool:
+    name = urlparse(url).path.rsplit("/", 1)[-1]
+    # Tokens between the base name and the extension
+    return any(HASH_TOKEN_RE.match(token) for token in re.split(r"[.\-_]", name)[1:-1])
+
+def freshness(url: str, headers: Dict[str, str], now: float) -> Optional[float]:
+    """Seconds the response may be reused for, per its headers (None: don't cache)."""
+    headers = {k.lower(): v for k, v in headers.items()}
+    directives = {}
+    for part in headers.get("cache-control", "").split(","):
+        name, _, value = part.strip().lower().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+    if UNCACHEABLE_DIRECTIVES & directives.keys():
+        return None
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                age = int(directives[name])
+            except ValueError:
+                return None
+            return age if age > 0 else None
+    if "expires" in headers:
+        try:
+            age = parsedate_to_datetime(headers["expires"]).timestamp() - now
+        except (TypeError, ValueError):
+            return None
+        return age if age > 0 else None
+    return float("inf") if _content_hashed(url) else None
+
+@dataclass
+class InterceptionProfile:
+    block_resource_types: List[str] = field(default_factory=list)
+    block_url_patterns: List[str] = field(default_factory=list)
+    cache_static: bool = False
+    cache_resource_types: List[str] = field(default_factory=lambda: ["script", "stylesheet", "image", "font"])
+    cache_dir: str = DEFAULT_CACHE_DIR
+    cache_max_age: int = 24 * 3600
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]):
+        """Builds the profile from the `interception:` block of a project's config.yaml."""
+        config = config or {}
+        known = {k: v for k, v in config.items() if k in cls.__dataclass_fields__}
+        return cls(**known)
+
+    def is_active(self):
+        return bool(self.block_resource_types or self.block_url_patterns or self.cache_static)
+
+@dataclass
+class InterceptionStats:
+    requests_blocked: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    bytes_saved: int = 0
+    blocked_by_type: Counter = field(default_factory=Counter)
+
+    def as_dict(self):
+        return {
+            "requests_blocked": self.requests_blocked,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "bytes_saved": self.bytes_saved,
+            "blocked_by_type": dict(self.blocked_by_type)
+        }
+
+class StaticCache:
+    """Disk cache of successful GET responses, keyed by URL. Safe to share between threads and processes."""
+    def __init__(self, cache_dir: str, max_age: int):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.json", f"{base}.body"
+
+    def get(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            age = time.time() - meta['stored_at']
+            if age > self.max_age or age > meta.get('fresh_for', self.max_age):
+                return None
+            with open(body_path, 'rb') as f:
+                return meta, f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, url, status, headers, body: bytes, fresh_for: float, size: int):
+        meta_path, body_path = self._paths(url)
+        meta = {"url": url, "status": status, "headers": headers, "stored_at": time.time(),
+                "fresh_for": min(fresh_for, self.max_age), "size": size}
+        with self._lock:
+            # Body first, meta last: a reader only trusts entries whose meta exists
+            for path, data, mode in ((body_path, body, 'wb'), (meta_path, json.dumps(meta), 'w')):
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, mode) as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+
+class RequestInterceptor:
+    """Decides what happens to each request; the browser managers do the routing I/O."""
+    def __init__(self, profile: InterceptionProfile):
+        self.profile = profile
+        self.stats = InterceptionStats()
+        self.patterns = [re.compile(p) for p in profile.block_url_patterns]
+        self.cache = StaticCache(profile.cache_dir, profile.cache_max_age) if profile.cache_static else None
+
+    def classify(self, request) -> str:
+        """Returns "block", "cache" or "continue"."""
+        if request.resource_type in self.profile.block_resource_types or \
+                any(p.search(request.url) for p in self.patterns):
+            self.stats.requests_blocked += 1
+            self.stats.blocked_by_type[request.resource_type] += 1
+            return "block"
+        if self.cache and request.method == "GET" and request.resource_type in self.profile.cache_resource_types:
+            return "cache"
+        return "continue"
+
+    def cached(self, url):
+        return self._count_lookup(self.cache.get(url))
+
+    def _count_lookup(self, entry):
+        if entry:
+            self.stats.cache_hits += 1
+            self.stats.bytes_saved += entry[0].get('size', len(entry[1]))
+        else:
+            self.stats.cache_misses += 1
+        return entry
+
+    def store(self, url, status, headers, body):
+        if status != 200:
+            return
+        fresh_for = freshness(url, headers, time.time())
+        if fresh_for is None:
+            return
+        # Bytes a later hit saves: the (possibly compressed) transfer size when known
+        try:
+            size = int({k.lower(): v for k, v in headers.items()}.get("content-length", len(body)))
+        except ValueError:
+            size = len(body)
+        # Hop-by-hop / encoding headers don't apply to the decoded body we replay
+        headers = {k: v for k, v in headers.items()
+                   if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")}
+        self.cache.put(url, status, headers, body, fresh_for, size)
+
+    def sync_handler(self, route, request):
+        action = self.classify(request)
+        if action == "block":
+            route.abort()
+        elif action == "cache":
+            entry = self.cached(request.url)
+            if entry:
+                meta, body = entry
+                route.fulfill(status=meta['status'], headers=meta['headers'], body=body)
+                return
+            try:
+                response = route.fetch()
+                body = response.body()
+            except Exception:
+                route.continue_()
+                return
+            self.store(request.url, response.status, response.headers, body)
+            route.fulfill(response=response, body=body)
+        else:
+            route.continue_()
+
+    async def async_handler(self, route, request):
+        action = self.classify(request)
+        if action == "block":
+            await route.abort()
+        elif action == "cache":
+            # Disk I/O in a worker thread, so one session's assets don't hold up every page on the loop
+            entry = self._count_lookup(await asyncio.to_thread(self.cache.get, request.url))
+            if entry:
+                meta, body = entry
+                await route.fulfill(status=meta['status'], headers=meta['headers'], body=body)
+                return
+            try:
+                response = await route.fetch()
+                body = await response.body()
+            except Exception:
+                await route.continue_()
+                return
+            await asyncio.to_thread(self.store, request.url, response.status, response.headers, body)
+            await route.fulfill(response=response, body=body)
+        else:
+            await route.continue_()
@@ -1,85 +1,522 @@
-import base64
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
 import os
+import time
+
+from browser.imaging import ImageOptions, screenshot_args, process_screenshot
+from browser.settle import SettleConfig, INSTRUMENTATION_SCRIPT, SETTLED_PREDICATE, PAGE_VERSION_SCRIPT
+from browser.interception import InterceptionProfile, RequestInterceptor
+from browser.elements import ElementStore
+from browser.resolve import ResolveConfig, RESOLVE_SCRIPT, StaleElementError, handle_selector, stale_error
+from browser.cdp_grounding import SNAPSHOT_PARAMS, STAMP_FUNCTION, ax_names, snapshot_items, find_frame
+from browser.daemon import daemon_endpoint, launch_or_attach
+from browser.tiles import (TileConfig, TileCache, PAGE_GEOMETRY_SCRIPT, SCROLL_TO_SCRIPT, CONTENT_VERSION_SCRIPT,
+                           tile_grid, select_tiles, current_tile, tile_fingerprint)
+from core.tracing import Tracer
+
+VIEWPORT = {"width": 1280, "height": 720}
+
+GROUNDING_SCRIPTS = {"full": "grounding.js", "incremental": "grounding_incremental.js"}
+GROUNDING_MODES = (*GROUNDING_SCRIPTS, "cdp")
+
+# The scroll tool moves by this share of the viewport, so a few lines stay in view for context
+SCROLL_STEP = 0.8
 
 class BrowserManager:
-    def __init__(self, headless=False):
+    def __init__(self, headless=False, browser=None, image_options=None, grounding_mode="full", settle=None,
+                 interception=None, tracer=None, resolve=None, capture=None, cdp_endpoint=None,
+                 use_daemon=True):
+        """
+        If `browser` is given, the manager borrows that (already launched) Chromium
+        and only owns its own context. This lets a worker share one browser across
+        many isolated test sessions. Otherwise `start` attaches to `cdp_endpoint`
+        or a running browser daemon (browser/daemon.py), or launches Chromium.
+        """
         self.headless = headless
         self.playwright = None
-        self.browser = None
+        self.browser = browser
+        self.context = None
         self.page = None
-        
+        self._owns_browser = browser is None
+        self.cdp_endpoint = cdp_endpoint
+        self.use_daemon = use_daemon # Attach to a running daemon when no endpoint is given
+        self.attached = False # Connected over CDP: stop() disconnects instead of closing the browser
+        self.image_options = image_options or ImageOptions()
+        self.elements = ElementStore() # Element map of the last capture, indexed by ID
+        self.last_diff = None
+        self.settle = settle or SettleConfig()
+        self.settle_log = [] # One entry per wait: what we waited for and for how long
+        self.resolve = resolve or ResolveConfig()
+        self.resolve_counts = {} # How targets were found at action time, by strategy
+        self.interceptor = RequestInterceptor(interception) if interception and interception.is_active() else None
+        self.storage_state = None
+        self.tracer = tracer or Tracer() # Disabled (no sinks) unless one is passed in or attached
+        self._cdp = None # CDP session of the current page (cdp grounding), see _cdp_session
+        self._cdp_page = None
+        self.capture = capture or TileConfig()
+        self.tile_cache = TileCache(self.capture.cache_urls)
+        self.scroll_y = 0 # Scroll offset and document height at the last capture
+        self.page_height = None
+
         # Load grounding script
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        with open(os.path.join(current_dir, 'grounding.js'), 'r') as f:
-            self.grounding_script = f.read()
-
-    def start(self):
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=self.headless)
-        self.page = self.browser.new_page()
+        self.grounding_accessibility = True
+        self.set_grounding_mode(grounding_mode)
+
+    def set_grounding_mode(self, mode):
+        """
+        "full" re-marks the whole page on every capture (grounding.js).
+        "incremental" keeps IDs stable and only re-scans what changed (grounding_incremental.js).
+        "cdp" reads a DOM snapshot over CDP and draws the marks on the screenshot (browser/cdp_grounding.py).
+        """
+        if mode not in GROUNDING_MODES:
+            raise ValueError(f"Unknown grounding mode: {mode}")
+        self.grounding_mode = mode
+        self.grounding_script = None
+        if mode in GROUNDING_SCRIPTS:
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            with open(os.path.join(current_dir, GROUNDING_SCRIPTS[mode]), 'r') as f:
+                self.grounding_script = f.read()
+
+    def _apply_grounding(self, result):
+        """Normalizes the grounding output into the element store used for lookups."""
+        if self.grounding_mode == "incremental":
+            items = result['items']
+            self.last_diff = result['diff']
+        else:
+            items = result
+            self.last_diff = None
+        self.elements = ElementStore.from_items(items) # Element map of the last capture, indexed by ID
+        return self.elements
+
+    def configure(self, config):
+        """Applies the browser-related sections of a project's config.yaml."""
+        if 'screenshot' in config:
+            self.image_options = ImageOptions.from_config(config['screenshot'])
+        if 'grounding' in config:
+            self.set_grounding_mode(config['grounding'].get('mode', 'full'))
+            # cdp mode: accessible names from the accessibility tree (one more CDP call per capture)
+            self.grounding_accessibility = config['grounding'].get('accessibility', True)
+        if 'settle' in config:
+            self.settle = SettleConfig.from_config(config['settle'])
+        if 'resolve' in config:
+            self.resolve = ResolveConfig.from_config(config['resolve'])
+        if 'browser' in config:
+            self.use_daemon = config['browser'].get('daemon', self.use_daemon)
+            self.cdp_endpoint = config['browser'].get('endpoint', self.cdp_endpoint)
+        # Configuring twice with the same sections (suite runner, then Agent) keeps the
+        # tile cache and the interceptor the open context routes through, with its stats
+        if 'capture' in config:
+            capture = TileConfig.from_config(config['capture'])
+            if capture != self.capture:
+                self.capture = capture
+                self.tile_cache = TileCache(capture.cache_urls)
+        if 'interception' in config:
+            # Routes are installed per context, so a changed profile only affects sessions started afterwards
+            profile = InterceptionProfile.from_config(config['interception'])
+            if not profile.is_active():
+                self.interceptor = None
+            elif self.interceptor is None or self.interceptor.profile != profile:
+                self.interceptor = RequestInterceptor(profile)
+
+    def interception_stats(self):
+        return self.interceptor.stats.as_dict() if self.interceptor else {}
+
+    def _context_options(self):
+        options = {"viewport": VIEWPORT}
+        if self.storage_state:
+            options["storage_state"] = self.storage_state
+        return options
+
+    def start(self, storage_state=None):
+        """
+        Opens a fresh context (launching the browser if needed).
+        `storage_state` is a Playwright storage-state file to start from, e.g. a
+        saved authenticated session. Calling start again replaces the context.
+        """
+        self.storage_state = storage_state
+        if self.context:
+            self.context.close()
+        if self.browser is None:
+            with self.tracer.span("browser_start") as span:
+                self.playwright = sync_playwright().start()
+                self.browser, self.attached = launch_or_attach(self.playwright.chromium, self.headless,
+                                                                self._endpoint())
+                span.set(attached=self.attached)
+        # Fresh context per session so cookies/storage never leak between tests
         # Set a reasonable viewport
-        self.page.set_viewport_size({"width": 1280, "height": 720})
+        self.context = self.browser.new_context(**self._context_options())
+        if self.settle.strategy == "smart":
+            self.context.add_init_script(INSTRUMENTATION_SCRIPT)
+        if self.interceptor:
+            self.context.route("**/*", self.interceptor.sync_handler)
+        self.page = self.context.new_page()
+
+    def _endpoint(self):
+        return self.cdp_endpoint or (daemon_endpoint() if self.use_daemon else None)
+
+    def ensure_started(self):
+        """Starts a session unless one is open (the navigate tool calls this)."""
+        if not self.page:
+            self.start()
 
     def stop(self):
-        if self.browser:
-            self.browser.close()
-        if self.playwright:
-            self.playwright.stop()
+        if self.interceptor:
+            print(f"Interception: {self.interception_stats()}")
+        if self.context:
+            self.context.close()
+            self.context = None
+            self.page = None
+        if self._owns_browser:
+            if self.browser:
+                if not self.attached:
+                    self.browser.close()
+                self.browser = None
+            if self.playwright:
+                self.playwright.stop()
+                self.playwright = None
 
     def navigate(self, url):
         self.page.goto(url)
-        self.page.wait_for_load_state('networkidle')
+        self.wait_for_settle("navigate")
+
+    def save_storage_state(self, path):
+        """Saves cookies + local storage of the current context (e.g. after a login)."""
+        self.context.storage_state(path=path)
 
-    def interact(self, action_type, element_id, value=None):
+    def has_selector(self, selector, timeout=3000):
+        try:
+            self.page.wait_for_selector(selector, state="visible", timeout=timeout)
+            return True
+        except PlaywrightError:
+            return False
+
+    def _record_settle(self, action, start, timed_out):
+        entry = {
+            "action": action,
+            "strategy": self.settle.strategy,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            "timed_out": timed_out
+        }
+        self.settle_log.append(entry)
+        print(f"Settled after {action or 'action'} in {entry['duration_ms']}ms"
+              f"{' (timed out)' if timed_out else ''}")
+        return entry
+
+    def wait_for_settle(self, action="", selector=None):
         """
-        Executes an action on an element by its ID.
-        Uses the cached items to find the selector and tag type.
+        Waits until the page is ready for the next capture, per the settle strategy.
+        Never raises on timeout: the wait is capped and recorded in `settle_log`.
         """
-        # 1. Find the element in the current state
-        # We need to re-evaluate the map or store it. 
-        # For simplicity, we'll assume the agent passes the ID and we look it up 
-        # from the LAST captured state. 
-        # NOTE: In a real app, we might want to re-verify the element exists.
-        
-        # We need to store the last items to look up the ID
-        if not hasattr(self, 'last_items'):
+        start = time.perf_counter()
+        timed_out = False
+        with self.tracer.span("settle", action=action, strategy=self.settle.strategy) as span:
+            if self.settle.strategy == "networkidle":
+                try:
+                    self.page.wait_for_load_state('networkidle', timeout=self.settle.timeout_ms)
+                except PlaywrightTimeoutError:
+                    timed_out = True
+            elif self.settle.strategy == "smart":
+                timed_out = self._wait_smart(start, selector or self.settle.wait_for_selector)
+            span.set(timed_out=timed_out)
+        return self._record_settle(action, start, timed_out)
+
+    def _wait_smart(self, start, selector):
+        deadline = start + self.settle.timeout_ms / 1000
+        while True:
+            remaining = (deadline - time.perf_counter()) * 1000
+            if remaining <= 0:
+                return True
+            try:
+                if selector:
+                    self.page.wait_for_selector(selector, state="visible", timeout=remaining)
+                    selector = None
+                    continue
+                self.page.wait_for_function(
+                    SETTLED_PREDICATE,
+                    arg=self.settle.predicate_arg(),
+                    timeout=remaining,
+                    polling=self.settle.poll_ms
+                )
+                return False
+            except PlaywrightTimeoutError:
+                return True
+            except PlaywrightError:
+                # The action navigated and destroyed the context we were polling; poll the new one
+                time.sleep(self.settle.poll_ms / 1000)
+
+    def page_version(self):
+        """
+        Changes whenever the page navigates or its DOM mutates; used to tell if a capture is still current.
+        Without the smart-settle mutation clock the page content (CONTENT_VERSION_SCRIPT) is hashed instead.
+        """
+        try:
+            version = self.page.evaluate(PAGE_VERSION_SCRIPT)
+        except PlaywrightError:
+            return None # mid-navigation
+        return version if version[1] is not None else self.content_version()
+
+    def content_version(self):
+        """Hash of the page's text and image sources (grounding marks left out); None mid-navigation."""
+        try:
+            return self.page.evaluate(CONTENT_VERSION_SCRIPT)
+        except PlaywrightError:
+            return None
+
+    def _cdp_session(self):
+        if self._cdp is None or self._cdp_page is not self.page:
+            self._cdp = self.context.new_cdp_session(self.page)
+            self._cdp_page = self.page
+        return self._cdp
+
+    def _cdp_items(self):
+        session = self._cdp_session()
+        snapshot = session.send("DOMSnapshot.captureSnapshot", SNAPSHOT_PARAMS)
+        names = None
+        if self.grounding_accessibility:
+            try:
+                names = ax_names(session.send("Accessibility.getFullAXTree"))
+            except PlaywrightError as e:
+                print(f"Accessibility tree unavailable, using attribute names: {e}")
+        return snapshot_items(snapshot, names)
+
+    def _ground(self):
+        """Raw grounding output for the current page."""
+        if self.grounding_mode == "cdp":
+            return self._cdp_items()
+        return self.page.evaluate(self.grounding_script)
+
+    def _stamp(self, target):
+        """CDP grounding marks nothing on the page: stamp the target's node now, so the resolver finds it by handle."""
+        session = self._cdp_session()
+        try:
+            node = session.send("DOM.resolveNode", {"backendNodeId": target.backend_id})
+            object_id = node['object']['objectId']
+            session.send("Runtime.callFunctionOn", {
+                "objectId": object_id, "functionDeclaration": STAMP_FUNCTION, "arguments": [{"value": target.id}]
+            })
+            session.send("Runtime.releaseObject", {"objectId": object_id})
+        except PlaywrightError:
+            pass # The node is gone; the resolver falls back to point/name/selector
+
+    def _target_frame(self, target):
+        """The Playwright frame the target lives in (CDP grounding also marks elements inside iframes)."""
+        if target.frame is None:
+            return self.page
+        return find_frame(self.page.frames, self._cdp_session().send("Page.getFrameTree"), target.frame) or self.page
+
+    def _find_target(self, element_id):
+        if not self.elements:
             raise ValueError("No items found. Capture state first.")
-            
-        target = next((item for item in self.last_items if item['id'] == element_id), None)
+
+        target = self.elements.get(element_id)
         if not target:
             raise ValueError(f"Element with ID {element_id} not found.")
-            
-        selector = target['selector']
-        tag = target['tag']
+        return target
+
+    def _resolved(self, target, strategy):
+        """Records how `target` was found and returns the selector to act on."""
+        self.resolve_counts[strategy or "stale"] = self.resolve_counts.get(strategy or "stale", 0) + 1
+        self.tracer.count(f"resolve_{strategy or 'stale'}")
+        if strategy is None:
+            raise stale_error(target)
+        if strategy != "handle":
+            print(f"Element #{target.id} re-resolved by {strategy}")
+        return handle_selector(target.id)
+
+    def _resolve(self, target):
+        """Returns the frame `target` is in and the selector to act on there."""
+        with self.tracer.span("resolve") as span:
+            frame = self.page
+            if target.backend_id is not None:
+                self._stamp(target)
+                frame = self._target_frame(target)
+            strategy = frame.evaluate(RESOLVE_SCRIPT, self.resolve.script_arg(target, self.elements.absolute))
+            span.set(strategy=strategy)
+        return frame, self._resolved(target, strategy)
+
+    def interact(self, action_type, element_id, value=None, settle=True):
+        """
+        Executes an action on an element by its ID.
+        The ID is looked up in the element store of the last capture and re-found
+        on the page through its stamped handle (or a fallback, see browser/resolve.py);
+        a target that can't be found raises StaleElementError right away.
+        `settle=False` skips the wait afterwards (used between batched actions).
+        """
+        # 1. Find the element in the last capture and on the current page
+        target = self._find_target(element_id)
+        frame, selector = self._resolve(target)
+        tag = target.tag
+        timeout = self.resolve.action_timeout_ms
         
         print(f"Interacting with ID {element_id} ({tag}): {action_type}")
 
         # 2. Smart Logic based on Tag/Type
         if action_type == "click":
-            self.page.click(selector)
+            frame.click(selector, timeout=timeout)
         
         elif action_type == "type":
-            self.page.fill(selector, value)
+            frame.fill(selector, value, timeout=timeout)
             
         elif action_type == "submit":
-            self.page.press(selector, "Enter")
+            frame.press(selector, "Enter", timeout=timeout)
             
-        self.page.wait_for_load_state('networkidle')
+        if settle:
+            self.wait_for_settle(action_type)
+
+    def _batch_settle(self, actions, index):
+        """Typing into a field doesn't need a settle wait before the next action; anything else does."""
+        return index == len(actions) - 1 or actions[index]['action'] != "type"
+
+    def _batch_changed(self, url, version):
+        """Why the page no longer matches the capture the batch was planned on, or None."""
+        if self.page.url != url:
+            return f"the page navigated to {self.page.url}"
+        if self.content_version() != version:
+            return "the page content changed (a dialog, message or re-render may cover the next target)"
+        return None
+
+    def interact_batch(self, actions):
+        """
+        Runs `actions` ([{action, element_id, text}]) over the IDs of the last capture,
+        in order. The batch stops before the next action when the page navigated, its
+        content changed after a click or submit, or that action's target can no longer
+        be found (or fails).
+        Returns (number of actions run, reason the batch stopped or None).
+        """
+        url, version = self.page.url, self.content_version()
+        for index, action in enumerate(actions):
+            reason = self._batch_changed(url, version) if index else None
+            if reason:
+                return index, reason
+            try:
+                self.interact(action['action'], action['element_id'], value=action.get('text'),
+                              settle=self._batch_settle(actions, index))
+            except (StaleElementError, PlaywrightError) as e:
+                return index, str(e)
+            if action['action'] == "type":
+                # What typing changes (a character count, inline validation) is expected
+                version = self.content_version()
+        return len(actions), None
+
+    def scroll(self, direction="down"):
+        """Scrolls most of a viewport up or down; returns the new scroll offset and the document height."""
+        viewport = self.page.viewport_size or VIEWPORT
+        step = viewport['height'] * SCROLL_STEP * (-1 if direction == "up" else 1)
+        self.page.evaluate("(dy) => window.scrollBy(0, dy)", step)
+        self.wait_for_settle("scroll")
+        _, scroll_y, height = self.page.evaluate(PAGE_GEOMETRY_SCRIPT)
+        return scroll_y, height
+
+    def _discover(self):
+        """Tiled capture: scrolls once through a new (or grown) URL so lazy content loads, then scrolls back."""
+        scroll_x, scroll_y, height = self.page.evaluate(PAGE_GEOMETRY_SCRIPT)
+        url = self.page.url
+        if not self.capture.discover or self.tile_cache.discovered(url, height):
+            return
+        viewport = self.page.viewport_size or VIEWPORT
+        with self.tracer.span("discover") as span:
+            tiles = 1
+            while tiles < self.capture.max_tiles and tiles * viewport['height'] < height:
+                self.page.evaluate(SCROLL_TO_SCRIPT, [0, tiles * viewport['height']])
+                self.wait_for_settle("tile")
+                _, _, height = self.page.evaluate(PAGE_GEOMETRY_SCRIPT)
+                tiles += 1
+            if tiles > 1:
+                self.page.evaluate(SCROLL_TO_SCRIPT, [scroll_x, scroll_y])
+            span.set(tiles=tiles, height=height)
+        self.tile_cache.mark_discovered(url, height)
 
-    def capture_state(self):
+    def capture_state(self, with_screenshot=True, query=""):
         """
         Injects marks, takes a screenshot, and returns the state.
+        With `with_screenshot=False` only the element map is refreshed (the marks
+        stay on the page, or are drawn from the map, so `capture_screenshot` can
+        still be called afterwards).
+        In tiled capture mode the element map covers the whole page in page
+        coordinates, and `query` (the goal) picks which tiles are screenshotted.
         """
+        if self.capture.tiled:
+            self._discover()
         # 1. Inject Grounding Script
-        items = self.page.evaluate(self.grounding_script)
-        self.last_items = items # Cache for interaction lookup
-        
-        # 2. Take Screenshot
-        screenshot_bytes = self.page.screenshot(full_page=False)
-        screenshot_b64 = base64.b64encode(screenshot_bytes).decode('utf-8')
+        with self.tracer.span("grounding", mode=self.grounding_mode) as span:
+            items = self._apply_grounding(self._ground())
+            if self.capture.tiled:
+                scroll_x, self.scroll_y, self.page_height = self.page.evaluate(PAGE_GEOMETRY_SCRIPT)
+                items.to_page(scroll_x, self.scroll_y)
+            span.set(elements=len(items))
+        self.tracer.count("elements", len(items))
 
-        return {
-            "screenshot": screenshot_b64,
-            "items": items
+        state = {
+            "screenshot": "",
+            "items": items,
+            "diff": self.last_diff,
+            "url": self.page.url,
+            "viewport": self.page.viewport_size or VIEWPORT
         }
+        if self.capture.tiled:
+            state["page_height"] = self.page_height
+        # 2. Take Screenshot
+        if with_screenshot:
+            state.update(self.capture_screenshot(query))
+        return state
+
+    def _drawn_marks(self):
+        """Elements whose marks go onto the screenshot in Python (CDP grounding adds none to the page)."""
+        return self.elements if self.grounding_mode == "cdp" else None
+
+    def _screenshot(self, viewport, clip=None):
+        """One screenshot through the image pipeline; `clip` is a page-coordinates region (a tile)."""
+        marks = self._drawn_marks()
+        args = screenshot_args(self.image_options, self.elements, viewport, marks=bool(marks))
+        if clip:
+            args.update(full_page=True, clip=clip)
+        with self.tracer.span("screenshot") as span:
+            raw = self.page.screenshot(**args)
+            span.set(bytes=len(raw))
+        with self.tracer.span("encoding", format=self.image_options.format) as span:
+            image = process_screenshot(raw, self.image_options, args, viewport, marks)
+            span.set(bytes=len(image.data), width=image.width, height=image.height)
+        self.tracer.count("image_bytes", len(image.data))
+        return image
+
+    def _tile_version(self):
+        # grounding.js moves its marker divs on every capture, which counts as a DOM mutation,
+        # so only CDP grounding can rely on the mutation clock; the others hash the page content
+        return self.page_version() if self.grounding_mode == "cdp" else self.content_version()
+
+    def capture_screenshot(self, query=""):
+        """
+        Screenshots the viewport through the image pipeline.
+        `image` carries the raw bytes and mime type; `screenshot` is its base64 form.
+        In tiled capture mode these are the tile in view and `tiles` lists all
+        selected tiles ({index, rect, image}, rects in page coordinates).
+        """
+        viewport = self.page.viewport_size or VIEWPORT
+        if not self.capture.tiled:
+            image = self._screenshot(viewport)
+            return {"screenshot": image.b64, "image": image}
+
+        tiles, chosen = self._plan_tiles(viewport, query)
+        url, version = self.page.url, self._tile_version()
+        shots = []
+        for tile in chosen:
+            fingerprint = tile_fingerprint(tile, self.elements, version)
+            # No version (mid-navigation): nothing to tell a stale tile by
+            image = self.tile_cache.get(url, tile, fingerprint) if version is not None else None
+            self.tracer.count("tile_cache", 1, outcome="miss" if image is None else "hit")
+            if image is None:
+                image = self._screenshot(viewport, tile.rect())
+                self.tile_cache.put(url, tile, fingerprint, image)
+            shots.append({"index": tile.index, "rect": tile.rect(), "image": image})
+        return self._tiles_state(shots, tiles, viewport)
+
+    def _plan_tiles(self, viewport, query):
+        """All tiles of the page, and those to screenshot: the one in view plus the best matches for `query`."""
+        tiles = tile_grid(self.page_height or viewport['height'], viewport, self.capture.max_tiles)
+        focus_y = self.scroll_y + viewport['height'] / 2
+        return tiles, select_tiles(tiles, self.elements, query, focus_y, self.capture.tiles_in_prompt)
+
+    def _tiles_state(self, shots, tiles, viewport):
+        # `image` is the tile in view, so the fast path still sees scrolling to another tile as a change
+        current = current_tile(tiles, self.scroll_y + viewport['height'] / 2)
+        image = next(s["image"] for s in shots if s["index"] == current.index)
+        return {"screenshot": image.b64, "image": image, "tiles": shots, "tile_count": len(tiles)}
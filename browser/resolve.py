@@ -0,0 +1,136 @@
+"""
+Element re-resolution at action time.
+
+Grounding stamps every marked element with `data-som-id="<id>"` (CDP grounding
+stamps the target right before the action), so an action normally finds its
+target with one attribute lookup instead of the generated CSS selector (which
+can match many nodes). If the page re-rendered the node since the capture, the
+resolver falls back, in one round trip, to:
+
+  "point"    - the element under the captured center, if tag and accessible name match
+  "name"     - the only visible element with that tag and accessible name
+  "selector" - the grounding selector, if it matches exactly one visible element
+
+and re-stamps whatever it found. Stamps are looked up inside open shadow roots
+too. If nothing matches, the action fails fast with `StaleElementError`
+instead of waiting out Playwright's default timeout.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+ID_ATTRIBUTE = "data-som-id"
+STRATEGIES = ("handle", "point", "name", "selector")
+
+# Accessible name as computed by the grounding scripts (kept in sync with them)
+NAME_FUNCTION = """
+function somName(el) {
+    const labelledBy = el.getAttribute('aria-labelledby');
+    const byId = labelledBy && labelledBy.split(/\\s+/)
+        .map((id) => document.getElementById(id))
+        .filter(Boolean)
+        .map((node) => node.innerText)
+        .join(' ');
+    const label = el.labels && el.labels.length ? el.labels[0].innerText : '';
+    return el.getAttribute('aria-label') || byId || label || el.getAttribute('title') ||
+        el.getAttribute('alt') || el.innerText || el.value || el.placeholder || '';
+}
+"""
+
+RESOLVE_SCRIPT = """
+({ id, tag, name, selector, x, y, absolute, strategies }) => {
+""" + NAME_FUNCTION + """
+    const norm = (s) => (s || '').replace(/\\s+/g, ' ').trim().toLowerCase();
+    const visible = (el) => {
+        const rect = el.getBoundingClientRect();
+        const style = window.getComputedStyle(el);
+        return rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' &&
+            style.display !== 'none' && style.opacity !== '0';
+    };
+    const usable = (el) => el && el.isConnected && el.tagName.toLowerCase() === tag && visible(el);
+    const named = (el) => usable(el) && (!name || norm(somName(el)) === norm(name));
+    const only = (list) => (list.length === 1 ? list[0] : null);
+
+    const handle = `[data-som-id="${id}"]`;
+    // Elements inside open shadow roots (marked by CDP grounding) are only found by walking into them
+    const deep = (root, found) => {
+        root.querySelectorAll(handle).forEach((el) => found.push(el));
+        root.querySelectorAll('*').forEach((el) => el.shadowRoot && deep(el.shadowRoot, found));
+        return found;
+    };
+    let stamped = Array.from(document.querySelectorAll(handle));
+    if (!stamped.length) stamped = deep(document, []);
+    const find = {
+        handle: () => (stamped.length === 1 && usable(stamped[0]) ? stamped[0] : null),
+        point: () => {
+            // Tiled captures keep page coordinates
+            const hit = absolute ? document.elementFromPoint(x - window.scrollX, y - window.scrollY)
+                : document.elementFromPoint(x, y);
+            const el = hit && hit.closest(tag);
+            return named(el) ? el : null;
+        },
+        name: () => (name ? only(Array.from(document.querySelectorAll(tag)).filter(named)) : null),
+        selector: () => {
+            try {
+                return only(Array.from(document.querySelectorAll(selector)).filter(usable));
+            } catch (e) {
+                return null; // generated selector is not valid CSS
+            }
+        }
+    };
+
+    for (const strategy of strategies) {
+        const el = find[strategy]();
+        if (!el) continue;
+        if (strategy !== 'handle') {
+            stamped.forEach((other) => other.removeAttribute('data-som-id'));
+            el.setAttribute('data-som-id', String(id));
+        }
+        return strategy;
+    }
+    return null;
+}
+"""
+
+class StaleElementError(Exception):
+    """The element behind an ID is gone or can no longer be told apart; capture the page again."""
+
+@dataclass
+class ResolveConfig:
+    # Tried in this order; "handle" is the stamped attribute
+    strategies: List[str] = field(default_factory=lambda: list(STRATEGIES))
+    # Upper bound for the click/fill itself once the target is resolved
+    action_timeout_ms: int = 5000
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]):
+        """Builds the config from the `resolve:` block of a project's config.yaml."""
+        config = config or {}
+        known = {k: v for k, v in config.items() if k in cls.__dataclass_fields__}
+        resolve = cls(**known)
+        unknown = [s for s in resolve.strategies if s not in STRATEGIES]
+        if unknown:
+            raise ValueError(f"Unknown resolve strategies: {unknown}")
+        return resolve
+
+    def script_arg(self, element, absolute: bool = False) -> Dict[str, Any]:
+        """`absolute`: the element's coordinates are page-absolute (tiled capture)."""
+        return {
+            "id": element.id,
+            "tag": element.tag,
+            "name": element.name,
+            "selector": element.selector,
+            "x": element.x + element.width / 2,
+            "y": element.y + element.height / 2,
+            "absolute": absolute,
+            "strategies": self.strategies
+        }
+
+def handle_selector(element_id) -> str:
+    """Playwright selector for the stamped element."""
+    return f'[{ID_ATTRIBUTE}="{element_id}"]'
+
+def stale_error(element) -> StaleElementError:
+    return StaleElementError(
+        f"Element #{element.id} ({element.tag} '{element.label()}') is stale: it is no longer on the page "
+        f"and no unique match was found. Look at the current page and pick the element again."
+    )
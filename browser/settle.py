@@ -0,0 +1,96 @@
+"""
+Settle detection: decides when a page is ready for the next capture after an action.
+
+Strategies:
+  "smart"       - DOM-mutation quiescence + no pending fetch/XHR (ignoring background
+                  URLs) + optional target selector, bounded by `timeout_ms`.
+  "networkidle" - Playwright's networkidle, bounded by `timeout_ms`.
+  "none"        - don't wait.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Installed in every document (context.add_init_script) before page scripts run.
+# Tracks in-flight fetch/XHR and the time of the last DOM mutation.
+INSTRUMENTATION_SCRIPT = """
+(() => {
+    if (window.__settle) return;
+    const settle = window.__settle = { pending: new Map(), nextId: 1, lastMutation: performance.now() };
+
+    const track = (url) => { const id = settle.nextId++; settle.pending.set(id, String(url)); return id; };
+    const untrack = (id) => settle.pending.delete(id);
+
+    const originalFetch = window.fetch;
+    if (originalFetch) {
+        window.fetch = function (input, init) {
+            const id = track(input && input.url ? input.url : input);
+            return originalFetch.apply(this, arguments).finally(() => untrack(id));
+        };
+    }
+
+    const originalOpen = XMLHttpRequest.prototype.open;
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.open = function (method, url) {
+        this.__settleUrl = url;
+        return originalOpen.apply(this, arguments);
+    };
+    XMLHttpRequest.prototype.send = function () {
+        const id = track(this.__settleUrl);
+        this.addEventListener('loadend', () => untrack(id), { once: true });
+        return originalSend.apply(this, arguments);
+    };
+
+    const observe = () => new MutationObserver(() => { settle.lastMutation = performance.now(); })
+        .observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', observe, { once: true });
+    } else {
+        observe();
+    }
+})();
+"""
+
+# Predicate polled by page.wait_for_function
+SETTLED_PREDICATE = """
+({ quietMs, ignore }) => {
+    if (document.readyState === 'loading') return false;
+    const settle = window.__settle;
+    if (!settle) return true;
+    const ignored = ignore.map((p) => new RegExp(p));
+    for (const url of settle.pending.values()) {
+        if (!ignored.some((re) => re.test(url))) return false;
+    }
+    return performance.now() - settle.lastMutation >= quietMs;
+}
+"""
+
+# Cheap "has the page changed?" probe: URL plus the time of the last DOM mutation
+# (null without the smart-settle instrumentation; page_version then hashes the content instead)
+PAGE_VERSION_SCRIPT = """
+() => [location.href, window.__settle ? window.__settle.lastMutation : null]
+"""
+
+STRATEGIES = ("smart", "networkidle", "none")
+
+@dataclass
+class SettleConfig:
+    strategy: str = "smart"
+    quiet_ms: int = 300
+    timeout_ms: int = 5000
+    poll_ms: int = 50
+    # Regexes for background requests that never "finish" (analytics, long-polling...)
+    ignore_urls: List[str] = field(default_factory=list)
+    wait_for_selector: Optional[str] = None
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]):
+        """Builds the config from the `settle:` block of a project's config.yaml."""
+        config = config or {}
+        known = {k: v for k, v in config.items() if k in cls.__dataclass_fields__}
+        settle = cls(**known)
+        if settle.strategy not in STRATEGIES:
+            raise ValueError(f"Unknown settle strategy: {settle.strategy}")
+        return settle
+
+    def predicate_arg(self):
+        return {"quietMs": self.quiet_ms, "ignore": self.ignore_urls}
@@ -0,0 +1,167 @@
+"""
+Tiled full-page capture (`capture: {mode: tiled}` in config.yaml).
+
+The page is cut into viewport-sized tiles, top to bottom. On the first capture
+of a URL the manager scrolls through them once (waiting for each to settle) so
+lazy-loaded content renders, then grounds the whole document in one pass and
+shifts the element map to page-absolute coordinates. Only the tiles relevant
+to the current step are screenshotted: the one in view plus those whose
+elements match the step's words, up to `tiles_in_prompt`. Tile images are
+cached per URL and reused while the tile's elements and the page version are
+unchanged: the settle mutation clock (see browser/settle.py) with CDP
+grounding, else a hash of the page's text and image sources, since the
+grounding scripts mutate the DOM on every capture.
+"""
+import math
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from browser.elements import TOKEN_RE
+
+CAPTURE_MODES = ("viewport", "tiled")
+
+# Scroll position and document size, read before and after grounding
+PAGE_GEOMETRY_SCRIPT = """() => [
+    window.scrollX, window.scrollY,
+    Math.max(document.documentElement.scrollHeight, document.body ? document.body.scrollHeight : 0)
+]"""
+SCROLL_TO_SCRIPT = "([x, y]) => window.scrollTo(x, y)"
+# What non-interactive content looks like: length and FNV-1a hash of the text and image sources,
+# skipping the grounding marks (their labels change with the element map, which the fingerprint covers)
+CONTENT_VERSION_SCRIPT = """() => {
+    const root = document.body || document.documentElement;
+    if (!root) return [location.href, 0, 0];
+    const skipped = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE']);
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT, {
+        acceptNode: (node) => node.nodeType === Node.ELEMENT_NODE &&
+            (skipped.has(node.tagName) || node.id === 'som-layer' || node.classList.contains('som-marker'))
+            ? NodeFilter.FILTER_REJECT : NodeFilter.FILTER_ACCEPT
+    });
+    let hash = 0x811c9dc5, length = 0;
+    const mix = (text) => {
+        for (let i = 0; i < text.length; i++) hash = Math.imul(hash ^ text.charCodeAt(i), 0x01000193);
+        length += text.length;
+    };
+    while (walker.nextNode()) {
+        const node = walker.currentNode;
+        if (node.nodeType === Node.TEXT_NODE) mix(node.nodeValue);
+        else if (node.tagName === 'IMG') mix(node.currentSrc || node.src);
+    }
+    return [location.href, length, hash >>> 0];
+}"""
+
+@dataclass
+class TileConfig:
+    mode: str = "viewport"
+    # Tiles below this many are neither scrolled through nor screenshotted (infinite scroll stops here)
+    max_tiles: int = 8
+    # Tile screenshots sent to the model per turn
+    tiles_in_prompt: int = 2
+    # Scroll through new URLs first so lazy content loads
+    discover: bool = True
+    # URLs whose tiles are kept
+    cache_urls: int = 20
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]):
+        """Builds the config from the `capture:` block of a project's config.yaml."""
+        config = config or {}
+        known = {k: v for k, v in config.items() if k in cls.__dataclass_fields__}
+        tiles = cls(**known)
+        if tiles.mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode: {tiles.mode}")
+        return tiles
+
+    @property
+    def tiled(self) -> bool:
+        return self.mode == "tiled"
+
+@dataclass
+class Tile:
+    index: int
+    y: float
+    width: float
+    height: float
+
+    def rect(self) -> Dict[str, float]:
+        """The tile in page coordinates (also usable as a region for ElementStore.select)."""
+        return {"x": 0, "y": self.y, "width": self.width, "height": self.height}
+
+def tile_grid(page_height: float, viewport: Dict[str, int], max_tiles: int) -> List[Tile]:
+    count = max(1, min(max_tiles, math.ceil(page_height / viewport['height'])))
+    tiles = []
+    for index in range(count):
+        y = index * viewport['height']
+        tiles.append(Tile(index, y, viewport['width'], min(viewport['height'], max(1, page_height - y))))
+    return tiles
+
+def tile_elements(tile: Tile, elements) -> list:
+    region = tile.rect()
+    return [e for e in elements if e.in_viewport(region)]
+
+def current_tile(tiles: List[Tile], focus_y: float) -> Tile:
+    """The tile containing `focus_y` (the middle of the viewport)."""
+    return next((t for t in tiles if t.y <= focus_y < t.y + t.height), tiles[-1])
+
+def select_tiles(tiles: List[Tile], elements, query: str, focus_y: float, limit: int) -> List[Tile]:
+    """
+    The current tile plus the tiles whose elements share most words with
+    `query`, at most `limit`, in page order.
+    """
+    current = current_tile(tiles, focus_y)
+    words = set(TOKEN_RE.findall(query.lower()))
+    scored = []
+    for tile in tiles:
+        if tile is current or not words:
+            continue
+        score = sum(len(words.intersection(TOKEN_RE.findall(e.text.lower()))) for e in tile_elements(tile, elements))
+        if score:
+            scored.append((-score, tile.index))
+    chosen = [current] + [tiles[index] for _, index in sorted(scored)[:max(0, limit - 1)]]
+    return sorted(chosen, key=lambda t: t.index)
+
+def tile_fingerprint(tile: Tile, elements, version=None) -> str:
+    """What a tile's screenshot depends on: its box, its elements (IDs are on the marks) and the page version."""
+    payload = [tile.y, tile.width, tile.height, version] + [
+        [e.id, e.tag, e.text.strip(), round(e.x), round(e.y - tile.y), round(e.width), round(e.height)]
+        for e in tile_elements(tile, elements)
+    ]
+    return hashlib.sha1(json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+class TileCache:
+    """Per-URL tile screenshots (LRU over URLs), and which URLs were already scrolled through."""
+    def __init__(self, max_urls: int = 20):
+        self.max_urls = max_urls
+        self.pages: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _page(self, url: str) -> Dict[str, Any]:
+        if url not in self.pages:
+            self.pages[url] = {"height": None, "tiles": {}}
+            while len(self.pages) > self.max_urls:
+                self.pages.popitem(last=False)
+        self.pages.move_to_end(url)
+        return self.pages[url]
+
+    def discovered(self, url: str, height: float) -> bool:
+        """True if this URL was scrolled through at this height (a taller page has new content to load)."""
+        known = self.pages.get(url, {}).get("height")
+        return known is not None and height <= known
+
+    def mark_discovered(self, url: str, height: float):
+        self._page(url)["height"] = height
+
+    def get(self, url: str, tile: Tile, fingerprint: str):
+        entry = self.pages.get(url, {}).get("tiles", {}).get(tile.index)
+        if entry and entry[0] == fingerprint:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, url: str, tile: Tile, fingerprint: str, image):
+        self._page(url)["tiles"][tile.index] = (fingerprint, image)
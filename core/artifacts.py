@@ -0,0 +1,170 @@
+"""
+Background artifact writer.
+
+Screenshots and prompt dumps are handed to a bounded queue and written by a
+single writer thread, so the agent loop never waits on disk. Every agent run
+gets its own directory:
+
+    artifacts/
+      20250101-120000-1a2b3c4d5e6f/
+        manifest.jsonl          # one line per artifact: step, kind, file, bytes
+        3f2a...e1.jpeg          # file names are content hashes, so identical
+        9b0c...44.txt           # frames within a run are stored once
+
+Old runs are pruned by count (`keep_runs`) and total size (`max_mb`).
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import shutil
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional, Union
+
+_STOP = object()
+
+class ArtifactRun:
+    """Handle for one agent run; `save` only enqueues."""
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+        self.path = os.path.join(store.root, f"{time.strftime('%Y%m%d-%H%M%S')}-{run_id}")
+        self.hashes = set() # Only touched by the writer thread
+
+    def save(self, step: int, kind: str, data: Union[bytes, Callable[[], bytes]], extension: str):
+        """
+        Queues an artifact for `step`. `data` may be a callable producing the
+        bytes, so that rendering (e.g. formatting a prompt) also happens off
+        the agent's thread.
+        """
+        self.store.enqueue(("artifact", self, step, kind, data, extension))
+
+    def close(self):
+        """Marks the run finished so retention may prune it later."""
+        self.store.enqueue(("close", self))
+
+class ArtifactStore:
+    def __init__(self, root: str = "artifacts", queue_size: int = 64, keep_runs: Optional[int] = None,
+                 max_mb: Optional[float] = None):
+        self.root = root
+        self.keep_runs = keep_runs
+        self.max_bytes = int(max_mb * 1024 * 1024) if max_mb else None
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._active = set()
+        self._thread = threading.Thread(target=self._worker, name="artifact-writer", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ArtifactStore":
+        return cls(
+            root=config.get('root', "artifacts"),
+            queue_size=config.get('queue_size', 64),
+            keep_runs=config.get('keep_runs'),
+            max_mb=config.get('max_mb')
+        )
+
+    def open_run(self, run_id: str) -> ArtifactRun:
+        run = ArtifactRun(self, run_id)
+        self.enqueue(("open", run))
+        return run
+
+    def enqueue(self, task):
+        # Never block the agent: when the disk can't keep up, frames are dropped and counted
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 50 == 0:
+                print(f"Artifacts: writer queue full, {self.dropped} artifacts dropped")
+
+    def flush(self):
+        """Blocks until everything queued so far is on disk (for tests and shutdown)."""
+        self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _worker(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is _STOP:
+                    return
+                if task[0] == "open":
+                    self._open(task[1])
+                elif task[0] == "close":
+                    self._active.discard(os.path.abspath(task[1].path))
+                else:
+                    self._write(*task[1:])
+            except Exception as e:
+                print(f"Artifacts: write failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _open(self, run):
+        os.makedirs(run.path, exist_ok=True)
+        self._active.add(os.path.abspath(run.path))
+        self._prune()
+
+    def _write(self, run, step, kind, data, extension):
+        if callable(data):
+            data = data()
+        os.makedirs(run.path, exist_ok=True) # In case the "open" task was dropped
+        digest = hashlib.sha1(data).hexdigest()[:20]
+        name = f"{digest}.{extension}"
+        duplicate = digest in run.hashes
+        if not duplicate:
+            with open(os.path.join(run.path, name), "wb") as f:
+                f.write(data)
+            run.hashes.add(digest)
+        entry = {"step": step, "kind": kind, "file": name, "bytes": len(data), "duplicate": duplicate,
+                 "ts": round(time.time(), 3)}
+        with open(os.path.join(run.path, "manifest.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _prune(self):
+        """Deletes the oldest finished runs beyond `keep_runs` / `max_mb`."""
+        if not (self.keep_runs or self.max_bytes):
+            return
+        runs = sorted(
+            (os.path.join(self.root, d) for d in os.listdir(self.root)),
+            key=os.path.getmtime
+        )
+        runs = [r for r in runs if os.path.isdir(r)]
+        sizes = {r: _dir_size(r) for r in runs} if self.max_bytes else {}
+        total = sum(sizes.values())
+        remaining = len(runs)
+        for run in runs:
+            over_count = self.keep_runs and remaining > self.keep_runs
+            over_size = self.max_bytes and total > self.max_bytes
+            if not (over_count or over_size):
+                break
+            if os.path.abspath(run) in self._active:
+                continue
+            shutil.rmtree(run, ignore_errors=True)
+            remaining -= 1
+            total -= sizes.get(run, 0)
+
+def _dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(dirpath, f))
+        for dirpath, _, files in os.walk(path) for f in files
+    )
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(config: Optional[Dict[str, Any]] = None) -> ArtifactStore:
+    """One store (and writer thread) per artifact root per process."""
+    config = config or {}
+    key = os.path.abspath(config.get('root', "artifacts"))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ArtifactStore.from_config(config)
+            atexit.register(_stores[key].close)
+        return _stores[key]
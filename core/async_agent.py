@@ -0,0 +1,204 @@
+import time
+import asyncio
+
+from langchain_core.messages import ToolMessage
+
+from browser.async_manager import AsyncBrowserManager
+from core.agent import Agent
+from core.state import AgentState
+from core.tools import make_async_tools
+from core.streaming import ToolCallStream
+from core.gateway import measure_queue
+
+class AsyncAgent(Agent):
+    """
+    Worker Agent whose graph nodes are coroutines.
+
+    Drive it with `agent.app.ainvoke(state)` / `agent.app.astream(state)`.
+    Model calls, tool calls and page captures all await, so one event loop can
+    run many sessions side by side.
+
+    Streamed tool calls run as tasks while the response is still arriving, and
+    the next page capture starts as soon as the last action has settled; it is
+    thrown away if the page changed again before the model call uses it.
+    """
+    def __init__(self, model_provider="openai", project_name=None, browser=None, **kwargs):
+        self.early_tasks = {} # tool_call_id -> task of a tool started while streaming
+        self._early_tail = None
+        self._precapture = None
+        super().__init__(
+            model_provider=model_provider,
+            project_name=project_name,
+            browser=browser or AsyncBrowserManager(headless=False),
+            **kwargs
+        )
+
+    def _make_tools(self, browser):
+        return make_async_tools(browser)
+
+    def _begin_run(self):
+        super()._begin_run()
+        self._cancel_precapture()
+        self.early_tasks.clear()
+        self._early_tail = None
+
+    def _start_precapture(self, query=""):
+        """Starts capturing the page for the next model call right after the last action."""
+        self._cancel_precapture()
+        if self.precapture and self._browser_open():
+            self._precapture = asyncio.ensure_future(self._versioned_capture(not self._replaying(), query))
+
+    def _cancel_precapture(self):
+        if self._precapture and not self._precapture.done():
+            self._precapture.cancel()
+        self._precapture = None
+
+    async def _versioned_capture(self, with_screenshot, query=""):
+        state = await self.browser.capture_state(with_screenshot=with_screenshot, query=query)
+        state['version'] = await self.browser.page_version()
+        return state
+
+    async def _take_precapture(self):
+        """The pre-captured state if the page has not changed since, else None."""
+        task, self._precapture = self._precapture, None
+        if task is None:
+            return None
+        try:
+            state = await task
+        except Exception as e:
+            print(f"Pre-capture failed ({e}); capturing again")
+            return None
+        if state['version'] is None or await self.browser.page_version() != state['version']:
+            print("Page changed after the pre-capture; capturing again")
+            self.tracer.count("precapture", 1, outcome="stale")
+            return None
+        self.tracer.count("precapture", 1, outcome="used")
+        return state
+
+    async def call_model(self, state: AgentState):
+        print("Call Model Invoked")
+        messages = state['messages']
+        goal = self._goal(messages) # Picks the relevant tiles in tiled capture mode
+        self._start_run(state)
+
+        vision_state = None
+        if self.browser.page is None and self.prewarm_browser:
+            # The first action is almost always `navigate`: have the session ready by then
+            self.browser.prewarm()
+        if self._browser_open():
+            vision_state = await self._take_precapture()
+            if vision_state is None:
+                print("Capturing state...")
+                vision_state = await self.browser.capture_state(with_screenshot=not self._replaying(), query=goal)
+
+        response = self._replayed_response(vision_state)
+
+        if response is None:
+            unchanged = False
+            if vision_state is not None:
+                if not vision_state['screenshot']:
+                    vision_state.update(await self.browser.capture_screenshot(goal))
+                unchanged = self.fast_path.unchanged(vision_state)
+                if unchanged and self.fast_path.settle_retry:
+                    await self.browser.wait_for_settle("unchanged")
+                    vision_state = await self.browser.capture_state(query=goal)
+                    unchanged = self.fast_path.unchanged(vision_state)
+
+            text_history = self._text_route_history(messages, vision_state, unchanged)
+            if text_history is not None:
+                response = self._accept_text_response(
+                    await self._ainvoke("text", self.text_model, text_history), vision_state
+                )
+
+            if response is None:
+                call = self._astream if self._streams() else self._ainvoke
+                response = await call("vision", self.model, self._vision_history(messages, vision_state, unchanged))
+
+        self._observe_response(response, vision_state)
+        return {"messages": [response]}
+
+    async def _ainvoke(self, route, model, full_history):
+        start = time.perf_counter()
+        with self.tracer.span("model", route=route, messages=len(full_history)) as span, measure_queue() as queued:
+            response = await model.ainvoke(full_history)
+            self._span_usage(span, response, queued[0])
+        self._record_usage(response, route, time.perf_counter() - start, queued[0])
+        return response
+
+    def _run_early(self, tool_call):
+        """Schedules a streamed tool call behind the ones before it; tool_node awaits the result."""
+        previous = self._early_tail
+
+        async def run():
+            if previous is not None:
+                await previous
+            return await self._aexecute_tool(tool_call)
+
+        self._early_tail = asyncio.ensure_future(run())
+        self.early_tasks[tool_call['id']] = self._early_tail
+
+    async def _astream(self, route, model, full_history):
+        """Async version of Agent._stream: early tool calls run concurrently with the stream."""
+        start = time.perf_counter()
+        stream = ToolCallStream(stop_names=("done",))
+        early = []
+        with self.tracer.span("model", route=route, messages=len(full_history), streamed=True) as span, \
+                measure_queue() as queued:
+            try:
+                async for chunk in model.astream(full_history):
+                    for tool_call in stream.feed(chunk):
+                        if self._runs_early(tool_call):
+                            self._run_early(tool_call)
+                            early.append(tool_call['id'])
+            except BaseException:
+                if early:
+                    self._discard_early(early, "the stream failed")
+                raise
+            response, _ = stream.finish()
+            span.set(early_tools=len(early))
+            self._span_usage(span, response, queued[0])
+        self._settle_early(response, early)
+        self._record_usage(response, route, time.perf_counter() - start, queued[0])
+        return response
+
+    def _discard_early(self, tool_call_ids, reason):
+        """Cancels the streamed tool calls still running and drops their results."""
+        for tool_call_id in tool_call_ids:
+            task = self.early_tasks.pop(tool_call_id, None)
+            if task:
+                task.cancel()
+        self._early_tail = None
+        print(f"Discarded {len(tool_call_ids)} tool call(s) started while streaming: {reason}")
+        self.tracer.count("early_discarded", len(tool_call_ids))
+
+    async def _aexecute_tool(self, tool_call):
+        tool_name = tool_call['name']
+        tool = self._find_tool(tool_name)
+
+        try:
+            with self.tracer.span("tool", tool=tool_name):
+                return await tool.ainvoke(tool_call['args'])
+        except Exception as e:
+            return f"Error executing tool {tool_name}: {str(e)}"
+
+    async def tool_node(self, state: AgentState):
+        print("Tool Node Invoked")
+        last_message = state['messages'][-1]
+
+        outputs = []
+        for tool_call in last_message.tool_calls:
+            # Started while the response was streaming?
+            task = self.early_tasks.pop(tool_call['id'], None)
+            result = await task if task else await self._aexecute_tool(tool_call)
+
+            if self.replay:
+                self.replay.record_result(tool_call['id'], result)
+
+            outputs.append(ToolMessage(tool_call_id=tool_call['id'], content=str(result)))
+
+        self._early_tail = None
+        # Before the precapture, which would otherwise race it for the page
+        if self.after_action:
+            await self.after_action()
+        self._start_precapture(self._goal(state['messages']))
+        return {"messages": outputs}
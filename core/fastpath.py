@@ -0,0 +1,83 @@
+from typing import Any, Dict, Optional
+
+from browser.fingerprint import items_fingerprint, image_hash, hash_distance
+from core.memory import IMAGE_TOKENS
+
+UNCHANGED_NOTE = (
+    "The screen has not changed since your last action, so no screenshot is attached this turn; "
+    "the element list above is still current. Your last action had no visible effect; try something "
+    "different. The screenshot is sent again on your next turn."
+)
+
+class FastPath:
+    """
+    Detects turns where the page did not change since the previous capture.
+
+    The element-list hash is compared first (free); only when it matches is
+    the screenshot's perceptual hash computed and compared. An unchanged page
+    is first given a settle wait and re-captured (`settle_retry`); if it is
+    still unchanged the model gets a text-only prompt instead of the image.
+    The model then has no picture of the page at all, so a text-only turn is
+    always followed by a vision turn, and a page that stays unchanged gets at
+    most `max_text_only` text-only turns.
+    """
+    def __init__(self, enabled: bool = True, threshold: int = 0, settle_retry: bool = True, max_text_only: int = 2):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.settle_retry = settle_retry
+        self.max_text_only = max_text_only
+        self.last_items_hash = None
+        self.last_image = None
+        self.last_image_hash = None
+        self.text_only_streak = 0 # Text-only turns since the page last changed
+        self.last_text_only = False
+        self.text_only_calls = 0
+        self.tokens_saved = 0
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]):
+        config = config or {}
+        return cls(
+            enabled=config.get('enabled', True),
+            threshold=config.get('threshold', 0),
+            settle_retry=config.get('settle_retry', True),
+            max_text_only=config.get('max_text_only', 2)
+        )
+
+    def reset(self):
+        self.last_items_hash = None
+        self.last_image = None
+        self.last_image_hash = None
+        self.text_only_streak = 0
+        self.last_text_only = False
+
+    def unchanged(self, vision_state) -> bool:
+        """Compares this capture with the previous one and remembers it for the next turn."""
+        if not self.enabled:
+            return False
+        items_hash = items_fingerprint(vision_state['items'], vision_state.get('url'))
+        image = vision_state['image']
+        current_hash = None
+        unchanged = False
+        # Image hashes are only worth computing when the element lists match
+        if items_hash == self.last_items_hash:
+            if self.last_image_hash is None:
+                self.last_image_hash = image_hash(self.last_image.data)
+            current_hash = image_hash(image.data)
+            unchanged = hash_distance(current_hash, self.last_image_hash) <= self.threshold
+        self.last_items_hash = items_hash
+        self.last_image = image
+        self.last_image_hash = current_hash
+        return unchanged
+
+    def use_text_only(self, unchanged: bool) -> bool:
+        if unchanged and not self.last_text_only and self.text_only_streak < self.max_text_only:
+            self.text_only_streak += 1
+            self.text_only_calls += 1
+            self.tokens_saved += IMAGE_TOKENS
+            self.last_text_only = True
+            return True
+        if not unchanged:
+            self.text_only_streak = 0
+        self.last_text_only = False
+        return False
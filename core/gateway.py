@@ -0,0 +1,345 @@
+"""
+Process-wide model gateway.
+
+Every Agent and PlannerAgent gets its chat models from one `ModelGateway`, so:
+  - a model is built once per (provider, name) and shared, which shares its
+    HTTP connection pool (OpenAI clients get a bounded pool of their own);
+  - requests and tokens per provider go through a token bucket
+    (`requests_per_minute`, `tokens_per_minute`); token usage is charged after
+    each call, so a big response makes the next calls wait;
+  - transient errors (429, 5xx, timeouts) are retried by the provider SDKs with
+    exponential backoff and jitter, honouring Retry-After (`max_retries`);
+  - an optional content-addressed response cache answers repeated calls with
+    the exact same model settings and prompt (screenshots are part of the
+    prompt, so a different image is a different key);
+  - the time each call spent waiting for the rate limit is recorded.
+"""
+import os
+import time
+import asyncio
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+import httpx
+from langchain_core.caches import BaseCache
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration
+from langchain_core.rate_limiters import BaseRateLimiter
+
+# Rate-limit waits of the current model call(s), see measure_queue()
+_queue_box: ContextVar[Optional[list]] = ContextVar("gateway_queue", default=None)
+
+@contextmanager
+def measure_queue():
+    """
+    Collects the rate-limit wait (seconds) of the model calls made inside the block:
+    `with measure_queue() as queued: model.invoke(...)`, then `queued[0]`.
+    A mutable box is shared, so waits inside tasks LangChain spawns are counted too.
+    """
+    box = [0.0]
+    token = _queue_box.set(box)
+    try:
+        yield box
+    finally:
+        _queue_box.reset(token)
+
+class TokenBucket:
+    """Refills at `per_minute` units per minute up to `capacity`; may go into debt when charged after the fact."""
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Takes `amount` now and returns how long to wait before using it."""
+        with self.lock:
+            self._refill()
+            self.level -= amount
+            return max(0.0, -self.level / self.rate)
+
+    def charge(self, amount: float):
+        with self.lock:
+            self._refill()
+            self.level -= amount
+
+    def wait_time(self) -> float:
+        with self.lock:
+            self._refill()
+            return max(0.0, -self.level / self.rate)
+
+class ProviderStats:
+    def __init__(self):
+        self.calls = 0
+        self.waits = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.tokens = 0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "rate_limited": self.waits,
+            "queue_ms": round(self.queue_seconds * 1000, 1),
+            "max_queue_ms": round(self.max_queue_seconds * 1000, 1),
+            "tokens": self.tokens
+        }
+
+class ProviderLimiter(BaseRateLimiter):
+    """LangChain rate limiter for one provider: a request bucket plus a token bucket."""
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.stats = ProviderStats()
+        self.lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        wait = self.requests.reserve(1) if self.requests else 0.0
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time())
+        return wait
+
+    def _record(self, wait: float):
+        with self.lock:
+            self.stats.calls += 1
+            if wait:
+                self.stats.waits += 1
+                self.stats.queue_seconds += wait
+                self.stats.max_queue_seconds = max(self.stats.max_queue_seconds, wait)
+        box = _queue_box.get()
+        if box is not None:
+            box[0] += wait
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        if not blocking and self.requests and self.requests.wait_time() > 0:
+            return False
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+        self._record(wait)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        if not blocking and self.requests and self.requests.wait_time() > 0:
+            return False
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        self._record(wait)
+        return True
+
+    def charge(self, tokens: int):
+        with self.lock:
+            self.stats.tokens += tokens
+        if self.tokens:
+            self.tokens.charge(tokens)
+
+def _total_tokens(response) -> int:
+    total = 0
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, 'message', None)
+            usage = getattr(message, 'usage_metadata', None) or {}
+            if message is not None and message.response_metadata.get('cache_hit'):
+                continue
+            total += usage.get('total_tokens', 0)
+    return total
+
+class UsageCallback(BaseCallbackHandler):
+    """Charges each response's token usage to its provider's token bucket."""
+    def __init__(self, limiter: ProviderLimiter):
+        self.limiter = limiter
+
+    def on_llm_end(self, response, **kwargs):
+        tokens = _total_tokens(response)
+        if tokens:
+            self.limiter.charge(tokens)
+
+class ResponseCache(BaseCache):
+    """
+    LangChain cache keyed on sha256(model settings + exact prompt).
+    Entries live in memory (LRU, `max_entries`) and, with `path`, as JSON files
+    that survive restarts. Returned messages carry `response_metadata["cache_hit"]`.
+    """
+    def __init__(self, path: Optional[str] = None, max_entries: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode()).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def lookup(self, prompt: str, llm_string: str):
+        key = self.key(prompt, llm_string)
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+        if data is None and self.path and os.path.exists(self._file(key)):
+            with open(self._file(key)) as f:
+                data = f.read()
+        with self.lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        messages = messages_from_dict(json.loads(data))
+        for message in messages:
+            message.response_metadata['cache_hit'] = True
+        return [ChatGeneration(message=message) for message in messages]
+
+    def update(self, prompt: str, llm_string: str, return_val):
+        key = self.key(prompt, llm_string)
+        data = json.dumps(messages_to_dict([generation.message for generation in return_val]))
+        with self.lock:
+            self.entries[key] = data
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        if self.path:
+            tmp = f"{self._file(key)}.{threading.get_ident()}.tmp"
+            with open(tmp, 'w') as f:
+                f.write(data)
+            os.replace(tmp, self._file(key))
+
+    def clear(self, **kwargs):
+        with self.lock:
+            self.entries.clear()
+
+class ModelGateway:
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None, max_retries: int = 3,
+                 max_connections: int = 20, timeout: Optional[float] = None, cache: bool = False,
+                 cache_dir: Optional[str] = None, cache_entries: int = 1000):
+        # provider -> {requests_per_minute, tokens_per_minute}
+        self.limits = limits or {}
+        self.max_retries = max_retries
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_dir, cache_entries) if cache else None
+        self.limiters: Dict[str, ProviderLimiter] = {}
+        self.models: Dict[Any, Any] = {}
+        self._http = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]):
+        """Builds the gateway from the `gateway:` block of a project's config.yaml."""
+        config = config or {}
+        return cls(
+            limits=config.get('limits'),
+            max_retries=config.get('max_retries', 3),
+            max_connections=config.get('max_connections', 20),
+            timeout=config.get('timeout'),
+            cache=config.get('cache', False),
+            cache_dir=config.get('cache_dir'),
+            cache_entries=config.get('cache_entries', 1000)
+        )
+
+    def limiter(self, provider: str) -> ProviderLimiter:
+        with self.lock:
+            if provider not in self.limiters:
+                limits = self.limits.get(provider, {})
+                self.limiters[provider] = ProviderLimiter(limits.get('requests_per_minute'),
+                                                          limits.get('tokens_per_minute'))
+            return self.limiters[provider]
+
+    def _http_clients(self):
+        # One bounded, keep-alive connection pool shared by every OpenAI model
+        if self._http is None:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self._http = (httpx.Client(limits=limits, timeout=self.timeout),
+                          httpx.AsyncClient(limits=limits, timeout=self.timeout))
+        return self._http
+
+    def chat_model(self, provider: str, name: str, temperature: float = 0):
+        """The shared chat model for `provider`/`name`, built on first use."""
+        key = (provider, name, temperature)
+        with self.lock:
+            if key in self.models:
+                return self.models[key]
+        limiter = self.limiter(provider)
+        common = {
+            "model": name,
+            "temperature": temperature,
+            "max_retries": self.max_retries,
+            "rate_limiter": limiter,
+            "callbacks": [UsageCallback(limiter)]
+        }
+        if self.cache:
+            common["cache"] = self.cache
+        if provider == "openai":
+            from langchain_openai import ChatOpenAI
+            http_client, http_async_client = self._http_clients()
+            # stream_usage: token counts are reported on streamed responses too
+            model = ChatOpenAI(stream_usage=True, http_client=http_client, http_async_client=http_async_client,
+                               timeout=self.timeout, **common)
+        elif provider == "anthropic":
+            from langchain_anthropic import ChatAnthropic
+            model = ChatAnthropic(default_request_timeout=self.timeout, **common)
+        else:
+            raise ValueError("Invalid model provider")
+        with self.lock:
+            return self.models.setdefault(key, model)
+
+    def report(self) -> Dict[str, Any]:
+        report = {provider: limiter.stats.as_dict() for provider, limiter in self.limiters.items()}
+        if self.cache:
+            report["cache"] = {"hits": self.cache.hits, "misses": self.cache.misses}
+        return report
+
+    def _release_clients(self):
+        # Models built on the pool would keep the closed clients, so they are rebuilt on next use
+        with self.lock:
+            http, self._http = self._http, None
+            if http:
+                self.models = {key: model for key, model in self.models.items() if key[0] != "openai"}
+        return http
+
+    def close(self):
+        """Closes the sync connection pool (the async one needs aclose, from its event loop)."""
+        http = self._release_clients()
+        if http:
+            http[0].close()
+
+    async def aclose(self):
+        """Closes both connection pools; call it on the event loop the async client was used on."""
+        http = self._release_clients()
+        if http:
+            http[0].close()
+            await http[1].aclose()
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_gateway(config: Optional[Dict[str, Any]] = None) -> ModelGateway:
+    """
+    The process-wide gateway. It is built from the first `gateway:` config it is
+    given (or defaults); limits are per process, so later configs don't replace it.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = ModelGateway.from_config(config)
+        return _gateway
@@ -1,7 +1,11 @@
 import os
+import time
 import yaml
 from typing import Dict, Any, Optional
 
+from core.knowledge_index import KnowledgeIndex
+from core.memory import CHARS_PER_TOKEN
+
 class KnowledgeManager:
     def __init__(self, project_name: str):
         self.project_name = project_name
@@ -14,6 +18,11 @@ class KnowledgeManager:
         self.knowledge_path = os.path.join(self.project_root, 'knowledge.md')
         
         self.config = self._load_config()
+
+        # knowledge.md is cached in memory and re-read only when its mtime/size change
+        self._knowledge_signature = None
+        self._knowledge_text = ""
+        self._index = None
         
     def _load_config(self) -> Dict[str, Any]:
         if not os.path.exists(self.config_path):
@@ -21,12 +30,46 @@ class KnowledgeManager:
         with open(self.config_path, 'r') as f:
             return yaml.safe_load(f) or {}
 
+    def _refresh(self):
+        try:
+            stat = os.stat(self.knowledge_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
+        if signature == self._knowledge_signature:
+            return
+        self._knowledge_signature = signature
+        self._index = None
+        if signature is None:
+            self._knowledge_text = ""
+            return
+        with open(self.knowledge_path, 'r') as f:
+            self._knowledge_text = f.read()
+
     def get_knowledge(self) -> str:
         """Returns the content of the knowledge.md file."""
-        if not os.path.exists(self.knowledge_path):
-            return ""
-        with open(self.knowledge_path, 'r') as f:
-            return f.read()
+        self._refresh()
+        return self._knowledge_text
+
+    def get_index(self) -> KnowledgeIndex:
+        self._refresh()
+        if self._index is None:
+            self._index = KnowledgeIndex(self._knowledge_text)
+        return self._index
+
+    def relevant_knowledge(self, query: str) -> str:
+        """
+        The knowledge to put in a prompt about `query`: the whole file while it
+        fits the `knowledge.max_tokens` budget, otherwise the `knowledge.top_k`
+        best-matching snippets within that budget.
+        """
+        options = self.config.get('knowledge', {})
+        max_tokens = options.get('max_tokens', 800)
+        text = self.get_knowledge()
+        if len(text) <= max_tokens * CHARS_PER_TOKEN:
+            return text
+        snippets = self.get_index().search(query, top_k=options.get('top_k', 5), max_tokens=max_tokens)
+        return "\n\n".join(snippets)
 
     def append_knowledge(self, content: str):
         """Appends new insights to the knowledge.md file."""
@@ -40,3 +83,30 @@ class KnowledgeManager:
         """Retrieves credentials for a specific role from config."""
         creds = self.config.get('credentials', {})
         return creds.get(user_role)
+
+    def get_session_config(self) -> Dict[str, Any]:
+        """The `session:` block: ttl, check_url and logged_in_selector."""
+        return self.config.get('session', {})
+
+    def session_path(self, user_role: str) -> str:
+        return os.path.join(self.project_root, '.sessions', f"{user_role}.json")
+
+    def get_session(self, user_role: str) -> Optional[str]:
+        """Returns the saved storage-state file for a role if it exists and has not expired."""
+        path = self.session_path(user_role)
+        if not os.path.exists(path):
+            return None
+        ttl = self.get_session_config().get('ttl', 8 * 3600)
+        if time.time() - os.path.getmtime(path) > ttl:
+            return None
+        return path
+
+    def new_session_path(self, user_role: str) -> str:
+        path = self.session_path(user_role)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def invalidate_session(self, user_role: str):
+        path = self.session_path(user_role)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,92 @@
+"""
+Lexical index over a project's knowledge.md.
+
+The file is split into snippets (markdown sections, and paragraphs within
+long sections, each carrying its heading) and ranked with BM25 against the
+current step, so only the relevant part of a growing knowledge base ends up
+in the prompt.
+"""
+import re
+import math
+from collections import Counter
+from typing import List, Tuple
+
+from core.memory import CHARS_PER_TOKEN
+
+TOKEN_RE = re.compile(r"[a-z0-9_]+")
+HEADING_RE = re.compile(r"^#{1,6}\s+(.*)$")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or that the this to was were will with".split()
+)
+
+# Sections longer than this are split into paragraphs
+MAX_SNIPPET_CHARS = 1200
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+def split_snippets(text: str) -> List[str]:
+    """Markdown sections; long ones are split into paragraphs that keep their heading."""
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    for line in text.splitlines():
+        match = HEADING_RE.match(line)
+        if match:
+            sections.append((line.strip(), []))
+        else:
+            sections[-1][1].append(line)
+
+    snippets = []
+    for heading, lines in sections:
+        body = "\n".join(lines).strip()
+        if not body and not heading:
+            continue
+        if len(body) <= MAX_SNIPPET_CHARS:
+            snippets.append(f"{heading}\n{body}".strip())
+            continue
+        for paragraph in re.split(r"\n\s*\n", body):
+            if paragraph.strip():
+                snippets.append(f"{heading}\n{paragraph.strip()}".strip())
+    return snippets
+
+class KnowledgeIndex:
+    def __init__(self, text: str, k1: float = 1.5, b: float = 0.75):
+        self.text = text
+        self.snippets = split_snippets(text)
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(s)) for s in self.snippets]
+        self.lengths = [sum(c.values()) for c in self.term_counts]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        document_frequency = Counter(term for counts in self.term_counts for term in counts)
+        n = len(self.snippets)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def score(self, query_terms: List[str], index: int) -> float:
+        counts = self.term_counts[index]
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.avg_length or 1))
+        total = 0.0
+        for term in query_terms:
+            tf = counts.get(term)
+            if tf:
+                total += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return total
+
+    def search(self, query: str, top_k: int = 5, max_tokens: int = 800) -> List[str]:
+        """The best-matching snippets (in file order) that fit in `max_tokens`."""
+        query_terms = list(set(tokenize(query)))
+        ranked = sorted(
+            ((self.score(query_terms, i), i) for i in range(len(self.snippets))),
+            key=lambda pair: -pair[0]
+        )
+        chosen, budget = [], max_tokens * CHARS_PER_TOKEN
+        for score, i in ranked:
+            if score <= 0 or len(chosen) >= top_k:
+                break
+            if len(self.snippets[i]) > budget:
+                continue
+            chosen.append(i)
+            budget -= len(self.snippets[i])
+        return [self.snippets[i] for i in sorted(chosen)]
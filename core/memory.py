@@ -0,0 +1,128 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+# Rough budgeting numbers; good enough to keep requests bounded without a tokenizer
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 765
+SUMMARY_RESULT_CHARS = 120
+
+def estimate_tokens(messages) -> int:
+    total = 0
+    for m in messages:
+        content = m.content
+        if isinstance(content, str):
+            total += len(content) // CHARS_PER_TOKEN
+        else:
+            for part in content:
+                if isinstance(part, dict) and part.get('type') in ('image_url', 'image'):
+                    total += IMAGE_TOKENS
+                else:
+                    text = part.get('text', '') if isinstance(part, dict) else str(part)
+                    total += len(text) // CHARS_PER_TOKEN
+        for tool_call in getattr(m, 'tool_calls', None) or []:
+            total += len(str(tool_call['args'])) // CHARS_PER_TOKEN + 10
+    return total
+
+def _strip_images(message):
+    """Old screenshots are never resent; only their text parts survive."""
+    if not isinstance(message, HumanMessage) or isinstance(message.content, str):
+        return message
+    parts = [p for p in message.content if not (isinstance(p, dict) and p.get('type') in ('image_url', 'image'))]
+    if len(parts) == len(message.content):
+        return message
+    parts.append({"type": "text", "text": "[earlier screenshot omitted]"})
+    return HumanMessage(content=parts)
+
+def _split_exchanges(messages):
+    """Groups history into [head..., exchange, exchange, ...] where an exchange is an
+    AIMessage with tool calls followed by its ToolMessages."""
+    head, exchanges = [], []
+    for m in messages:
+        if isinstance(m, AIMessage) and m.tool_calls:
+            exchanges.append([m])
+        elif isinstance(m, ToolMessage) and exchanges:
+            exchanges[-1].append(m)
+        elif exchanges:
+            exchanges[-1].append(m)
+        else:
+            head.append(m)
+    return head, exchanges
+
+def _summarize(exchange) -> List[str]:
+    ai, results = exchange[0], {m.tool_call_id: m.content for m in exchange[1:] if isinstance(m, ToolMessage)}
+    lines = []
+    for tool_call in ai.tool_calls:
+        result = " ".join(str(results.get(tool_call['id'], '')).split())[:SUMMARY_RESULT_CHARS]
+        lines.append(f"- {tool_call['name']}({tool_call['args']}) -> {result}")
+    return lines
+
+@dataclass
+class MemoryStats:
+    tokens_full: int = 0
+    tokens_sent: int = 0
+    exchanges_folded: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_full - self.tokens_sent)
+
+class MemoryPolicy:
+    """
+    Bounds the conversation sent to the model.
+
+    The goal message and the last `keep_last` tool exchanges go verbatim; older
+    exchanges are folded into one compact summary message. If the request is
+    still over `max_tokens`, fewer exchanges are kept and the oldest summary
+    lines are dropped until it fits.
+    """
+    def __init__(self, keep_last: int = 4, max_tokens: Optional[int] = 32000):
+        self.keep_last = keep_last
+        self.max_tokens = max_tokens
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]):
+        config = config or {}
+        return cls(keep_last=config.get('keep_last', 4), max_tokens=config.get('max_tokens', 32000))
+
+    def apply(self, messages, reserved_tokens: int = 0):
+        """
+        Returns (history_to_send, MemoryStats).
+        `reserved_tokens` is what the rest of the request (system prompt, current screen) costs.
+        """
+        messages = [_strip_images(m) for m in messages]
+        head, exchanges = _split_exchanges(messages)
+        stats = MemoryStats(tokens_full=reserved_tokens + estimate_tokens(messages))
+
+        keep = min(self.keep_last, len(exchanges))
+        summary_lines = [line for ex in exchanges[:len(exchanges) - keep] for line in _summarize(ex)]
+
+        while True:
+            history = self._assemble(head, summary_lines, exchanges[len(exchanges) - keep:])
+            sent = reserved_tokens + estimate_tokens(history)
+            if self.max_tokens is None or sent <= self.max_tokens:
+                break
+            if keep > 0:
+                # Fold one more exchange into the summary
+                summary_lines += _summarize(exchanges[len(exchanges) - keep])
+                keep -= 1
+            elif summary_lines:
+                summary_lines = summary_lines[len(summary_lines) // 2 + 1:] if len(summary_lines) > 1 else []
+            else:
+                print(f"Memory: request still over budget ({sent} > {self.max_tokens} tokens)")
+                break
+
+        stats.tokens_sent = sent
+        stats.exchanges_folded = len(exchanges) - keep
+        return history, stats
+
+    def _assemble(self, head, summary_lines, kept_exchanges):
+        history = list(head)
+        if summary_lines:
+            history.append(HumanMessage(
+                content="PROGRESS SO FAR (earlier steps, compacted):\n" + "\n".join(summary_lines)
+            ))
+        for exchange in kept_exchanges:
+            history.extend(exchange)
+        return history
@@ -0,0 +1,56 @@
+import os
+import json
+import time
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from core.replay import goal_key, update_json_entry
+
+def knowledge_hash(knowledge_text: str) -> str:
+    return hashlib.sha1(knowledge_text.encode('utf-8')).hexdigest()[:16]
+
+class PlanCache:
+    """
+    Per-project store of planner output.
+
+    Plans are keyed by normalized goal, the session role and a hash of
+    knowledge.md, so editing the knowledge invalidates every plan built on it.
+    Entries older than `ttl` seconds are ignored. Every write drops the expired
+    entries and those built on another knowledge.md, so the file stays bounded.
+    """
+    def __init__(self, path: str, ttl: Optional[float] = 7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def _key(self, goal: str, role: Optional[str], knowledge: str) -> str:
+        return f"{goal_key(goal)}|{role or ''}|{knowledge}"
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return self.ttl is not None and time.time() - entry['created_at'] > self.ttl
+
+    def _pruner(self, knowledge: str):
+        # Entries of an edited knowledge.md can never match again
+        return lambda key, entry: self._expired(entry) or not key.endswith(f"|{knowledge}")
+
+    def lookup(self, goal: str, role: Optional[str], knowledge: str) -> Optional[List[str]]:
+        entry = self.entries.get(self._key(goal, role, knowledge))
+        if not entry or self._expired(entry):
+            return None
+        return list(entry['steps'])
+
+    def store(self, goal: str, role: Optional[str], knowledge: str, steps: List[str], replanned: bool = False):
+        self.entries = update_json_entry(self.path, self._key(goal, role, knowledge), {
+            "goal": goal,
+            "role": role,
+            "created_at": time.time(),
+            "replanned": replanned,
+            "steps": steps
+        }, prune=self._pruner(knowledge))
+
+    def invalidate(self, goal: str, role: Optional[str], knowledge: str):
+        self.entries = update_json_entry(self.path, self._key(goal, role, knowledge), None,
+                                         prune=self._pruner(knowledge))
@@ -1,35 +1,44 @@
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
+import os
 from langchain_core.messages import SystemMessage, HumanMessage
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 
 from core.knowledge import KnowledgeManager
+from core.plan_cache import PlanCache, knowledge_hash
+from core.gateway import get_gateway, measure_queue
+from core.routing import VISION_MODELS
 
 class Plan(BaseModel):
     steps: List[str] = Field(description="List of sequential steps to achieve the goal")
 
 class PlannerAgent:
-    def __init__(self, model_provider="openai", project_name=None):
+    def __init__(self, model_provider="openai", project_name=None, use_cache=True, gateway=None):
         self.knowledge = None
+        self.cache = None
+        # Whether the last plan() came from the cache
+        self.cache_hit = False
+        self.queue_seconds = 0.0 # Time planner calls waited for the gateway's rate limits
         if project_name:
             self.knowledge = KnowledgeManager(project_name)
-            
-        # Initialize Model
-        if model_provider == "openai":
-            self.model = ChatOpenAI(model="gpt-4o", temperature=0)
-        elif model_provider == "anthropic":
-            self.model = ChatAnthropic(model="claude-3-5-sonnet-20240620", temperature=0)
-        else:
-            raise ValueError("Invalid model provider")
+            if use_cache:
+                ttl = self.knowledge.config.get('planner', {}).get('cache_ttl', 7 * 24 * 3600)
+                self.cache = PlanCache(os.path.join(self.knowledge.project_root, 'plan_cache.json'), ttl=ttl)
+            if gateway is None:
+                gateway = get_gateway(self.knowledge.config.get('gateway'))
+
+        # Initialize Model (shared with the agents through the gateway)
+        self.gateway = gateway or get_gateway()
+        self.model = self.gateway.chat_model(model_provider, VISION_MODELS.get(model_provider))
             
         # Force structured output
         self.model = self.model.with_structured_output(Plan)
 
-    def plan(self, goal: str) -> List[str]:
+    def _prompt(self, goal: str, authenticated_role: Optional[str] = None):
         knowledge_context = ""
         if self.knowledge:
-            knowledge_context = f"\nPROJECT KNOWLEDGE:\n{self.knowledge.get_knowledge()}\n"
+            knowledge_context = f"\nPROJECT KNOWLEDGE:\n{self.knowledge.relevant_knowledge(goal)}\n"
+        if authenticated_role:
+            knowledge_context += f"\nSESSION: Already logged in as the '{authenticated_role}' user; do not plan login steps.\n"
             
         system_prompt = f"""
         You are a QA Lead Planner.
@@ -44,9 +53,85 @@ class PlannerAgent:
         4. Keep steps granular but not too low-level.
         """
         
-        response = self.model.invoke([
+        return [
             SystemMessage(content=system_prompt),
             HumanMessage(content=goal)
-        ])
-        
+        ]
+
+    def _replan_prompt(self, goal: str, completed: List[str], failed_step: str, detail: str,
+                       authenticated_role: Optional[str] = None):
+        messages = self._prompt(goal, authenticated_role)
+        done = "\n".join(f"{i + 1}. {step}" for i, step in enumerate(completed)) or "(none)"
+        messages.append(HumanMessage(content=f"""
+        The plan is partially executed. Do NOT repeat these completed steps:
+        {done}
+
+        This step FAILED: {failed_step}
+        What happened: {detail}
+
+        Return only the remaining steps needed to finish the goal from the current state,
+        using a different approach for the failed step.
+        """))
+        return messages
+
+    def _knowledge_hash(self) -> str:
+        return knowledge_hash(self.knowledge.get_knowledge() if self.knowledge else "")
+
+    def _cached(self, goal: str, authenticated_role: Optional[str]) -> Optional[List[str]]:
+        self.cache_hit = False
+        if not self.cache:
+            return None
+        steps = self.cache.lookup(goal, authenticated_role, self._knowledge_hash())
+        if steps:
+            print(f"Plan cache hit: {len(steps)} steps")
+            self.cache_hit = True
+        return steps
+
+    def _store(self, goal: str, authenticated_role: Optional[str], steps: List[str], replanned: bool = False):
+        if self.cache:
+            self.cache.store(goal, authenticated_role, self._knowledge_hash(), steps, replanned=replanned)
+
+    def remember(self, goal: str, steps: List[str], authenticated_role: Optional[str] = None):
+        """Caches a repaired plan that just worked end to end."""
+        self._store(goal, authenticated_role, steps, replanned=True)
+
+    def invalidate(self, goal: str, authenticated_role: Optional[str] = None):
+        if self.cache:
+            self.cache.invalidate(goal, authenticated_role, self._knowledge_hash())
+
+    def plan(self, goal: str, authenticated_role: Optional[str] = None) -> List[str]:
+        steps = self._cached(goal, authenticated_role)
+        if steps:
+            return steps
+        with measure_queue() as queued:
+            response = self.model.invoke(self._prompt(goal, authenticated_role))
+        self.queue_seconds += queued[0]
+        self._store(goal, authenticated_role, response.steps)
+        return response.steps
+
+    async def aplan(self, goal: str, authenticated_role: Optional[str] = None) -> List[str]:
+        steps = self._cached(goal, authenticated_role)
+        if steps:
+            return steps
+        with measure_queue() as queued:
+            response = await self.model.ainvoke(self._prompt(goal, authenticated_role))
+        self.queue_seconds += queued[0]
+        self._store(goal, authenticated_role, response.steps)
+        return response.steps
+
+    def replan(self, goal: str, completed: List[str], failed_step: str, detail: str,
+               authenticated_role: Optional[str] = None) -> List[str]:
+        """Plans only the remaining suffix after `failed_step`; the completed prefix is kept."""
+        with measure_queue() as queued:
+            response = self.model.invoke(self._replan_prompt(goal, completed, failed_step, detail, authenticated_role))
+        self.queue_seconds += queued[0]
+        return response.steps
+
+    async def areplan(self, goal: str, completed: List[str], failed_step: str, detail: str,
+                      authenticated_role: Optional[str] = None) -> List[str]:
+        with measure_queue() as queued:
+            response = await self.model.ainvoke(
+                self._replan_prompt(goal, completed, failed_step, detail, authenticated_role)
+            )
+        self.queue_seconds += queued[0]
         return response.steps
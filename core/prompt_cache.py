@@ -0,0 +1,71 @@
+"""
+Provider prompt caching.
+
+The prompt is laid out so that everything that stays the same for a run comes
+first and in the same bytes on every turn:
+
+    tools -> system (role, instructions, project knowledge) -> history -> current page
+
+and only the last message (element list, screenshot) changes from turn to turn.
+OpenAI caches such prefixes automatically (`prompt_cache_key` keeps one
+project's calls on the same cache); Anthropic needs explicit breakpoints,
+which `mark_breakpoints` sets on the system prompt and on the end of the
+history. `cache_usage` splits a response's input tokens into cached and
+uncached.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+def _llm_type(model) -> str:
+    # Bound models (bind_tools) wrap the chat model
+    model = getattr(model, 'bound', model)
+    return getattr(model, '_llm_type', '')
+
+def supports_breakpoints(model) -> bool:
+    return _llm_type(model) == "anthropic-chat"
+
+def bind_kwargs(model, cache_key: Optional[str]) -> Dict[str, Any]:
+    """Extra bind_tools arguments that route this model's calls to a shared prefix cache."""
+    if cache_key and _llm_type(model) == "openai-chat":
+        return {"prompt_cache_key": cache_key}
+    return {}
+
+def _with_breakpoint(message):
+    """A copy of `message` whose last content block carries the breakpoint, or None if it has no text to mark."""
+    content = message.content
+    if isinstance(content, str):
+        if not content.strip():
+            return None
+        blocks = [{"type": "text", "text": content}]
+    elif content and isinstance(content[-1], dict):
+        blocks = [dict(block) if isinstance(block, dict) else block for block in content]
+    else:
+        return None
+    blocks[-1]["cache_control"] = CACHE_CONTROL
+    return message.model_copy(update={"content": blocks})
+
+def mark_breakpoints(messages: List[Any], stable: int) -> List[Any]:
+    """
+    Sets cache breakpoints on the system prompt (messages[0]) and on the last
+    markable message among the first `stable` ones; the messages after those
+    change every turn. The originals are left untouched.
+    """
+    marked = list(messages)
+    system = _with_breakpoint(marked[0])
+    if system is not None:
+        marked[0] = system
+    for index in range(stable - 1, 0, -1):
+        copy = _with_breakpoint(marked[index])
+        if copy is not None:
+            marked[index] = copy
+            break
+    return marked
+
+def cache_usage(response) -> Tuple[int, int]:
+    """(cached, uncached) input tokens of a response, from its usage metadata."""
+    usage = getattr(response, 'usage_metadata', None) or {}
+    details = usage.get('input_token_details') or {}
+    # OpenAI reports flex/priority tier reads as e.g. "priority_cache_read"
+    cached = sum(v or 0 for k, v in details.items() if k.endswith('cache_read'))
+    return cached, max(0, usage.get('input_tokens', 0) - cached)
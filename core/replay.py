@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import uuid
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+ELEMENT_TOOLS = ("click_element", "type_text")
+# Takes a list of {action, element_id, text} instead of a single element_id
+BATCH_TOOL = "act_batch"
+
+# Parallel sessions of the same project share one cache file
+_file_lock = threading.Lock()
+
+def goal_key(goal: str) -> str:
+    return " ".join(goal.lower().split())
+
+def tool_targets(tool_call: Dict[str, Any]) -> List[Any]:
+    """The element IDs a tool call acts on, in order."""
+    if tool_call['name'] in ELEMENT_TOOLS:
+        return [tool_call['args'].get('element_id')]
+    if tool_call['name'] == BATCH_TOOL:
+        return [a.get('element_id') for a in tool_call['args'].get('actions', [])]
+    return []
+
+def update_json_entry(path: str, key: str, entry: Optional[Dict[str, Any]],
+                      prune: Optional[Callable[[str, Dict[str, Any]], bool]] = None) -> Dict[str, Any]:
+    """
+    Sets (or with None, removes) one entry of a JSON cache file and returns all entries.
+    Merges into what is on disk so concurrent sessions don't clobber each other,
+    then writes-then-renames so a crash never leaves a half-written cache behind.
+    Entries for which `prune(key, entry)` is true are dropped in the same write.
+    """
+    with _file_lock:
+        entries = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        if prune:
+            entries = {k: v for k, v in entries.items() if not prune(k, v)}
+        if entry is None:
+            entries.pop(key, None)
+        else:
+            entries[key] = entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, path)
+        return entries
+
+class ReplayCache:
+    """
+    Per-project store of successful trajectories, keyed by normalized goal.
+
+    Each trajectory is the ordered list of tool calls that led to 'done', along
+    with the page fingerprint seen before every call and the selector of the
+    element it targeted.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def lookup(self, goal: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self.entries.get(goal_key(goal))
+        return list(entry['actions']) if entry else None
+
+    def store(self, goal: str, actions: List[Dict[str, Any]]):
+        self._update(goal_key(goal), {
+            "goal": goal,
+            "recorded_at": time.time(),
+            "replays": 0,
+            "actions": actions
+        })
+
+    def mark_replayed(self, goal: str):
+        entry = self.entries.get(goal_key(goal))
+        if entry:
+            entry = dict(entry, replays=entry.get('replays', 0) + 1)
+            self._update(goal_key(goal), entry)
+
+    def invalidate(self, goal: str):
+        self._update(goal_key(goal), None)
+
+    def _update(self, key, entry):
+        self.entries = update_json_entry(self.path, key, entry)
+
+class ReplaySession:
+    """
+    Replay/record state for a single agent run (one goal).
+
+    While the live page matches the recording, `next_action` hands back the
+    cached tool call so the model is skipped. On the first mismatch replay is
+    switched off for the rest of the run and the agent falls back to the model;
+    the new trajectory is recorded and replaces the old one once 'done' is reached.
+    """
+    def __init__(self, cache: ReplayCache, goal: str):
+        self.cache = cache
+        self.goal = goal
+        self.script = cache.lookup(goal) or []
+        self.position = 0
+        self.active = bool(self.script)
+        self.diverged = False
+        self.recorded: List[Dict[str, Any]] = []
+        self.pending: Dict[str, Dict[str, Any]] = {}
+
+    def next_action(self, fingerprint, items) -> Optional[Dict[str, Any]]:
+        """Returns the cached tool call for this page, or None if the model must decide."""
+        if not self.active:
+            return None
+        if self.position >= len(self.script):
+            return self._diverge("cached trajectory exhausted")
+
+        action = self.script[self.position]
+        if action['fingerprint'] != fingerprint:
+            return self._diverge(f"page fingerprint changed at action {self.position}")
+
+        args = dict(action['args'])
+        if action['tool'] in ELEMENT_TOOLS:
+            match = self._match(items, action['selector'], action['text'])
+            if not match:
+                return self._diverge(f"selector {action['selector']} not found")
+            args['element_id'] = match.id
+        elif action['tool'] == BATCH_TOOL:
+            batch = []
+            for step, target in zip(args['actions'], action['targets']):
+                match = self._match(items, target['selector'], target['text'])
+                if not match:
+                    return self._diverge(f"selector {target['selector']} not found")
+                batch.append({**step, 'element_id': match.id})
+            args['actions'] = batch
+
+        self.position += 1
+        print(f"Replaying cached action {self.position}/{len(self.script)}: {action['tool']} {args}")
+        return {"name": action['tool'], "args": args, "id": f"replay_{uuid.uuid4().hex[:12]}"}
+
+    @staticmethod
+    def _match(items, selector, text):
+        # IDs are enumeration order, so re-resolve them through the stable selector
+        return next(
+            (e for e in items if e.selector == selector and e.text == text), None
+        ) or next((e for e in items if e.selector == selector), None)
+
+    def observe(self, tool_calls, fingerprint, items):
+        """Remembers what the page looked like when each tool call was chosen."""
+        for tool_call in tool_calls:
+            targets = [items.get(element_id) for element_id in tool_targets(tool_call)]
+            target = targets[0] if targets and tool_call['name'] in ELEMENT_TOOLS else None
+            action = {
+                "fingerprint": fingerprint,
+                "tool": tool_call['name'],
+                "args": tool_call['args'],
+                "selector": target.selector if target else None,
+                "text": target.text if target else None
+            }
+            if tool_call['name'] == BATCH_TOOL:
+                action['targets'] = [
+                    {"selector": t.selector if t else None, "text": t.text if t else None} for t in targets
+                ]
+            if tool_call['name'] == 'done':
+                self.recorded.append(action)
+                self._finish()
+            else:
+                self.pending[tool_call['id']] = action
+
+    def record_result(self, tool_call_id, result: str):
+        action = self.pending.pop(tool_call_id, None)
+        if action is None:
+            return
+        if str(result).startswith("Error"):
+            # A replayed action that fails means the cache is stale
+            if self.active:
+                self._diverge(f"replayed {action['tool']} failed")
+            return
+        self.recorded.append(action)
+
+    def _diverge(self, reason):
+        if self.active:
+            print(f"Replay diverged ({reason}); falling back to the model.")
+        self.active = False
+        self.diverged = True
+        return None
+
+    def _finish(self):
+        if self.script and not self.diverged and self.position == len(self.script):
+            # Whole run came from cache ('done' itself was replayed last)
+            self.cache.mark_replayed(self.goal)
+        else:
+            self.cache.store(self.goal, self.recorded)
@@ -0,0 +1,140 @@
+"""
+Text-only / vision model routing.
+
+Each turn is first offered to a cheap text model that sees only the element
+list. Its answer is used unless it asks for the screenshot, names an element
+that is missing, blank or ambiguous, or answers without a tool call; then the
+turn is escalated to the vision model with the screenshot. Turns right after
+a failed or ineffective action go straight to vision.
+"""
+from typing import Any, Dict, Optional
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import tool
+
+from core.replay import tool_targets
+from core.prompt_cache import cache_usage
+
+ESCALATE_TOOL = "request_screenshot"
+
+TEXT_ROUTE_NOTE = (
+    "No screenshot is attached to this turn; decide from the element list above. If it is not enough "
+    "(elements without text, several plausible candidates, or you need to see the page), call "
+    f"{ESCALATE_TOOL} instead of guessing."
+)
+
+# USD per 1M tokens (input, output, cached input); extend or override via `routing.prices`
+# in config.yaml. Without a cached price, cached input is charged as input.
+PRICES = {
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+    "claude-3-5-sonnet-20240620": (3.00, 15.00, 0.30),
+    "claude-3-haiku-20240307": (0.25, 1.25, 0.03),
+}
+
+# Default models per provider and route
+VISION_MODELS = {
+    "openai": "gpt-4o",
+    "anthropic": "claude-3-5-sonnet-20240620",
+}
+TEXT_MODELS = {
+    "openai": "gpt-4o-mini",
+    "anthropic": "claude-3-haiku-20240307",
+}
+
+@tool(ESCALATE_TOOL)
+def request_screenshot(reason: str):
+    """Asks to see the screenshot because the element list alone is not enough to decide."""
+    return reason
+
+def model_name(model) -> str:
+    """Model identifier of a LangChain chat model (ChatOpenAI uses `model_name`, ChatAnthropic `model`)."""
+    return getattr(model, 'model_name', None) or getattr(model, 'model', None) or type(model).__name__
+
+class RouteStats:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.tokens_in = 0
+        self.tokens_cached = 0 # part of tokens_in read from the provider's prompt cache
+        self.tokens_out = 0
+        self.cost = 0.0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "mean_latency_ms": round(self.seconds / self.calls * 1000, 1) if self.calls else None,
+            "tokens_in": self.tokens_in,
+            "tokens_cached": self.tokens_cached,
+            "tokens_out": self.tokens_out,
+            "cost_usd": round(self.cost, 5)
+        }
+
+class ModelRouter:
+    def __init__(self, text_model: Optional[str] = None, escalate_on_duplicates: bool = True,
+                 prices: Optional[Dict[str, Any]] = None):
+        self.text_model = text_model
+        self.escalate_on_duplicates = escalate_on_duplicates
+        self.prices = {**PRICES, **{k: tuple(v) for k, v in (prices or {}).items()}}
+        self.routes = {"text": RouteStats(), "vision": RouteStats()}
+        self.escalations = {}
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]):
+        config = config or {}
+        return cls(
+            text_model=config.get('text_model'),
+            escalate_on_duplicates=config.get('escalate_on_duplicates', True),
+            prices=config.get('prices')
+        )
+
+    def skip_text_reason(self, messages, unchanged: bool) -> Optional[str]:
+        """Why this turn should go straight to the vision model, or None to try the text model first."""
+        if unchanged:
+            return "no_visible_effect"
+        last = messages[-1] if messages else None
+        if isinstance(last, ToolMessage) and str(last.content).startswith("Error"):
+            return "failed_action"
+        return None
+
+    def escalation_reason(self, response, items) -> Optional[str]:
+        """Why the text model's answer can't be trusted, or None to use it."""
+        if not response.tool_calls:
+            return "no_tool_call"
+        for tool_call in response.tool_calls:
+            if tool_call['name'] == ESCALATE_TOOL:
+                return "requested_screenshot"
+            for element_id in tool_targets(tool_call):
+                target = items.get(element_id) if items is not None else None
+                if target is None:
+                    return "unknown_element"
+                if not target.text.strip():
+                    return "unlabelled_element"
+                if self.escalate_on_duplicates and items.text_count(target.text) > 1:
+                    return "ambiguous_element"
+        return None
+
+    def record_escalation(self, reason: str):
+        self.escalations[reason] = self.escalations.get(reason, 0) + 1
+
+    def record(self, route: str, name: str, response, seconds: float):
+        stats = self.routes[route]
+        stats.calls += 1
+        stats.seconds += seconds
+        usage = getattr(response, 'usage_metadata', None) or {}
+        tokens_in, tokens_out = usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+        cached, uncached = cache_usage(response)
+        stats.tokens_in += tokens_in
+        stats.tokens_cached += cached
+        stats.tokens_out += tokens_out
+        price_in, price_out, *rest = self.prices.get(name, (0.0, 0.0))
+        price_cached = rest[0] if rest else price_in
+        cost = (uncached * price_in + cached * price_cached + tokens_out * price_out) / 1_000_000
+        stats.cost += cost
+        return cost
+
+    def report(self):
+        return {
+            "routes": {name: stats.as_dict() for name, stats in self.routes.items()},
+            "escalations": dict(self.escalations)
+        }
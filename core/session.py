@@ -0,0 +1,119 @@
+from core.knowledge import KnowledgeManager
+
+class SessionSnapshots:
+    """
+    Saves and restores authenticated browser sessions (Playwright storage state)
+    per project and credential role, so a suite logs in once per role.
+
+    The project's `session:` config controls expiry (`ttl`, seconds) and how a
+    restored session is checked: open `check_url` and expect `logged_in_selector`.
+    A new login is saved the first time its page lands on `check_url` logged in,
+    before the rest of the test can add to the state (so no snapshot without
+    `check_url`).
+    """
+    def __init__(self, knowledge: KnowledgeManager):
+        self.knowledge = knowledge
+        self.check = knowledge.get_session_config()
+
+    def restore(self, browser, role) -> bool:
+        """
+        Starts the browser session, authenticated if a valid snapshot exists.
+        Returns True if the session was restored (the page is left on `check_url`).
+        """
+        path = self.knowledge.get_session(role)
+        if not path:
+            browser.start()
+            return False
+
+        browser.start(storage_state=path)
+        if self._verify(browser):
+            print(f"Restored '{role}' session from snapshot.")
+            return True
+
+        print(f"Snapshot for '{role}' is no longer valid; starting a fresh session.")
+        self.knowledge.invalidate_session(role)
+        browser.start()
+        return False
+
+    def capture(self, browser, role) -> bool:
+        """Saves the current session for `role` if the page is on `check_url` and looks logged in."""
+        if not self._on_check_url(browser.page.url):
+            return False
+        selector = self.check.get('logged_in_selector')
+        if selector and not browser.has_selector(selector):
+            return False
+        browser.save_storage_state(self.knowledge.new_session_path(role))
+        print(f"Saved '{role}' session snapshot.")
+        return True
+
+    def watch_login(self, agent, role, on_saved=None):
+        """
+        Captures the session for `role` after the agent's first action that leaves
+        it logged in on `check_url`, then calls `on_saved` and stops watching.
+        """
+        def after_action():
+            if self.capture(agent.browser, role):
+                agent.after_action = None
+                if on_saved:
+                    on_saved()
+        agent.after_action = after_action
+
+    def _on_check_url(self, url) -> bool:
+        check_url = self.check.get('check_url')
+        if not check_url:
+            return False
+        # Query string and fragment don't change the page a login lands on
+        return url.split('#')[0].split('?')[0].rstrip('/') == check_url.split('?')[0].rstrip('/')
+
+    def _verify(self, browser) -> bool:
+        check_url = self.check.get('check_url')
+        selector = self.check.get('logged_in_selector')
+        if not check_url or not selector:
+            # Nothing to check against; trust the TTL
+            return True
+        browser.navigate(check_url)
+        return browser.has_selector(selector)
+
+    async def arestore(self, browser, role) -> bool:
+        """Async version of restore (for AsyncBrowserManager)."""
+        path = self.knowledge.get_session(role)
+        if not path:
+            await browser.start()
+            return False
+
+        await browser.start(storage_state=path)
+        if await self._averify(browser):
+            print(f"Restored '{role}' session from snapshot.")
+            return True
+
+        print(f"Snapshot for '{role}' is no longer valid; starting a fresh session.")
+        self.knowledge.invalidate_session(role)
+        await browser.start()
+        return False
+
+    async def acapture(self, browser, role) -> bool:
+        if not self._on_check_url(browser.page.url):
+            return False
+        selector = self.check.get('logged_in_selector')
+        if selector and not await browser.has_selector(selector):
+            return False
+        await browser.save_storage_state(self.knowledge.new_session_path(role))
+        print(f"Saved '{role}' session snapshot.")
+        return True
+
+    def awatch_login(self, agent, role, on_saved=None):
+        """watch_login for AsyncAgent (its hook is awaited)."""
+        async def after_action():
+            if await self.acapture(agent.browser, role):
+                agent.after_action = None
+                if on_saved:
+                    on_saved()
+        agent.after_action = after_action
+
+    async def _averify(self, browser) -> bool:
+        check_url = self.check.get('check_url')
+        selector = self.check.get('logged_in_selector')
+        if not check_url or not selector:
+            return True
+        await browser.navigate(check_url)
+        return await browser.has_selector(selector)
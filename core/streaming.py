@@ -0,0 +1,66 @@
+"""
+Streaming model responses.
+
+`ToolCallStream` accumulates the chunks of a streamed AIMessage and hands out
+each tool call once its arguments form a whole JSON object, so the agent can
+start executing it while the rest of the response (further tool calls, the
+finish reason and usage) is still being generated.
+
+A response that calls one of `stop_names` (the agent's `done`) ends the run
+without running any of its tools. A complete call is therefore only handed out
+once the next chunk has arrived, so a stop call right behind it still holds it
+back, and nothing is handed out after a stop call has started streaming.
+"""
+import json
+from typing import Any, Dict, Iterable, List, Tuple
+
+from langchain_core.messages import AIMessage, AIMessageChunk, message_chunk_to_message
+
+def _complete_args(chunk: Dict[str, Any]):
+    """The parsed arguments of a streamed tool call, or None while they are still arriving."""
+    try:
+        args = json.loads(chunk.get('args') or "")
+    except ValueError:
+        return None
+    return args if isinstance(args, dict) else None
+
+class ToolCallStream:
+    def __init__(self, stop_names: Iterable[str] = ()):
+        self.message = None
+        self.stop_names = set(stop_names)
+        self.stopped = False # a stop call has started streaming
+        self.emitted = set() # ids of tool calls already handed out
+        self.pending = [] # complete calls waiting for the next chunk
+
+    def feed(self, chunk) -> List[Dict[str, Any]]:
+        """Adds one chunk and returns the tool calls that may start now."""
+        if not isinstance(chunk, AIMessageChunk):
+            # Models without native streaming yield the whole message at once
+            self.message = chunk
+            return []
+        self.message = chunk if self.message is None else self.message + chunk
+        chunks = self.message.tool_call_chunks
+        # The name arrives with a call's first chunk, long before its arguments are complete
+        self.stopped = self.stopped or any(call.get('name') in self.stop_names for call in chunks)
+        if self.stopped:
+            self.pending = []
+            return []
+        ready, self.pending = self.pending, []
+        self.emitted.update(tc['id'] for tc in ready)
+        for call in chunks:
+            if call.get('id') in self.emitted:
+                continue
+            args = _complete_args(call)
+            if args is None or not call.get('id') or not call.get('name'):
+                # Calls run in order: nothing after an unfinished (or malformed) one starts early
+                break
+            self.pending.append({"name": call['name'], "args": args, "id": call['id'], "type": "tool_call"})
+        return ready
+
+    def finish(self) -> Tuple[AIMessage, List[Dict[str, Any]]]:
+        """The full response, plus the tool calls not handed out yet."""
+        message = self.message if self.message is not None else AIMessage(content="")
+        if isinstance(message, AIMessageChunk):
+            message = message_chunk_to_message(message)
+        rest = [tc for tc in message.tool_calls if tc['id'] not in self.emitted]
+        return message, rest
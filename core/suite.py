@@ -0,0 +1,340 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import HumanMessage, ToolMessage
+from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+
+from browser.daemon import daemon_endpoint, launch_or_attach, alaunch_or_attach
+from browser.manager import BrowserManager
+from browser.async_manager import AsyncBrowserManager
+from core.knowledge import KnowledgeManager
+from core.session import SessionSnapshots
+
+PROJECTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'projects')
+
+@dataclass
+class TestCase:
+    project: str
+    goal: str
+    name: Optional[str] = None
+    use_planner: bool = False
+    # Credential role from config.yaml; enables login snapshots for this test
+    role: Optional[str] = None
+
+    def __post_init__(self):
+        if not self.name:
+            self.name = self.goal[:60]
+
+@dataclass
+class TestResult:
+    case: TestCase
+    status: str  # "passed" | "failed" | "error"
+    duration: float
+    worker: int
+    steps: List[str] = field(default_factory=list)
+    detail: str = ""
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+def load_suite(project_names: Optional[List[str]] = None) -> List[TestCase]:
+    """
+    Collects the `tickets` declared in each project's config.yaml.
+    If no project names are given, every directory under projects/ is scanned.
+    """
+    if not project_names:
+        project_names = sorted(
+            d for d in os.listdir(PROJECTS_DIR)
+            if os.path.isdir(os.path.join(PROJECTS_DIR, d))
+        )
+
+    cases = []
+    for project in project_names:
+        config = KnowledgeManager(project).config
+        for ticket in config.get('tickets', []):
+            if isinstance(ticket, str):
+                ticket = {"goal": ticket}
+            cases.append(TestCase(
+                project=project,
+                goal=ticket['goal'],
+                name=ticket.get('name'),
+                use_planner=ticket.get('planner', False),
+                role=ticket.get('role')
+            ))
+    return cases
+
+def _initial_state(step: str):
+    return {
+        "messages": [HumanMessage(content=step)],
+        "screenshot": "",
+        "items": [],
+        "goal": step
+    }
+
+def _done_call(final):
+    """Returns the 'done' tool call that ended a run, or None if the agent gave up."""
+    last = final['messages'][-1]
+    return next((tc for tc in getattr(last, 'tool_calls', []) or [] if tc['name'] == 'done'), None)
+
+def _failure_detail(final) -> str:
+    """What the last tool reported before the agent gave up, for re-planning."""
+    for message in reversed(final['messages']):
+        if isinstance(message, ToolMessage):
+            return str(message.content)[:300]
+    return str(final['messages'][-1].content)[:300] or "The agent stopped without calling 'done'."
+
+def _record_step(result: TestResult, step: str, final) -> bool:
+    """Updates the result after one step; returns False if the test cannot continue."""
+    done_call = _done_call(final)
+    if not done_call:
+        result.status, result.detail = "failed", f"Step did not complete: {step}"
+        return False
+    result.status, result.detail = "passed", done_call['args'].get('result', '')
+    return True
+
+def _replan(result: TestResult, completed: List[str], new_steps: List[str]):
+    result.steps = completed + new_steps
+    result.metrics["replans"] = result.metrics.get("replans", 0) + 1
+    print(f"Re-planned after step {len(completed) + 1}: {len(new_steps)} new steps")
+
+def _settle_plan(planner, case: TestCase, result: TestResult, role):
+    """Keeps the plan cache honest: store repaired plans that passed, drop cached plans that failed."""
+    if not planner:
+        return
+    if result.status == "passed" and result.metrics.get("replans"):
+        planner.remember(case.goal, result.steps, role)
+    elif result.status != "passed" and planner.cache_hit:
+        planner.invalidate(case.goal, role)
+
+def _finish(result: TestResult, start: float, session, agent):
+    result.duration = time.perf_counter() - start
+    result.metrics = {
+        **result.metrics,
+        "model_calls": agent.model_calls if agent else 0,
+        "model_cache_hits": agent.cache_hits if agent else 0,
+        "tokens_in_cached": agent.tokens_cached if agent else 0,
+        "queue_ms": round(agent.queue_seconds * 1000, 1) if agent else 0,
+        "settle_ms": round(sum(w['duration_ms'] for w in session.settle_log), 1),
+        "interception": session.interception_stats(),
+        "resolve": dict(session.resolve_counts)
+    }
+    if agent and agent.router:
+        result.metrics["routing"] = agent.router.report()
+
+class SuiteRunner:
+    """
+    Runs many test cases concurrently.
+
+    Each worker thread owns one Playwright instance and one Chromium (the sync API
+    is bound to the thread that started it). Every test case gets a fresh browser
+    context and its own Agent whose tools are bound to that context.
+    """
+    def __init__(self, workers=4, model_provider="openai", headless=True, recursion_limit=50, max_replans=1):
+        self.workers = workers
+        # Failed planner steps get this many suffix re-plans before the test fails
+        self.max_replans = max_replans
+        self.model_provider = model_provider
+        self.headless = headless
+        self.recursion_limit = recursion_limit
+        # The first test of each (project, role) logs in while the others wait until its snapshot is saved
+        self._role_locks = {}
+        self._role_locks_guard = threading.Lock()
+
+    def _role_lock(self, case: TestCase):
+        if not case.role:
+            return None
+        with self._role_locks_guard:
+            return self._role_locks.setdefault((case.project, case.role), threading.Lock())
+
+    def run(self, cases: List[TestCase]) -> List[TestResult]:
+        pending = queue.Queue()
+        for index, case in enumerate(cases):
+            pending.put((index, case))
+
+        results = [None] * len(cases)
+        threads = [
+            threading.Thread(target=self._worker, args=(worker_id, pending, results), daemon=True)
+            for worker_id in range(min(self.workers, len(cases)))
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def _worker(self, worker_id, pending, results):
+        with sync_playwright() as playwright:
+            # Each worker attaches to the browser daemon if one is running
+            browser, attached = launch_or_attach(playwright.chromium, self.headless, daemon_endpoint())
+            try:
+                while True:
+                    try:
+                        index, case = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    results[index] = self._run_case(worker_id, browser, case)
+                    print(f"[worker {worker_id}] {results[index].status.upper()}: {case.name} "
+                          f"({results[index].duration:.1f}s)")
+            finally:
+                if not attached:
+                    browser.close()
+
+    def _run_case(self, worker_id, browser, case: TestCase) -> TestResult:
+        # Imported lazily so the suite module can be loaded without model deps
+        from core.agent import Agent
+        from core.planner import PlannerAgent
+
+        start = time.perf_counter()
+        knowledge = KnowledgeManager(case.project)
+        snapshots = SessionSnapshots(knowledge)
+        session = BrowserManager(headless=self.headless, browser=browser)
+        # Project settings (interception, settle...) must be in place before the context exists
+        session.configure(knowledge.config)
+        result = TestResult(case, "error", 0.0, worker_id, [case.goal])
+        agent = None
+        lock = self._role_lock(case)
+        if lock:
+            lock.acquire()
+
+        def release():
+            nonlocal lock
+            if lock:
+                lock.release()
+                lock = None
+        try:
+            if case.role:
+                restored = snapshots.restore(session, case.role)
+            else:
+                session.start()
+                restored = False
+            if restored:
+                release()
+            role = case.role if restored else None
+
+            agent = Agent(model_provider=self.model_provider, project_name=case.project, browser=session,
+                          authenticated_role=role)
+            if lock:
+                # Saved as soon as the login is verified, so tests waiting on the role don't wait for this one
+                snapshots.watch_login(agent, case.role, on_saved=release)
+            planner = None
+            if case.use_planner:
+                planner = PlannerAgent(model_provider=self.model_provider, project_name=case.project)
+                result.steps = planner.plan(case.goal, authenticated_role=role)
+
+            completed = []
+            while len(completed) < len(result.steps):
+                step = result.steps[len(completed)]
+                final = agent.app.invoke(_initial_state(step), {"recursion_limit": self.recursion_limit})
+                if _record_step(result, step, final):
+                    completed.append(step)
+                    continue
+                if not planner or result.metrics.get("replans", 0) >= self.max_replans:
+                    break
+                _replan(result, completed, planner.replan(case.goal, completed, step, _failure_detail(final), role))
+            _settle_plan(planner, case, result, role)
+        except Exception as e:
+            result.status, result.detail = "error", str(e)
+        finally:
+            release()
+            session.stop()
+            _finish(result, start, session, agent)
+        return result
+
+class AsyncSuiteRunner(SuiteRunner):
+    """
+    Event-loop variant of SuiteRunner.
+
+    One Chromium is shared by all sessions; `workers` bounds how many test cases
+    are in flight at once. Each case gets a fresh context and an AsyncAgent.
+    """
+
+    def run(self, cases: List[TestCase]) -> List[TestResult]:
+        return asyncio.run(self.arun(cases))
+
+    def _role_lock(self, case: TestCase):
+        if not case.role:
+            return None
+        return self._role_locks.setdefault((case.project, case.role), asyncio.Lock())
+
+    async def arun(self, cases: List[TestCase]) -> List[TestResult]:
+        self._role_locks = {}
+        slots = asyncio.Semaphore(self.workers)
+        async with async_playwright() as playwright:
+            endpoint = await asyncio.to_thread(daemon_endpoint) # A blocking probe of the daemon
+            browser, attached = await alaunch_or_attach(playwright.chromium, self.headless, endpoint)
+            try:
+                async def bounded(index, case):
+                    async with slots:
+                        result = await self._arun_case(index % self.workers, browser, case)
+                        print(f"[session {index}] {result.status.upper()}: {case.name} ({result.duration:.1f}s)")
+                        return result
+                return list(await asyncio.gather(*(bounded(i, c) for i, c in enumerate(cases))))
+            finally:
+                from core.gateway import get_gateway
+                # The shared async HTTP client is bound to this event loop, which asyncio.run closes next
+                await get_gateway().aclose()
+                if not attached:
+                    await browser.close()
+
+    async def _arun_case(self, worker_id, browser, case: TestCase) -> TestResult:
+        from core.async_agent import AsyncAgent
+        from core.planner import PlannerAgent
+
+        start = time.perf_counter()
+        knowledge = KnowledgeManager(case.project)
+        snapshots = SessionSnapshots(knowledge)
+        session = AsyncBrowserManager(headless=self.headless, browser=browser)
+        session.configure(knowledge.config)
+        result = TestResult(case, "error", 0.0, worker_id, [case.goal])
+        agent = None
+        lock = self._role_lock(case)
+        if lock:
+            await lock.acquire()
+
+        def release():
+            nonlocal lock
+            if lock:
+                lock.release()
+                lock = None
+        try:
+            if case.role:
+                restored = await snapshots.arestore(session, case.role)
+            else:
+                await session.start()
+                restored = False
+            if restored:
+                release()
+            role = case.role if restored else None
+
+            agent = AsyncAgent(model_provider=self.model_provider, project_name=case.project, browser=session,
+                               authenticated_role=role)
+            if lock:
+                snapshots.awatch_login(agent, case.role, on_saved=release)
+            planner = None
+            if case.use_planner:
+                planner = PlannerAgent(model_provider=self.model_provider, project_name=case.project)
+                result.steps = await planner.aplan(case.goal, authenticated_role=role)
+
+            completed = []
+            while len(completed) < len(result.steps):
+                step = result.steps[len(completed)]
+                final = await agent.app.ainvoke(_initial_state(step), {"recursion_limit": self.recursion_limit})
+                if _record_step(result, step, final):
+                    completed.append(step)
+                    continue
+                if not planner or result.metrics.get("replans", 0) >= self.max_replans:
+                    break
+                new_steps = await planner.areplan(case.goal, completed, step, _failure_detail(final), role)
+                _replan(result, completed, new_steps)
+            _settle_plan(planner, case, result, role)
+        except Exception as e:
+            result.status, result.detail = "error", str(e)
+        finally:
+            release()
+            await session.stop()
+            _finish(result, start, session, agent)
+        return result
@@ -1,52 +1,159 @@
+from typing import List, Literal, Optional
 from langchain_core.tools import tool
+from pydantic import BaseModel, Field
 from browser.manager import BrowserManager
 
+class BatchAction(BaseModel):
+    action: Literal["click", "type", "submit"] = Field(description="What to do with the element")
+    element_id: int = Field(description="Numeric ID from the current element list")
+    text: Optional[str] = Field(default=None, description="Text to type (for 'type' only)")
+
+def _describe(action):
+    if action['action'] == "type":
+        return f"typed '{action['text']}' into #{action['element_id']}"
+    return f"{'clicked' if action['action'] == 'click' else 'submitted'} #{action['element_id']}"
+
+def batch_result(actions, completed, reason):
+    """Tool output for a batch: what ran, and why the rest was skipped (as an error)."""
+    done = ", ".join(_describe(a) for a in actions[:completed]) or "nothing"
+    if reason is None:
+        return f"Ran {completed} actions: {done}"
+    skipped = actions[completed]
+    return (f"Error: batch stopped after {completed} of {len(actions)} actions ({done}). "
+            f"Action {completed + 1} ({skipped['action']} #{skipped['element_id']}) and later were not run: "
+            f"{reason.rstrip('.')}. Look at the current page before continuing.")
+
+def scroll_result(direction, scroll_y, height):
+    return f"Scrolled {direction}; the top of the view is now at y={round(scroll_y)} of a {round(height)}px tall page"
+
+def make_tools(browser: BrowserManager):
+    """Builds the tool set bound to a specific BrowserManager instance."""
+
+    @tool
+    def navigate(url: str):
+        """Navigates the browser to the specified URL."""
+        browser.ensure_started()
+        browser.navigate(url)
+        return f"Navigated to {url}"
+
+    @tool
+    def click_element(element_id: int):
+        """Clicks on the element with the given numeric ID."""
+        try:
+            browser.interact("click", element_id)
+            return f"Clicked element #{element_id}"
+        except Exception as e:
+            return f"Error clicking element #{element_id}: {str(e)}"
+
+    @tool
+    def type_text(element_id: int, text: str):
+        """Types text into the element with the given numeric ID."""
+        try:
+            browser.interact("type", element_id, value=text)
+            return f"Typed '{text}' into element #{element_id}"
+        except Exception as e:
+            return f"Error typing into element #{element_id}: {str(e)}"
+
+    @tool
+    def act_batch(actions: List[BatchAction]):
+        """
+        Runs several actions on elements of the current page in order, e.g. filling a
+        form and submitting it in one turn. Stops early if the page changes unexpectedly.
+        """
+        actions = [a.model_dump() for a in actions]
+        try:
+            completed, reason = browser.interact_batch(actions)
+        except Exception as e:
+            return f"Error running batch: {str(e)}"
+        return batch_result(actions, completed, reason)
+
+    @tool
+    def scroll(direction: Literal["down", "up"] = "down"):
+        """Scrolls the page down (or up) by most of a screen."""
+        try:
+            return scroll_result(direction, *browser.scroll(direction))
+        except Exception as e:
+            return f"Error scrolling: {str(e)}"
+
+    @tool
+    def done(result: str):
+        """Call this when the goal is achieved."""
+        return result
+
+    return [navigate, click_element, type_text, act_batch, scroll, done]
+
+def make_async_tools(browser):
+    """Builds coroutine tools bound to an AsyncBrowserManager (use with `ainvoke`)."""
+
+    @tool
+    async def navigate(url: str):
+        """Navigates the browser to the specified URL."""
+        await browser.ensure_started()
+        await browser.navigate(url)
+        return f"Navigated to {url}"
+
+    @tool
+    async def click_element(element_id: int):
+        """Clicks on the element with the given numeric ID."""
+        try:
+            await browser.interact("click", element_id)
+            return f"Clicked element #{element_id}"
+        except Exception as e:
+            return f"Error clicking element #{element_id}: {str(e)}"
+
+    @tool
+    async def type_text(element_id: int, text: str):
+        """Types text into the element with the given numeric ID."""
+        try:
+            await browser.interact("type", element_id, value=text)
+            return f"Typed '{text}' into element #{element_id}"
+        except Exception as e:
+            return f"Error typing into element #{element_id}: {str(e)}"
+
+    @tool
+    async def act_batch(actions: List[BatchAction]):
+        """
+        Runs several actions on elements of the current page in order, e.g. filling a
+        form and submitting it in one turn. Stops early if the page changes unexpectedly.
+        """
+        actions = [a.model_dump() for a in actions]
+        try:
+            completed, reason = await browser.interact_batch(actions)
+        except Exception as e:
+            return f"Error running batch: {str(e)}"
+        return batch_result(actions, completed, reason)
+
+    @tool
+    async def scroll(direction: Literal["down", "up"] = "down"):
+        """Scrolls the page down (or up) by most of a screen."""
+        try:
+            return scroll_result(direction, *(await browser.scroll(direction)))
+        except Exception as e:
+            return f"Error scrolling: {str(e)}"
+
+    @tool
+    async def done(result: str):
+        """Call this when the goal is achieved."""
+        return result
+
+    return [navigate, click_element, type_text, act_batch, scroll, done]
+
 # Global browser instance (simplification for prototype)
-# In a real app, this would be passed via context or dependency injection
-browser = BrowserManager(headless=False)
-
-@tool
-def navigate(url: str):
-    """Navigates the browser to the specified URL."""
-    if not browser.browser:
-        browser.start()
-    browser.navigate(url)
-    return f"Navigated to {url}"
-
-@tool
-def click_element(element_id: int):
-    """Clicks on the element with the given numeric ID."""
-    try:
-        browser.interact("click", element_id)
-        return f"Clicked element #{element_id}"
-    except Exception as e:
-        return f"Error clicking element #{element_id}: {str(e)}"
-
-@tool
-def type_text(element_id: int, text: str):
-    """Types text into the element with the given numeric ID."""
-    try:
-        browser.interact("type", element_id, value=text)
-        return f"Typed '{text}' into element #{element_id}"
-    except Exception as e:
-        return f"Error typing into element #{element_id}: {str(e)}"
-
-@tool
-def scroll():
-    """Scrolls the page down."""
-    try:
-        browser.interact("scroll", 0) # ID 0 is ignored for scroll
-        return "Scrolled down"
-    except Exception as e:
-        return f"Error scrolling: {str(e)}"
-
-@tool
-def done(result: str):
-    """Call this when the goal is achieved."""
-    return result
-
-def get_tools():
-    return [navigate, click_element, type_text, scroll, done]
+# Used by single-session entry points; parallel runs bind their own via make_tools.
+# Built on first use, so importing this module (e.g. for make_async_tools) costs nothing
+browser = None
+_default_tools = None
+
+def get_tools(browser_manager: BrowserManager = None):
+    global _default_tools
+    if browser_manager is None or browser_manager is browser:
+        if _default_tools is None:
+            _default_tools = make_tools(get_browser())
+        return _default_tools
+    return make_tools(browser_manager)
 
 def get_browser():
+    global browser
+    if browser is None:
+        browser = BrowserManager(headless=False)
     return browser
@@ -0,0 +1,288 @@
+"""
+Structured tracing for the agent loop.
+
+A Tracer produces spans (graph nodes and their sub-phases: grounding,
+screenshot, encoding, prompt build, model call, tool invoke, settle wait),
+counters (tokens, bytes, element counts) and events (e.g. the full prompt for
+debug dumps), and hands them to pluggable sinks. With no sinks attached the
+tracer is disabled and `span()` returns a shared no-op, so instrumentation
+costs almost nothing.
+
+Sinks implement any of `on_span_end(span)`, `on_count(name, value, attrs)`,
+`on_event(name, payload)` and `close()`.
+"""
+import os
+import json
+import time
+import uuid
+import atexit
+import random
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+_current_span = contextvars.ContextVar("qa_current_span", default=None)
+
+class Span:
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "_start", "duration")
+
+    def __init__(self, name, attrs, parent):
+        self.name = name
+        self.attrs = attrs
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+
+    def as_dict(self):
+        return {
+            "type": "span",
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attrs": self.attrs
+        }
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+@contextmanager
+def _noop():
+    yield _NOOP_SPAN
+
+class Tracer:
+    def __init__(self, sinks: Optional[List[Any]] = None):
+        self.sinks = list(sinks or [])
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def span(self, name, **attrs):
+        if not self.sinks:
+            return _noop()
+        return self._span(name, attrs)
+
+    @contextmanager
+    def _span(self, name, attrs):
+        span = Span(name, attrs, _current_span.get())
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.finish()
+            _current_span.reset(token)
+            for sink in self.sinks:
+                if hasattr(sink, "on_span_end"):
+                    sink.on_span_end(span)
+
+    def count(self, name, value=1, **attrs):
+        for sink in self.sinks:
+            if hasattr(sink, "on_count"):
+                sink.on_count(name, value, attrs)
+
+    def wants_event(self, name):
+        """Lets callers skip building expensive payloads nobody will read."""
+        return any(hasattr(s, "on_event") and s.accepts(name) for s in self.sinks)
+
+    def event(self, name, **payload):
+        for sink in self.sinks:
+            if hasattr(sink, "on_event") and sink.accepts(name):
+                sink.on_event(name, payload)
+
+    def close(self):
+        for sink in self.sinks:
+            if hasattr(sink, "close"):
+                sink.close()
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+class PhaseTimings:
+    """Sink that aggregates span durations (and counters) by name."""
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.counters = defaultdict(float)
+
+    def on_span_end(self, span):
+        self.samples[span.name].append(span.duration)
+
+    def on_count(self, name, value, attrs):
+        self.counters[name] += value
+
+    def reset(self):
+        self.samples.clear()
+        self.counters.clear()
+
+    def summary(self):
+        """Per-phase count / total / mean / p50 / p95 / max, in milliseconds."""
+        return {
+            name: {
+                "count": len(values),
+                "total_ms": round(sum(values) * 1000, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(_percentile(values, 0.5) * 1000, 2),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2)
+            }
+            for name, values in self.samples.items() if values
+        }
+
+class MemorySink:
+    """Keeps everything in lists; handy for tests and benchmarks."""
+    def __init__(self):
+        self.spans = []
+        self.counts = []
+
+    def on_span_end(self, span):
+        self.spans.append(span.as_dict())
+
+    def on_count(self, name, value, attrs):
+        self.counts.append({"type": "count", "name": name, "value": value, "attrs": attrs})
+
+class JsonlSink:
+    """Appends spans and counters as JSON lines; buffered, flushed every `flush_every` records."""
+    def __init__(self, path: str, flush_every: int = 50):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def _write(self, record):
+        with self._lock:
+            self._buffer.append(json.dumps(record, default=str))
+            if len(self._buffer) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+
+    def on_span_end(self, span):
+        self._write(span.as_dict())
+
+    def on_count(self, name, value, attrs):
+        self._write({"type": "count", "name": name, "value": value, "attrs": attrs, "ts_ns": time.time_ns()})
+
+    def close(self):
+        with self._lock:
+            self._flush()
+
+class OpenTelemetrySink:
+    """
+    Re-emits finished spans through the OpenTelemetry API (configure the SDK and
+    exporter as usual). Requires `opentelemetry-api`.
+    """
+    def __init__(self, tracer_name: str = "qa-agent"):
+        if otel_trace is None:
+            raise ImportError("OpenTelemetrySink requires the 'opentelemetry-api' package")
+        self._tracer = otel_trace.get_tracer(tracer_name)
+
+    def on_span_end(self, span):
+        attributes = {k: v for k, v in span.attrs.items() if isinstance(v, (str, bool, int, float))}
+        attributes.update({"qa.trace_id": span.trace_id, "qa.span_id": span.span_id,
+                           "qa.parent_id": span.parent_id or ""})
+        otel_span = self._tracer.start_span(span.name, start_time=span.start_ns, attributes=attributes)
+        otel_span.end(end_time=span.end_ns)
+
+class DebugDumpSink:
+    """
+    Dumps the full model input of sampled turns. `sample_rate` is the fraction
+    of prompts kept. When the event carries an artifact run the dump is queued
+    there (per run, linked to its step, written off-thread); otherwise it
+    overwrites `path`.
+    """
+    def __init__(self, path: str = "debug_messages.txt", sample_rate: float = 1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+
+    def accepts(self, name):
+        return name == "prompt"
+
+    def on_event(self, name, payload):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        messages = payload["messages"]
+        artifacts = payload.get("artifacts")
+        if artifacts is not None:
+            artifacts.save(payload.get("step"), "prompt", lambda: format_messages(messages).encode("utf-8"), "txt")
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(format_messages(messages))
+
+def format_messages(messages) -> str:
+    lines = []
+    for i, m in enumerate(messages):
+        lines.append(f"Index: {i} | Role: {m.type}")
+        lines.append(f"Content: {str(m.content)[:100]}...")
+        if hasattr(m, 'tool_calls') and m.tool_calls:
+            lines.append(f"Tool Calls: {m.tool_calls}")
+        if hasattr(m, 'tool_call_id'):
+            lines.append(f"Tool Call ID: {m.tool_call_id}")
+        lines.append("-" * 20)
+    return "\n".join(lines) + "\n"
+
+_jsonl_sinks = {}
+_jsonl_lock = threading.Lock()
+
+def jsonl_sink(path: str) -> JsonlSink:
+    """One sink per file per process, so concurrent agents share its lock and buffer."""
+    key = os.path.abspath(path)
+    with _jsonl_lock:
+        if key not in _jsonl_sinks:
+            _jsonl_sinks[key] = JsonlSink(path)
+            atexit.register(_jsonl_sinks[key].close)
+        return _jsonl_sinks[key]
+
+def tracer_from_config(config: Optional[Dict[str, Any]]) -> Tracer:
+    """
+    Builds a tracer from the `tracing:` block of a project's config.yaml:
+        tracing:
+          jsonl: traces/run.jsonl
+          otel: true
+          debug_dump: {sample_rate: 0.1}
+    """
+    config = config or {}
+    sinks = []
+    if config.get('jsonl'):
+        sinks.append(jsonl_sink(config['jsonl']))
+    if config.get('otel'):
+        sinks.append(OpenTelemetrySink())
+    if config.get('debug_dump'):
+        dump = config['debug_dump'] if isinstance(config['debug_dump'], dict) else {}
+        sinks.append(DebugDumpSink(**dump))
+    return Tracer(sinks)
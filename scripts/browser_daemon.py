@@ -0,0 +1,32 @@
+import sys
+import os
+import argparse
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from browser.daemon import DEFAULT_PORT, STATE_FILE, WARMUP_CONTEXTS, daemon_endpoint, read_state, serve
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep one Chromium running; agents, scripts and suite runs attach to it over CDP "
+                    "instead of launching their own (each still opens a fresh context)."
+    )
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Remote debugging (CDP) port")
+    parser.add_argument("--headed", action="store_true", help="Show the browser window")
+    parser.add_argument("--warmup", type=int, default=WARMUP_CONTEXTS,
+                        help="Throwaway contexts opened and closed at start to get Chromium's processes up")
+    parser.add_argument("--state", default=STATE_FILE, help="Where the endpoint is recorded for clients")
+    parser.add_argument("--status", action="store_true", help="Print whether a daemon is running and exit")
+    args = parser.parse_args()
+
+    if args.status:
+        endpoint = daemon_endpoint(args.state)
+        state = read_state(args.state) or {}
+        print(f"Running at {endpoint} (pid {state.get('pid')})" if endpoint else "Not running")
+        return
+
+    serve(port=args.port, headless=not args.headed, path=args.state, warmup=args.warmup)
+
+if __name__ == "__main__":
+    main()
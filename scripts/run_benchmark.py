@@ -0,0 +1,78 @@
+import sys
+import os
+import json
+import argparse
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench.fixtures import FixtureServer
+from bench.harness import (SCENARIOS, run_benchmarks, run_capture_benchmark, run_startup_benchmark, save_results,
+                           compare)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline agent-loop benchmark (local fixtures + scripted model).")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help=f"Any of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="Simulated seconds per model call")
+    parser.add_argument("--grounding", nargs="+", choices=["full", "incremental", "cdp"], default=["full"],
+                        help="Grounding mode(s); with several, each scenario runs once per mode")
+    parser.add_argument("--capture", action="store_true",
+                        help="Only time page capture on each fixture page, per grounding mode")
+    parser.add_argument("--startup", action="store_true",
+                        help="Only time fresh agent processes to their first action, launching vs. a browser daemon")
+    parser.add_argument("--headed", action="store_true")
+    parser.add_argument("--out", help="Result file (default: bench/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Previous result file to compare against")
+    args = parser.parse_args()
+
+    with FixtureServer() as server:
+        print(f"Fixtures at {server.base_url}")
+        if args.startup:
+            results = run_startup_benchmark(server.base_url, repeat=args.repeat, headless=not args.headed)
+        elif args.capture:
+            results = run_capture_benchmark(args.grounding, server.base_url, repeat=args.repeat,
+                                            headless=not args.headed)
+        else:
+            results = run_benchmarks(
+                args.scenarios,
+                server.base_url,
+                groundings=args.grounding,
+                repeat=args.repeat,
+                model_latency=args.model_latency,
+                headless=not args.headed
+            )
+
+    if args.startup:
+        for startup in results['startups']:
+            print(f"\n--- {startup['mode']} ({len(startup['runs'])} runs) ---")
+            for phase, mean in startup['mean_ms'].items():
+                print(f"  {phase:26} mean={mean:8.1f}ms")
+        print(f"\nSaved {save_results(results, args.out)}")
+        return
+
+    if args.capture:
+        for capture in results['captures']:
+            print(f"\n--- {capture['page']} / {capture['grounding']}: {capture['elements']} elements ---")
+            for phase, stats in capture['phases'].items():
+                print(f"  {phase:10} n={stats['count']:3} mean={stats['mean_ms']:8.1f}ms p95={stats['p95_ms']:8.1f}ms")
+        print(f"\nSaved {save_results(results, args.out)}")
+        return
+
+    for scenario in results['scenarios']:
+        print(f"\n--- {scenario['scenario']} ({scenario['runs']} runs, {scenario['steps']} steps) ---")
+        print(f"steps/sec: {scenario['steps_per_sec']} | peak heap: {scenario['peak_python_heap_mb']}MB "
+              f"| max RSS: {scenario['max_rss_mb']}MB")
+        for phase, stats in scenario['phases'].items():
+            print(f"  {phase:10} n={stats['count']:3} mean={stats['mean_ms']:8.1f}ms p95={stats['p95_ms']:8.1f}ms")
+
+    path = save_results(results, args.out)
+    print(f"\nSaved {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\n" + "\n".join(compare(baseline, results)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import sys
+import os
+import time
+import json
+import argparse
+from dotenv import load_dotenv
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.suite import SuiteRunner, AsyncSuiteRunner, load_suite
+
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run project tickets in parallel.")
+    parser.add_argument("projects", nargs="*", help="Project names under projects/ (default: all)")
+    parser.add_argument("--workers", type=int, default=4, help="Number of parallel browser workers")
+    parser.add_argument("--provider", default="openai", choices=["openai", "anthropic"])
+    parser.add_argument("--headed", action="store_true", help="Show the browser windows")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Run all sessions on one event loop (workers = max concurrent sessions)")
+    parser.add_argument("--max-replans", type=int, default=1,
+                        help="Re-plans of the remaining steps after a failed planner step")
+    parser.add_argument("--report", help="Write per-test results to this JSON file")
+    args = parser.parse_args()
+
+    cases = load_suite(args.projects)
+    print(f"Running {len(cases)} tests on {args.workers} workers...")
+
+    runner_cls = AsyncSuiteRunner if args.use_async else SuiteRunner
+    runner = runner_cls(workers=args.workers, model_provider=args.provider, headless=not args.headed,
+                        max_replans=args.max_replans)
+    start = time.perf_counter()
+    results = runner.run(cases)
+    wall = time.perf_counter() - start
+
+    print("\n--- RESULTS ---")
+    for r in results:
+        print(f"{r.status.upper():7} | {r.case.project}/{r.case.name} | {r.duration:.1f}s | {r.detail}")
+
+    passed = sum(1 for r in results if r.status == "passed")
+    serial = sum(r.duration for r in results)
+    print(f"\n{passed}/{len(results)} passed in {wall:.1f}s wall-clock ({serial:.1f}s summed test time)")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump([
+                {
+                    "project": r.case.project,
+                    "name": r.case.name,
+                    "goal": r.case.goal,
+                    "status": r.status,
+                    "duration": r.duration,
+                    "worker": r.worker,
+                    "steps": r.steps,
+                    "detail": r.detail,
+                    "metrics": r.metrics
+                } for r in results
+            ], f, indent=2)
+
+    sys.exit(0 if passed == len(results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import sys
 import os
-import base64
 
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -23,15 +22,18 @@ def test_grounding():
         print(f"Found {len(items)} interactive elements.")
         
         # Print first 5 items to verify mapping
-        for item in items[:5]:
-            print(f"ID: {item['id']} | Tag: {item['tag']} | Text: {item['text']} | Selector: {item['selector']}")
+        for item in list(items)[:5]:
+            print(f"ID: {item.id} | Tag: {item.tag} | Text: {item.label()} | Selector: {item.selector}")
 
         # Save screenshot to verify visual tags
         print("Saving tagged screenshot...")
-        with open("tagged_screenshot.png", "wb") as f:
-            f.write(base64.b64decode(state['screenshot']))
+        image = state['image']
+        filename = f"tagged_screenshot.{image.extension}"
+        with open(filename, "wb") as f:
+            f.write(image.data)
+        print(f"Screenshot: {image.width}x{image.height} {image.mime}, {len(image.data)} bytes")
         
-        print("Test Passed! Check 'tagged_screenshot.png' to see the red boxes.")
+        print(f"Test Passed! Check '{filename}' to see the red boxes.")
 
     except Exception as e:
         print(f"Test Failed: {e}")
@@ -7,6 +7,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core.agent import Agent
 from core.planner import PlannerAgent
+from core.session import SessionSnapshots
 
 load_dotenv()
 
@@ -16,10 +17,24 @@ def main():
     
     print(f"Goal: {GOAL}")
     
+    ROLE = "standard"
+    
+    # We reuse the same worker agent for all steps to maintain browser session
+    worker = Agent(model_provider="openai", project_name=PROJECT_NAME)
+    
+    # Reuse the saved login for this role if there is one
+    snapshots = SessionSnapshots(worker.knowledge)
+    restored = snapshots.restore(worker.browser, ROLE)
+    if restored:
+        worker.authenticated_role = ROLE
+    else:
+        # Saved right after the login, before the rest of the goal changes the session
+        snapshots.watch_login(worker, ROLE)
+    
     # 1. PLAN
     print("\n--- PHASE 1: PLANNING ---")
     planner = PlannerAgent(model_provider="openai", project_name=PROJECT_NAME)
-    steps = planner.plan(GOAL)
+    steps = planner.plan(GOAL, authenticated_role=worker.authenticated_role)
     
     print("Generated Plan:")
     for i, step in enumerate(steps):
@@ -27,9 +42,6 @@ def main():
         
     # 2. EXECUTE
     print("\n--- PHASE 2: EXECUTION ---")
-    # We reuse the same worker agent for all steps to maintain browser session
-    worker = Agent(model_provider="openai", project_name=PROJECT_NAME)
-    
     for i, step in enumerate(steps):
         print(f"\n>> Executing Step {i+1}: {step}")
         
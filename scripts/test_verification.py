@@ -6,6 +6,7 @@ from langchain_core.messages import HumanMessage
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core.agent import Agent
+from core.session import SessionSnapshots
 
 load_dotenv()
 
@@ -17,8 +18,19 @@ def main():
     
     print(f"Goal: {GOAL}")
     
+    ROLE = "standard"
+    
     worker = Agent(model_provider="openai", project_name=PROJECT_NAME)
     
+    # Reuse the saved login for this role if there is one
+    snapshots = SessionSnapshots(worker.knowledge)
+    restored = snapshots.restore(worker.browser, ROLE)
+    if restored:
+        worker.authenticated_role = ROLE
+    else:
+        # Saved right after the login, before the rest of the goal changes the session
+        snapshots.watch_login(worker, ROLE)
+    
     state = {
         "messages": [HumanMessage(content=GOAL)],
         "screenshot": "",